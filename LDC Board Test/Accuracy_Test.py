@@ -1,21 +1,18 @@
 #!/usr/bin/env python3
 # Accuracy_Test.py
 
-import matplotlib.pyplot as plt
 import numpy as np
 import os
 import time
 from datetime import datetime
-from tkinter import Tk
-from tkinter.filedialog import askdirectory
-from LDC_Commands import LDC
+from LDC_Commands import LDC, write_csv_file, write_graph_file
+from Background_Writer import BackgroundWriter
+from Run_Journal import RunJournal
+from Latency_Profiler import profiler
 
 # Gets the current directory to return in the end of the test
 cwd = os.getcwd()
 
-# LDC Functions start
-ldc = LDC()
-
 
 # Accuracy Test Properties and Functions
 class AccuracyTest:
@@ -23,18 +20,32 @@ class AccuracyTest:
     Sets up the variables and commands to execute the accuracy test of the LDC board
     """
 
-    def __init__(self):
+    def __init__(self, ldc):
+        """
+        Instantiates the test over an LDC board connection
+
+        :param ldc: The LDC board and reference instrument under test
+        :type ldc: LDC
+        """
+        self.ldc = ldc
         self.total_mean = []
         self.total_error = []
         self.total_std = []
         self.total_current = []
         self.total_ppc = []
+        self.total_settling = []
+        self.total_settled = []
+        self.total_noise = []
+        self.total_spurs = []
         self.total_steps = 0
         self.testnum = 0
         self.path = ''
+        self.writer = None
+        self.journal = None
         print("Accuracy Test module initialized!")
 
-    def start(self, step, minimum, maximum, duration, test_number):
+    def start(self, step, minimum, maximum, duration, test_number, direction=0, convergence=None, buffered=False,
+              settling=0.05):
         """
         Executes the accuracy test of the LDC board
 
@@ -48,47 +59,160 @@ class AccuracyTest:
         :type duration: int
         :param test_number: Sets the number of the test
         :type test_number: int
+        :param direction: Sweep direction, 0 (Ascending) or 1 (Descending)
+        :type direction: int
+        :param convergence: Standard error of the mean leakage, in mA, that ends a step before its duration. Default
+            gives None, which measures each step for the whole duration
+        :type convergence: float
+        :param buffered: Measures the reference current with the instrument buffer instead of one query per sample
+        :type buffered: bool
+        :param settling: Band, in mA, the leakage reading must stay within before each step is measured. None waits
+            the fixed 0.15 s instead, the settling time being saved as NaN since it is not checked
+        :type settling: float
+
+        When a run journal is set, the steps it holds for this test number are not measured again and their results
+        are taken from the journal
         """
         self.testnum = test_number
-        os.makedirs(os.path.join(self.path, str(test_number)))
-        os.makedirs(os.path.join(self.path, str(test_number)+"\\Samples"))
-        os.makedirs(os.path.join(self.path, str(test_number)+"\\Plots"))
+        os.makedirs(os.path.join(self.path, str(test_number)), exist_ok=True)
+        os.makedirs(os.path.join(self.path, str(test_number)+"\\Samples"), exist_ok=True)
+        os.makedirs(os.path.join(self.path, str(test_number)+"\\Plots"), exist_ok=True)
         span = maximum - minimum
         self.total_steps = round(span/step) + 1
         print("Starting test...")
-        ldc.scpi.enable_output()
+        if self.writer is None:
+            self.writer = BackgroundWriter()
+        plots_path = os.path.abspath(os.path.join(self.path, str(test_number)+"\\Plots"))
+        samples_path = os.path.abspath(os.path.join(self.path, str(test_number)+"\\Samples"))
+        unsaved_steps = []
+        self.ldc.scpi.enable_output()
+        coalesce = self.ldc.scpi.coalesce
+        self.ldc.scpi.coalesce = True
 #       Loop to read the ground leakage in each step
-        for i in range(int(self.total_steps)):
-            if direction:
-                current = maximum - (i*step)
-            else:
-                current = minimum + (i*step)
-            ldc.scpi.set_current(current)
-            print("Values for {0:.3f} mA".format(current*1000))
-            print('--'*20)
-            time.sleep(0.15)
-            ldc.read_ground_leakage(duration)
-            # Change to the created directories and saves all acquired information
-            os.chdir(os.path.join(self.path, str(test_number)+"\\Plots"))
-            ldc.save_graph(graph_name='Leakage Current Measurement, Iref = {0:.1f}mA'.format(current*1000))
-            os.chdir(os.path.join(self.path, str(test_number)+"\\Samples"))
-            ldc.save_csv_file(file_name='Leakage_Current_Measurement-Iref_{0:.1f}mA'.format(current*1000))
-            os.chdir(cwd)
-            self.total_mean.append(ldc.mean)
-            self.total_error.append(ldc.mean_error)
-            self.total_std.append(ldc.std_dev)
-            self.total_current.append(current*1000)
-            self.total_ppc.append(ldc.ppc)
-            if (i*step) < span:
+        try:
+            for i in range(int(self.total_steps)):
                 if direction:
-                    print("Acquisitions at {0:.3f} mA done! Stepping down the source current...\n".format(current*1000))
+                    current = maximum - (i*step)
                 else:
-                    print("Acquisition at {0:.3f} mA done! Stepping up the source current...\n" .format(current*1000))
-            elif (i*step) == span:
-                print("Accuracy Test completed!")
-        ldc.scpi.disable_output()
-        AccuracyTest.save_graphics(self)
-        AccuracyTest.save_csv_files(self)
+                    current = minimum + (i*step)
+                record = None
+                if self.journal is not None:
+                    record = self.journal.step(test_number, i, current*1000)
+                if record is not None:
+                    print("Values for {0:.3f} mA found in the journal, skipping the step".format(current*1000))
+                    self.total_mean.append(record['mean'])
+                    self.total_error.append(record['error'])
+                    self.total_std.append(record['std_dev'])
+                    self.total_current.append(record['current'])
+                    self.total_ppc.append(record['ppc'])
+                    self.total_settling.append(record['settling'])
+                    self.total_settled.append(record.get('settled', False))
+                    self.total_noise.append(record.get('noise', float('nan')))
+                    self.total_spurs.append(record.get('spurs', []))
+                else:
+                    self.measure_step(i, current, duration, convergence, buffered, settling, plots_path, samples_path,
+                                      unsaved_steps)
+                unsaved_steps = self.journal_steps(unsaved_steps)
+                if (i*step) < span:
+                    if direction:
+                        print("Acquisitions at {0:.3f} mA done! Stepping down the source current...\n".format(
+                            current*1000))
+                    else:
+                        print("Acquisition at {0:.3f} mA done! Stepping up the source current...\n" .format(
+                            current*1000))
+                elif (i*step) == span:
+                    print("Accuracy Test completed!")
+            self.ldc.scpi.disable_output()
+        finally:
+            self.ldc.scpi.coalesce = coalesce
+            # The steps measured before an interruption are journaled once their files are saved
+            try:
+                with profiler.measure('io.writer_drain'):
+                    self.writer.drain()
+            finally:
+                self.journal_steps(unsaved_steps)
+        with profiler.measure('io.save_graphics'):
+            AccuracyTest.save_graphics(self)
+        with profiler.measure('io.save_csv_files'):
+            AccuracyTest.save_csv_files(self)
+        if self.journal is not None:
+            self.journal.record_repetition(test_number)
+        profiler.report(os.path.abspath(os.path.join(self.path, str(test_number), 'LATENCY.json')))
+
+    def measure_step(self, step, current, duration, convergence, buffered, settling, plots_path, samples_path,
+                     unsaved_steps):
+        """
+        Sets the source current of a step, measures the leakage and queues its files on the background writer
+
+        :param step: Index of the step in the sweep
+        :type step: int
+        :param current: Source current, in Amperes
+        :type current: float
+        :param unsaved_steps: Steps whose files are being written, where this one is added for the journal
+        :type unsaved_steps: list
+
+        The other parameters are the ones of start
+        """
+        self.ldc.scpi.set_current(current)
+        print("Values for {0:.3f} mA".format(current*1000))
+        print('--'*20)
+        if settling is None:
+            # A fixed wait, the settling is not checked
+            time.sleep(0.15)
+            settling_time, settled = float('nan'), False
+        else:
+            settling_time = self.ldc.wait_settling(settling)
+            settled = self.ldc.settled
+        self.ldc.read_ground_leakage(duration, convergence, buffered)
+        # Hands a copy of the step data to the background writer, so the next step starts right away
+        graph_name = 'Leakage Current Measurement, Iref = {0:.1f}mA'.format(current*1000)
+        file_name = 'Leakage_Current_Measurement-Iref_{0:.1f}mA'.format(current*1000)
+        samples = self.ldc.samples.values.copy()
+        time_samples = self.ldc.time_samples.values.copy()
+        jobs = (self.writer.submit(write_graph_file, os.path.join(plots_path, graph_name+'.jpg'), graph_name,
+                                   time_samples, samples),
+                self.writer.submit(write_csv_file, os.path.join(samples_path, file_name+'.csv'), samples,
+                                   time_samples))
+        self.total_mean.append(self.ldc.mean)
+        self.total_error.append(self.ldc.mean_error)
+        self.total_std.append(self.ldc.std_dev)
+        self.total_current.append(current*1000)
+        self.total_ppc.append(self.ldc.ppc)
+        self.total_settling.append(settling_time*1000)
+        self.total_settled.append(settled)
+        self.total_noise.append(self.ldc.noise_density)
+        self.total_spurs.append(self.ldc.spurs)
+        unsaved_steps.append((jobs, {"repetition": self.testnum, "step": step, "current": current*1000,
+                                     "mean": self.ldc.mean, "error": self.ldc.mean_error,
+                                     "std_dev": self.ldc.std_dev, "ppc": self.ldc.ppc,
+                                     "settling": settling_time*1000, "noise": self.ldc.noise_density,
+                                     "spurs": self.ldc.spurs, "settled": settled}))
+
+    def journal_steps(self, unsaved_steps):
+        """
+        Records in the run journal the steps whose files are saved
+
+        :param unsaved_steps: Files being written and results of every step not journaled yet
+        :type unsaved_steps: list
+
+        :return: The steps whose files are still being written
+        :rtype: list
+        """
+        waiting = []
+        for jobs, record in unsaved_steps:
+            if not all(job.done() for job in jobs):
+                waiting.append((jobs, record))
+            elif self.journal is not None and not any(job.exception() for job in jobs):
+                self.journal.record_step(**record)
+        return waiting
+
+    def close(self):
+        """
+        Waits for the pending files and stops the background writer
+        """
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
 
     def save_graphics(self):
         """
@@ -97,6 +221,8 @@ class AccuracyTest:
         - Source Current x Mean Current Error
         - Source Current X Current Standard Deviation
         """
+        import matplotlib.pyplot as plt
+
         # Saves the Plot of Source Current X Mean Leakage Current
         fig, ax = plt.subplots(1, 1, figsize=(10, 5))
         ax.locator_params(axis='y', tight=True, nbins=15)
@@ -187,20 +313,67 @@ class AccuracyTest:
         os.chdir(cwd)
         print("CSV file named '{}' successfully saved!".format(csvname))
 
+        # Saves the csv file of Source Current and Settling Time data, NaN with a 0 flag when the step did not settle
+        csvname = 'SourceCurrent_X_SettlingTime.csv'
+        data = [['Source Current'], ['Settling Time [ms]'], ['Settled']]
+        column0 = data[0]
+        column1 = data[1]
+        column2 = data[2]
+        for row in range(len(self.total_settling)):
+            column0.append(self.total_current[row])
+            column1.append(self.total_settling[row])
+            column2.append(int(self.total_settled[row]))
+        os.chdir(os.path.join(self.path, str(self.testnum)+"\\Samples"))
+        np.savetxt(csvname, [p for p in zip(column0, column1, column2)], delimiter=',', fmt='%s')
+        os.chdir(cwd)
+        print("CSV file named '{}' successfully saved!".format(csvname))
+
+        # Saves the csv file of Source Current and Noise Density data
+        csvname = 'SourceCurrent_X_NoiseDensity.csv'
+        data = [['Source Current'], ['Noise Density [mA/sqrt(Hz)]']]
+        column0 = data[0]
+        column1 = data[1]
+        for row in range(len(self.total_noise)):
+            column0.append(self.total_current[row])
+            column1.append(self.total_noise[row])
+        os.chdir(os.path.join(self.path, str(self.testnum)+"\\Samples"))
+        np.savetxt(csvname, [p for p in zip(column0, column1)], delimiter=',', fmt='%s')
+        os.chdir(cwd)
+        print("CSV file named '{}' successfully saved!".format(csvname))
+
+        # Saves the csv file of the dominant spurs of each Source Current, one row per spur
+        csvname = 'SourceCurrent_X_Spurs.csv'
+        rows = [('Source Current', 'Spur Frequency [Hz]', 'Spur Amplitude [mA rms]')]
+        for row in range(len(self.total_spurs)):
+            rows.extend((self.total_current[row], frequency, amplitude)
+                        for frequency, amplitude in self.total_spurs[row])
+        os.chdir(os.path.join(self.path, str(self.testnum)+"\\Samples"))
+        np.savetxt(csvname, rows, delimiter=',', fmt='%s')
+        os.chdir(cwd)
+        print("CSV file named '{}' successfully saved!".format(csvname))
+
 
 if __name__ == '__main__':
-    acc = AccuracyTest()
+    from tkinter.filedialog import askdirectory
+
+    acc = AccuracyTest(LDC())
     test_name = str(input("Enter the test name: "))
     folder_path = askdirectory(title='Select Folder')
     acc.path = os.path.join(folder_path, test_name)
-    os.makedirs(acc.path)
-    test_date = datetime.today().strftime("%d/%m/%Y - %H:%M")
-    # Saves a file with the test information
-    os.chdir(acc.path)
-    info_file = open('INFO.txt', 'w+')
-    info_file.write(test_name+"\n"+test_date+"\nSEI - Electronics Systems and Instrumentation")
-    info_file.close()
-    os.chdir(cwd)
+    if os.path.exists(acc.path):
+        # An interrupted test is resumed with the same settings, measuring only what is missing in its journal
+        if int(input("The test folder already exists. Resume the test? 1 (Yes) or 0 (No): ")) != 1:
+            exit()
+    else:
+        os.makedirs(acc.path)
+        test_date = datetime.today().strftime("%d/%m/%Y - %H:%M")
+        # Saves a file with the test information
+        os.chdir(acc.path)
+        info_file = open('INFO.txt', 'w+')
+        info_file.write(test_name+"\n"+test_date+"\nSEI - Electronics Systems and Instrumentation")
+        info_file.close()
+        os.chdir(cwd)
+    acc.journal = RunJournal(acc.path)
     tstep = float(input("Enter the current step, in Amperes: "))
     tminimum = float(input("Enter the minimum current of the test, in Amperes: "))
     tmaximum = float(input("Enter the maximum current of the test, in Amperes: "))
@@ -210,12 +383,21 @@ if __name__ == '__main__':
     test_quantity = int(input("How many times do want to run this test?: "))
     print(test_quantity, " tests to go!")
     for n in range(test_quantity):
+        if acc.journal.completed(n+1):
+            print("Test {} found in the journal, skipping it".format(n+1))
+            continue
         if apply_degauss:
-            ldc.degauss()
+            acc.ldc.degauss()
         acc.total_mean.clear()
         acc.total_error.clear()
         acc.total_std.clear()
         acc.total_current.clear()
         acc.total_ppc.clear()
-        acc.start(tstep, tminimum, tmaximum, tduration, n+1)
+        acc.total_settling.clear()
+        acc.total_settled.clear()
+        acc.total_noise.clear()
+        acc.total_spurs.clear()
+        acc.start(tstep, tminimum, tmaximum, tduration, n+1, direction)
         print(test_quantity-n-1, " tests remaining !")
+    acc.close()
+    acc.ldc.close()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# Acquisition_Engine.py
+
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+# Values of one sample tick. The timestamps are the monotonic midpoints of each read
+Acquisition = namedtuple('Acquisition', ['reference', 'reference_time', 'bsmp', 'bsmp_time'])
+
+
+class AcquisitionEngine:
+    """
+    Reads the SCPI reference current and the BSMP variables of the LDC board at the same time, so each tick costs the
+    slowest of the two links instead of their sum
+    """
+
+    def __init__(self, scpi, drs, executor=None):
+        """
+        Sets up the worker that issues the SCPI queries while the serial link is being read
+
+        :param scpi: SCPI instrument providing the reference current
+        :type scpi: SCPI
+        :param drs: PyDRS connection with the IIB
+        :type drs: pydrs.SerialDRS
+        :param executor: Worker threads shared with other engines, left running by close. Default gives None, which
+            starts a worker of its own
+        :type executor: concurrent.futures.Executor
+        """
+        self.scpi = scpi
+        self.drs = drs
+        self.shared = executor is not None
+        self.executor = executor if self.shared else ThreadPoolExecutor(max_workers=1)
+        self.max_skew = 0
+
+    def read_reference(self):
+        """
+        Measures the source current of the SCPI instrument
+
+        :return: The current in Amperes and the timestamp of the measurement
+        :rtype: tuple
+        """
+        start = time.monotonic()
+        current_value = self.scpi.measure_current_precise()
+        return current_value, (start + time.monotonic()) / 2
+
+    def read_bsmp(self, variables, group=None):
+        """
+        Reads float BSMP variables from the IIB
+
+        :param variables: IDs of the BSMP variables
+        :type variables: tuple
+        :param group: Created BSMP group holding the variables, read in a single transaction. Default gives None,
+            which reads each variable on its own
+        :type group: BSMPGroup
+
+        :return: The list of values and the timestamp of the reading
+        :rtype: tuple
+        """
+        start = time.monotonic()
+        if group is not None:
+            values = group.read()
+        else:
+            values = [self.drs.read_bsmp_variable(variable, 'float') for variable in variables]
+        return values, (start + time.monotonic()) / 2
+
+    def acquire(self, *variables, group=None):
+        """
+        Issues the reference measurement and the BSMP reading concurrently
+
+        :param variables: IDs of the BSMP variables to read. Default gives the leakage current (53)
+        :type variables: int
+        :param group: Created BSMP group to read instead of the single variables
+        :type group: BSMPGroup
+
+        :return: The time-stamped values of both instruments
+        :rtype: Acquisition
+        """
+        if not variables:
+            variables = (53,)
+        reference = self.executor.submit(self.read_reference)
+        bsmp, bsmp_time = self.read_bsmp(variables, group)
+        reference, reference_time = reference.result()
+        self.max_skew = max(self.max_skew, abs(reference_time - bsmp_time))
+        return Acquisition(reference, reference_time, bsmp, bsmp_time)
+
+    def close(self):
+        """
+        Stops the worker thread, unless it is shared
+        """
+        if not self.shared:
+            self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
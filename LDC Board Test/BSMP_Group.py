@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# BSMP_Group.py
+
+import struct
+
+# BSMP commands of the variable groups
+com_read_group = '\x12'
+com_create_group = '\x30'
+com_remove_all_groups = '\x32'
+ack_read_group = 0x13
+ack_ok = 0xE0
+# Groups 0 to 2 are the standard groups of every BSMP server, the first created group takes the next ID
+first_group_id = 3
+
+
+class BSMPGroup:
+    """
+    Group of float BSMP variables read from the IIB in a single serial transaction, built on the frame functions of
+    a pydrs.SerialDRS connection
+    """
+
+    def __init__(self, drs, variables):
+        """
+        Sets up the group, without creating it on the IIB
+
+        :param drs: PyDRS connection with the IIB
+        :type drs: pydrs.SerialDRS
+        :param variables: IDs of the float BSMP variables, in the order their values are returned
+        :type variables: tuple
+        """
+        self.drs = drs
+        self.variables = tuple(variables)
+        self.group_id = first_group_id
+        self.created = False
+
+    def transaction(self, command, payload, reply_size):
+        """
+        Sends a BSMP frame and reads its reply
+
+        :return: The reply frame
+        :rtype: bytes
+        """
+        send_packet = command + self.drs.size_to_hex(len(payload)) + payload
+        send_msg = self.drs.checksum(self.drs.slave_add + send_packet)
+        self.drs.ser.reset_input_buffer()
+        self.drs.ser.write(send_msg.encode('ISO-8859-1'))
+        return self.drs.ser.read(reply_size)
+
+    def create(self):
+        """
+        Removes the groups previously created on the IIB and creates this one
+
+        :return: True if the IIB acknowledged the group
+        :rtype: bool
+        """
+        reply = self.transaction(com_remove_all_groups, '', 5)
+        if len(reply) < 2 or reply[1] != ack_ok:
+            return False
+        payload = ''.join(self.drs.index_to_hex(variable) for variable in self.variables)
+        reply = self.transaction(com_create_group, payload, 5)
+        self.created = len(reply) >= 2 and reply[1] == ack_ok
+        return self.created
+
+    def read(self):
+        """
+        Reads the values of all variables of the group
+
+        :return: The list of values, in the order of the variables
+        :rtype: list
+        """
+        reply_size = 5 + 4 * len(self.variables)
+        reply_msg = self.transaction(com_read_group, self.drs.index_to_hex(self.group_id), reply_size)
+        if len(reply_msg) != reply_size:
+            raise ValueError("Reply of {0} bytes to the read of group {1}, expected {2}. Check if the IIB is on and "
+                             "connected".format(len(reply_msg), self.group_id, reply_size))
+        if reply_msg[1] != ack_read_group:
+            raise ValueError("Reply with command 0x{0:02X} to the read of group {1}, expected 0x{2:02X}".format(
+                reply_msg[1], self.group_id, ack_read_group))
+        if sum(reply_msg) % 256 != 0:
+            raise ValueError("Checksum error in the reply to the read of group {}".format(self.group_id))
+        return list(struct.unpack('<%df' % len(self.variables), reply_msg[4:-1]))
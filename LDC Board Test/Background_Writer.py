@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# Background_Writer.py
+
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+from Latency_Profiler import profiler
+
+
+def use_agg_backend():
+    """
+    Sets the worker processes to render the plots to files only
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def timed_call(function, *args):
+    """
+    Runs a job in a worker, measuring its duration
+
+    :return: The result of the job and its duration, in seconds
+    :rtype: tuple
+    """
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+class BackgroundWriter:
+    """
+    Pool of worker processes rendering plots and writing files while the acquisition goes on. The submitted functions
+    must be module functions receiving plain data and absolute file names, since they run in another process with its
+    own working directory
+    """
+
+    def __init__(self, workers=2):
+        """
+        Starts the worker processes
+
+        :param workers: Number of worker processes
+        :type workers: int
+        """
+        # Spawned workers do not inherit the threads and the instrument connections of the test process
+        self.executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                            initializer=use_agg_backend)
+        self.pending = []
+
+    def submit(self, function, *args):
+        """
+        Queues a job on the workers
+
+        :param function: Module function doing the job
+        :type function: function
+        :param args: Arguments of the function, copied to the worker
+
+        :return: The queued job
+        :rtype: concurrent.futures.Future
+        """
+        job = self.executor.submit(timed_call, function, *args)
+        self.pending.append((job, 'writer.' + function.__name__))
+        return job
+
+    def drain(self):
+        """
+        Waits for all queued jobs, printing their messages and profiling their durations. A failed job does not stop
+        the wait, so every file is written before its error is raised
+
+        :raises Exception: The first error raised by a job, in submission order
+        """
+        pending, self.pending = self.pending, []
+        wait([job for job, _ in pending])
+        error = None
+        for job, operation in pending:
+            if job.exception() is not None:
+                error = error or job.exception()
+                continue
+            message, duration = job.result()
+            profiler.record(operation, duration)
+            if message:
+                print(message)
+        if error is not None:
+            raise error
+
+    def close(self):
+        """
+        Waits for the queued jobs and stops the worker processes
+        """
+        try:
+            self.drain()
+        finally:
+            self.executor.shutdown()
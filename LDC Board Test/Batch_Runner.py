@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# Batch_Runner.py
+#
+# Runs accuracy test sweeps back-to-back without any prompt, from a JSON config file and/or command line arguments:
+#   python Batch_Runner.py --port 3 --instrument 10.0.6.60 --output Results --name LDC01 --step 0.01 --minimum 0
+#       --maximum 0.1 --duration 10 --repetitions 3 --degauss
+#   python Batch_Runner.py --config overnight.json
+#   python Batch_Runner.py --config overnight.json --resume
+#
+# The config file holds the connection and output settings plus a list of sweeps, each one accepting the same keys
+# as the command line arguments, e.g.
+#   {"port": 3, "instrument": "10.0.6.60", "output": "Results",
+#    "sweeps": [{"name": "LDC01", "step": 0.01, "minimum": 0, "maximum": 0.1, "duration": 10, "repetitions": 3}]}
+
+import argparse
+import json
+import os
+from datetime import datetime
+from Run_Journal import RunJournal
+
+# Keys of a sweep and their default values
+sweep_defaults = {
+    "name": None,
+    "step": None,
+    "minimum": None,
+    "maximum": None,
+    "duration": None,
+    "repetitions": 1,
+    "direction": 0,
+    "degauss": False,
+    "convergence": None,
+    "buffered": False,
+    "settling": 0.05
+}
+
+
+def parse_arguments(argv=None):
+    """
+    Reads the command line arguments
+
+    :return: The parsed arguments
+    :rtype: argparse.Namespace
+    """
+    parser = argparse.ArgumentParser(description="Headless batch runner of LDC accuracy tests")
+    parser.add_argument('--config', help="JSON file with the connection settings and the list of sweeps")
+    parser.add_argument('--port', help="COM port number or serial device of the IIB")
+    parser.add_argument('--instrument', help="IP or VISA resource of the SCPI instrument")
+    parser.add_argument('--simulate', action='store_true', default=None, help="Runs over the simulated bench")
+    parser.add_argument('--binary', action='store_true', default=None, help="Uses binary SCPI data transport")
+    parser.add_argument('--profile', action='store_true', default=None,
+                        help="Profiles the latency of the instrument calls, saved as LATENCY.json in every test")
+    parser.add_argument('--output', help="Folder where the test folders are created")
+    parser.add_argument('--resume', action='store_true', default=None,
+                        help="Resumes the tests found in the output folder, skipping what their journals hold")
+    parser.add_argument('--name', help="Test name, used as folder name")
+    parser.add_argument('--step', type=float, help="Current step, in Amperes")
+    parser.add_argument('--minimum', type=float, help="Minimum current, in Amperes")
+    parser.add_argument('--maximum', type=float, help="Maximum current, in Amperes")
+    parser.add_argument('--duration', type=float, help="Duration of each step, in seconds")
+    parser.add_argument('--repetitions', type=int, help="Number of times the sweep is run")
+    parser.add_argument('--direction', type=int, choices=(0, 1), help="0 (Ascending) or 1 (Descending)")
+    parser.add_argument('--degauss', action='store_true', default=None, help="Degausses before every repetition")
+    parser.add_argument('--convergence', type=float, help="Standard error of the mean, in mA, ending a step early")
+    parser.add_argument('--buffered', action='store_true', default=None,
+                        help="Measures the reference current with the instrument buffer")
+    parser.add_argument('--settling', type=float,
+                        help="Band, in mA, the leakage reading must stay within before each step is measured")
+    return parser.parse_args(argv)
+
+
+def load_config(arguments):
+    """
+    Merges the config file with the command line arguments, which take precedence
+
+    :param arguments: The parsed command line arguments
+    :type arguments: argparse.Namespace
+
+    :return: The settings, with the list of sweeps completed with their default values
+    :rtype: dict
+    """
+    config = {}
+    if arguments.config:
+        with open(arguments.config) as config_file:
+            config = json.load(config_file)
+    cli = {key: value for key, value in vars(arguments).items() if value is not None and key != 'config'}
+    for key in ('port', 'instrument', 'simulate', 'binary', 'output', 'resume', 'profile'):
+        if key in cli:
+            config[key] = cli.pop(key)
+    sweeps = config.get('sweeps') or [{}]
+    config['sweeps'] = []
+    for sweep in sweeps:
+        sweep = dict(sweep_defaults, **sweep)
+        sweep.update(cli)
+        missing = [key for key in ('name', 'step', 'minimum', 'maximum', 'duration') if sweep[key] is None]
+        if missing:
+            raise ValueError("Missing sweep settings: {}".format(', '.join(missing)))
+        config['sweeps'].append(sweep)
+    config.setdefault('output', os.getcwd())
+    return config
+
+
+def connect(config):
+    """
+    Connects to the IIB and the SCPI instrument, or to the simulated bench
+
+    :param config: The runner settings
+    :type config: dict
+
+    :return: The LDC board connection
+    :rtype: LDC
+    """
+    from LDC_Commands import LDC
+    from SCPI_Commands import SCPI
+
+    if config.get('simulate'):
+        from Simulated_Bench import SimulatedBench, SimulatedInstrument, SimulatedSerialDRS
+        bench = SimulatedBench(**config.get('bench', {}))
+        drs = SimulatedSerialDRS(bench)
+        drs.connect()
+        scpi = SCPI('SIM::INSTR', instrument=SimulatedInstrument(bench))
+    else:
+        import pydrs
+        port = str(config['port'])
+        drs = pydrs.SerialDRS()
+        drs.connect('COM' + port if port.isdigit() else port)
+        instrument = str(config['instrument'])
+        if '::' not in instrument:
+            instrument = 'TCPIP::' + instrument + '::inst0::INSTR'
+        scpi = SCPI(instrument)
+    if config.get('binary'):
+        scpi.set_binary_transport()
+    if config.get('profile'):
+        from Latency_Profiler import instrument_links
+        instrument_links(scpi, drs)
+    return LDC(drs=drs, scpi=scpi)
+
+
+def run_sweep(acc, sweep, output, resume=False):
+    """
+    Runs all repetitions of a sweep, saving them in the folder of the test
+
+    :param acc: The accuracy test to run
+    :type acc: AccuracyTest
+    :param sweep: The sweep settings
+    :type sweep: dict
+    :param output: Folder where the test folder is created
+    :type output: str
+    :param resume: Continues the test when its folder exists, skipping the steps and repetitions of its journal
+    :type resume: bool
+    """
+    acc.path = os.path.join(output, sweep['name'])
+    if not (resume and os.path.exists(acc.path)):
+        os.makedirs(acc.path)
+        test_date = datetime.today().strftime("%d/%m/%Y - %H:%M")
+        with open(os.path.join(acc.path, 'INFO.txt'), 'w+') as info_file:
+            info_file.write(sweep['name']+"\n"+test_date+"\nSEI - Electronics Systems and Instrumentation")
+    acc.journal = RunJournal(acc.path)
+    print(sweep['repetitions'], " tests to go!")
+    for n in range(sweep['repetitions']):
+        if acc.journal.completed(n+1):
+            print("Test {} found in the journal, skipping it".format(n+1))
+            continue
+        if sweep['degauss']:
+            acc.ldc.degauss()
+        acc.total_mean.clear()
+        acc.total_error.clear()
+        acc.total_std.clear()
+        acc.total_current.clear()
+        acc.total_ppc.clear()
+        acc.total_settling.clear()
+        acc.total_settled.clear()
+        acc.total_noise.clear()
+        acc.total_spurs.clear()
+        acc.start(sweep['step'], sweep['minimum'], sweep['maximum'], sweep['duration'], n+1, sweep['direction'],
+                  sweep['convergence'], sweep['buffered'], sweep['settling'])
+        print(sweep['repetitions']-n-1, " tests remaining !")
+
+
+def main(argv=None):
+    config = load_config(parse_arguments(argv))
+    # Plots are only saved to files, no window is ever shown
+    os.environ.setdefault('MPLBACKEND', 'Agg')
+    from Accuracy_Test import AccuracyTest
+
+    with connect(config) as ldc:
+        acc = AccuracyTest(ldc)
+        try:
+            for number, sweep in enumerate(config['sweeps']):
+                print("Sweep {0} of {1}: {2}".format(number+1, len(config['sweeps']), sweep['name']))
+                run_sweep(acc, sweep, config['output'], config.get('resume', False))
+        finally:
+            acc.close()
+    print("All sweeps completed!")
+
+
+if __name__ == '__main__':
+    main()
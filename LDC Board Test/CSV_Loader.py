@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# CSV_Loader.py
+
+import io
+import json
+import os
+import numpy as np
+
+
+def load_csv(filename, cache=True):
+    """
+    Loads all the columns of a numeric csv file in a single pass. The header lines at the top of the file are skipped
+    and the values are converted by NumPy in one call, so large logs are read in seconds. The parsed table can be kept
+    in a binary cache next to the csv file, which is memory-mapped on the next loads while the modification time and
+    the size of the csv file are unchanged
+
+    :param filename: Name of the csv file
+    :type filename: str
+    :param cache: Saves and reuses the '<filename>.npy' cache file, with the state of the csv file it was parsed from
+        in '<filename>.npy.json'
+    :type cache: bool
+
+    :return: The values, one row per csv line and one column per csv field
+    :rtype: numpy.ndarray
+    """
+    cache_name = filename + '.npy'
+    signature_name = cache_name + '.json'
+    stat = os.stat(filename)
+    signature = [stat.st_mtime_ns, stat.st_size]
+    if cache and os.path.exists(cache_name) and os.path.exists(signature_name):
+        try:
+            with open(signature_name) as signature_file:
+                if json.load(signature_file) == signature:
+                    return np.load(cache_name, mmap_mode='r')
+        except ValueError:
+            # Unreadable signature or cache, the csv file is parsed again
+            pass
+    with open(filename) as csv_file:
+        text = csv_file.read()
+    data = parse_csv(text)
+    if cache:
+        try:
+            np.save(cache_name, data)
+            with open(signature_name, 'w') as signature_file:
+                json.dump(signature, signature_file)
+        except OSError:
+            # The folder may be read-only, the data is still returned
+            pass
+    return data
+
+
+def parse_csv(text):
+    """
+    Converts the text of a csv file into a table. The lines that are not numeric at the top of the file, like titles,
+    are skipped, and blank lines are ignored
+
+    :param text: Contents of the csv file
+    :type text: str
+
+    :return: The values, one row per numeric line
+    :rtype: numpy.ndarray
+
+    :raises ValueError: If a line after the header is not numeric or does not have the columns of the first numeric
+        line, e.g. the last line of a file truncated while it was written
+    """
+    text = text.replace('\r', '')
+    start = 0
+    columns = 0
+    # Skips the header lines until the first numeric one
+    while start < len(text):
+        end = text.find('\n', start)
+        if end == -1:
+            end = len(text)
+        row = parse_row(text[start:end])
+        if row is not None:
+            columns = len(row)
+            break
+        start = end + 1
+    if columns == 0:
+        return np.empty((0, 0))
+    try:
+        return np.loadtxt(io.StringIO(text[start:]), delimiter=',', dtype=np.float64, ndmin=2)
+    except ValueError as error:
+        raise ValueError("Malformed csv table of {} columns: {}".format(columns, error)) from None
+
+
+def parse_row(line):
+    try:
+        return [float(value) for value in line.split(',')]
+    except ValueError:
+        return None
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# Capture_Store.py
+
+import json
+import os
+from datetime import datetime
+import numpy as np
+from Frequency_Response import fft_harmonics, multisine_harmonics
+
+# Samples of the captures, as sent by the oscilloscope
+capture_dtype = '<f4'
+capture_file = 'captures.f32'
+meta_file_name = 'meta.json'
+
+
+class CaptureStore:
+    """
+    Append-only store of the oscilloscope captures of a frequency response campaign. A store is a folder with a single
+    raw file holding every capture channel after channel, streamed from the oscilloscope binary blocks, and a JSON file
+    with the sample rate, the channels, the excitation parameters and the list of captures. The captures are
+    memory-mapped when the store is opened, so hundreds of them can be analysed without loading them in memory
+    """
+
+    def __init__(self, path, channels, sample_rate, excit_param=None, metadata=None):
+        """
+        Creates the store folder
+
+        :param path: Folder of the store, which must not exist
+        :type path: str
+        :param channels: Scope channels, as dicts with their 'name_instr', 'name' and 'derivative'
+        :type channels: list
+        :param sample_rate: Sample rate of the captures, in samples per second
+        :type sample_rate: float
+        :param excit_param: Excitation parameters of the campaign
+        :type excit_param: dict
+        :param metadata: Extra information saved with the store, e.g. the test settings
+        :type metadata: dict
+        """
+        self.path = path
+        self.channels = [dict(channel) for channel in channels]
+        os.makedirs(path)
+        self.info = {
+            "channels": self.channels,
+            "sample_rate": sample_rate,
+            "points": None,
+            "dtype": capture_dtype,
+            "excit_param": excit_param or {},
+            "created": datetime.today().isoformat(),
+            "captures": [],
+            "metadata": metadata or {}
+        }
+        self.save_info()
+        self.file = open(os.path.join(path, capture_file), 'ab')
+
+    def save_info(self):
+        # Replaces the metadata file in one step, so a crash never leaves it half written
+        name = os.path.join(self.path, meta_file_name)
+        with open(name + '.tmp', 'w') as meta_file:
+            json.dump(self.info, meta_file, indent=2, default=lambda value: np.asarray(value).tolist())
+        os.replace(name + '.tmp', name)
+
+    def add_capture(self, scope, **info):
+        """
+        Streams the waveforms of all channels of the last oscilloscope acquisition to the store
+
+        :param scope: SCPI oscilloscope
+        :type scope: SCPI
+        :param info: Information about the capture, e.g. its excitation frequencies
+
+        :return: The number of the capture
+        :rtype: int
+        """
+        start = self.end()
+        try:
+            points = [scope.stream_waveform(channel['name_instr'], self.file) for channel in self.channels]
+            return self.commit(points, info)
+        except BaseException:
+            self.rollback(start)
+            raise
+
+    def append(self, data, **info):
+        """
+        Adds a capture already in memory, e.g. converted from a MATLAB result file
+
+        :param data: The capture, of shape (points, channels)
+        :type data: numpy.ndarray
+        :param info: Information about the capture
+
+        :return: The number of the capture
+        :rtype: int
+        """
+        data = np.asarray(data, dtype=capture_dtype)
+        start = self.end()
+        try:
+            self.file.write(np.ascontiguousarray(data.T).tobytes())
+            return self.commit([data.shape[0]] * data.shape[1], info)
+        except BaseException:
+            self.rollback(start)
+            raise
+
+    def end(self):
+        """
+        Gives the size of the captures listed in the metadata, where the next capture starts
+
+        :return: The offset, in bytes
+        :rtype: int
+        """
+        return (len(self.info['captures']) * len(self.channels) * (self.info['points'] or 0)
+                * np.dtype(capture_dtype).itemsize)
+
+    def rollback(self, start):
+        # Drops the samples of a failed or rejected capture, which would shift the captures added after it
+        self.file.truncate(start)
+        self.file.seek(start)
+
+    def commit(self, points, info):
+        if len(set(points)) != 1 or points[0] != (self.info['points'] or points[0]):
+            raise ValueError("Capture of {} points in a store of {} points".format(points, self.info['points']))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.info['points'] = points[0]
+        self.info['captures'].append(dict(info, created=datetime.today().isoformat()))
+        self.save_info()
+        return len(self.info['captures']) - 1
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def open_store(path):
+    """
+    Memory-maps the captures of a store. Samples written after the last capture listed in the metadata, left by a
+    crash while a capture was being streamed, are ignored
+
+    :param path: Folder of the store
+    :type path: str
+
+    :return: A dictionary with the metadata under the 'meta' key and the read-only captures under the 'captures' key,
+        of shape (captures, channels, points)
+    :rtype: dict
+    """
+    with open(os.path.join(path, meta_file_name)) as meta_file:
+        info = json.load(meta_file)
+    shape = (len(info['captures']), len(info['channels']), info['points'] or 0)
+    if 0 in shape:
+        captures = np.empty(shape, dtype=info['dtype'])
+    else:
+        captures = np.memmap(os.path.join(path, capture_file), dtype=info['dtype'], mode='r', shape=shape)
+    return {'meta': info, 'captures': captures}
+
+
+def store_result(path):
+    """
+    Builds a frequency response result from a store, with the fields of the MATLAB result struct. The harmonics of a
+    sine campaign are computed a few captures at a time, the tones of a multisine campaign are stored as the harmonics
+    of a sine sweep and the data of a PRBS campaign is the first capture, left memory-mapped
+
+    :param path: Folder of the store
+    :type path: str
+
+    :rtype: dict
+    """
+    store = open_store(path)
+    info = store['meta']
+    excit_param = info['excit_param']
+    result = {
+        'name': [channel['name'] for channel in info['channels']],
+        'derivative': np.array([channel['derivative'] for channel in info['channels']]),
+        'excit_param': excit_param,
+        'Fs': info['sample_rate']
+    }
+    mode = excit_param.get('type', 'sin').lower()
+    df = info['sample_rate'] / max(info['points'] or 1, 1)
+    if mode == 'sin':
+        freq = np.array([capture['frequency'] for capture in info['captures']], dtype=np.float64)
+        bins = np.round(freq / df).astype(np.int64)
+        result['fft_harmonics'] = fft_harmonics(store['captures'].transpose(0, 2, 1), bins,
+                                                int(excit_param.get('nharm', 1)))
+        result['freq'] = bins * df
+    elif mode == 'multisine':
+        bins = [np.round(np.asarray(capture['frequencies']) / df).astype(np.int64) for capture in info['captures']]
+        harmonics = [multisine_harmonics(capture.T, capture_bins)
+                     for capture, capture_bins in zip(store['captures'], bins)]
+        order = np.argsort(np.concatenate(bins))
+        result['fft_harmonics'] = np.concatenate(harmonics, axis=2)[:, :, order]
+        result['freq'] = np.concatenate(bins)[order] * df
+    else:
+        result['data'] = store['captures'][0].T
+    return result
@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+# Frequency_Response.py
+#
+# Analyses the captures of the frequency response test, as freqresp_analyze_keysight.m and
+# compile_freqresp_results.m do in the 'Frequency Response Test' folder:
+#   python Frequency_Response.py capture1.mat capture2.npz --mode sin --tf 0 1 --legend "Idc = 0 A" "Idc = 50 mA"
+
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+
+def fft_harmonics(captures, bins, nharm, chunk=8):
+    """
+    Computes the harmonics of the sine captures of a sweep, for all channels and all frequencies at once, with real
+    FFTs. The captures are transformed a few frequencies at a time to bound the memory taken by the spectra
+
+    :param captures: Captures of the sweep, one per frequency, as an array of shape (frequencies, points, channels)
+    :type captures: numpy.ndarray
+    :param bins: FFT bin of the fundamental of every frequency, i.e. round(sin_freq/df)
+    :type bins: numpy.ndarray
+    :param nharm: Number of harmonics, the fundamental included
+    :type nharm: int
+    :param chunk: Number of captures transformed together
+    :type chunk: int
+
+    :return: The harmonics, of shape (nharm, channels, frequencies) as in the MATLAB results, NaN above Nyquist
+    :rtype: numpy.ndarray
+    """
+    captures = np.asarray(captures)
+    bins = np.asarray(bins, dtype=np.int64)
+    frequencies, points, channels = captures.shape
+    # Bin of every harmonic of every frequency, MATLAB index idx*(1:nharm)+1 being the 0-based bin idx*(1:nharm)
+    harmonic_bins = bins[:, np.newaxis] * np.arange(1, nharm + 1)
+    valid = harmonic_bins <= points // 2
+    harmonic_bins = np.where(valid, harmonic_bins, 0)
+    harmonics = np.empty((frequencies, nharm, channels), dtype=np.complex128)
+    for start in range(0, frequencies, chunk):
+        stop = min(start + chunk, frequencies)
+        spectra = np.fft.rfft(captures[start:stop], axis=1)
+        harmonics[start:stop] = spectra[np.arange(stop - start)[:, np.newaxis], harmonic_bins[start:stop], :]
+    harmonics[~valid] = np.nan
+    return harmonics.transpose(1, 2, 0)
+
+
+def multisine_bins(frequencies, df, groups=1):
+    """
+    Places the test frequencies of a sweep on the FFT bins of a capture of one period of the excitation
+
+    :param frequencies: Test frequencies, in Hz
+    :type frequencies: numpy.ndarray
+    :param df: Frequency resolution, i.e. the inverse of the excitation period, in Hz
+    :type df: float
+    :param groups: Number of captures sharing the frequencies. Splitting the tones over two interleaved groups gives
+        each tone more amplitude for the same peak to peak excitation
+    :type groups: int
+
+    :return: The sorted bins of every group, with the frequencies falling on the same bin merged
+    :rtype: list
+    """
+    bins = np.unique(np.round(np.asarray(frequencies, dtype=np.float64) / df).astype(np.int64))
+    bins = bins[bins > 0]
+    return [bins[group::groups] for group in range(groups)]
+
+
+def multisine(bins, points, iterations=20):
+    """
+    Builds one period of a multisine exciting the given FFT bins with equal amplitudes. The tones start from Schroeder
+    phases and their phases are then optimized by clipping the peaks of the waveform and restoring the amplitudes of
+    the tones, which lowers the crest factor so the tones get more amplitude for the same peak to peak excitation
+
+    :param bins: Bins of the tones, below points/2
+    :type bins: numpy.ndarray
+    :param points: Number of points of the period
+    :type points: int
+    :param iterations: Number of clipping iterations
+    :type iterations: int
+
+    :return: The waveform, scaled between -1 and 1
+    :rtype: numpy.ndarray
+    """
+    bins = np.asarray(bins, dtype=np.int64)
+    tones = np.arange(len(bins))
+    spectrum = np.zeros(points // 2 + 1, dtype=np.complex128)
+    spectrum[bins] = np.exp(-1j * np.pi * tones * (tones + 1) / len(bins))
+    waveform = best = np.fft.irfft(spectrum, points)
+    for _ in range(iterations):
+        # Clipping at 1.5 times the RMS value converges faster than a fraction of the peak for sparse tones
+        limit = 1.5 * np.sqrt(np.mean(np.square(waveform)))
+        phases = np.angle(np.fft.rfft(np.clip(waveform, -limit, limit))[bins])
+        spectrum[bins] = np.exp(1j * phases)
+        waveform = np.fft.irfft(spectrum, points)
+        if crest_factor(waveform) < crest_factor(best):
+            best = waveform
+    return best / np.abs(best).max()
+
+
+def crest_factor(waveform):
+    """
+    Gives the ratio of the peak value of a waveform to its RMS value
+
+    :rtype: float
+    """
+    return float(np.abs(waveform).max() / np.sqrt(np.mean(np.square(waveform))))
+
+
+def multisine_harmonics(data, bins):
+    """
+    Extracts the tones of a multisine capture, for all channels at once
+
+    :param data: Capture, of shape (points, channels), holding a whole number of periods of the excitation
+    :type data: numpy.ndarray
+    :param bins: Bins of the tones for one period of the capture
+    :type bins: numpy.ndarray
+
+    :return: The tones, of shape (1, channels, tones) as the harmonics of a sine sweep
+    :rtype: numpy.ndarray
+    """
+    return np.fft.rfft(data, axis=0)[np.asarray(bins, dtype=np.int64)].T[np.newaxis]
+
+
+def analyze(result, mode='sin', tfdef=((0, 1),)):
+    """
+    Computes the transfer functions of a frequency response capture, as freqresp_analyze_keysight.m does
+
+    :param result: Capture with the fields of the MATLAB result struct: 'name', 'derivative', 'excit_param', plus
+        'data' and 'Fs' for a PRBS capture or 'fft_harmonics' and 'freq' for a sine sweep
+    :type result: dict
+    :param mode: Excitation type, 'PRBS', 'sin' or 'multisine'. Multisine captures measured by measure_multisine
+        hold their tones as the harmonics of a sine sweep and are analysed as 'sin'
+    :type mode: str
+    :param tfdef: Input and output channels of every transfer function, 0-based, e.g. ((0, 1),) for the MATLAB [1,2]
+    :type tfdef: tuple
+
+    :return: The frequencies 'f', the transfer functions 'fresp' of shape (frequencies, transfer functions) and their
+        'legend'
+    :rtype: dict
+    """
+    if mode.lower() == 'prbs':
+        data = np.asarray(result['data'], dtype=np.float64)
+        points = data.shape[0]
+        f = np.arange(points // 2 + 1) * result['Fs'] / points
+        # Bins from the first one above DC up to the PRBS bit rate
+        last = int(np.searchsorted(f, result['excit_param']['prbs_rate'], side='right'))
+        y = np.fft.rfft(data, axis=0)[1:last]
+        f = f[1:last]
+    elif mode.lower() == 'sin':
+        y = np.asarray(result['fft_harmonics'])[0].T
+        f = np.asarray(result['freq'], dtype=np.float64).ravel()
+    elif mode.lower() == 'multisine':
+        data = np.asarray(result['data'], dtype=np.float64)
+        df = result['excit_param']['df']
+        periods = int(round(data.shape[0] * df / result['Fs']))
+        bins = np.concatenate(multisine_bins(result['excit_param']['sin_freq'], df))
+        bins.sort()
+        y = multisine_harmonics(data, bins * periods)[0].T
+        f = bins * df
+    else:
+        raise ValueError("Unknown excitation type '{}'".format(mode))
+    # Integrates the channels measured through a derivative, all at once
+    derivative = np.asarray(result['derivative'], dtype=np.float64).ravel()
+    if derivative.any():
+        y = y * (2j * np.pi * f[:, np.newaxis]) ** -derivative
+    tfdef = np.asarray(tfdef, dtype=np.int64).reshape(-1, 2)
+    names = result['name']
+    return {
+        'f': f,
+        'fresp': y[:, tfdef[:, 1]] / y[:, tfdef[:, 0]],
+        'legend': ['{}/{}'.format(names[output], names[source]) for source, output in tfdef]
+    }
+
+
+def load_capture(name):
+    """
+    Loads a frequency response capture saved by save_capture, a capture store folder, or the 'r' struct of a MATLAB
+    result file. Reading the MATLAB files needs scipy
+
+    :param name: Name of the .npz or .mat file, or of the store folder
+    :type name: str
+
+    :return: The capture, with the fields of the MATLAB struct and its file name in 'fname'
+    :rtype: dict
+    """
+    if os.path.isdir(name):
+        from Capture_Store import store_result
+        result = store_result(name)
+    elif name.lower().endswith('.mat'):
+        result = load_mat(name)
+    else:
+        with np.load(name) as capture:
+            result = {key: capture[key] for key in capture.files}
+        result['excit_param'] = json.loads(str(result['excit_param']))
+        result['name'] = result['name'].tolist()
+    result['fname'] = os.path.splitext(os.path.basename(os.path.normpath(name)))[0]
+    return result
+
+
+def load_mat(name):
+    try:
+        from scipy.io import loadmat
+    except ImportError:
+        raise ImportError("scipy is needed to read the MATLAB file '{}'".format(name))
+    struct = loadmat(name, squeeze_me=True, struct_as_record=False)['r']
+    excit_param = {field: getattr(struct.excit_param, field) for field in struct.excit_param._fieldnames}
+    result = {
+        'name': list(np.atleast_1d(struct.name)),
+        'derivative': np.atleast_1d(struct.derivative),
+        'excit_param': excit_param
+    }
+    if hasattr(struct, 'data'):
+        result['data'] = np.asarray(struct.data, dtype=np.float64).reshape(-1, len(result['name']))
+        result['Fs'] = float(struct.Fs)
+    if hasattr(struct, 'fft_harmonics'):
+        # The squeeze drops the dimensions of length 1, e.g. a single harmonic
+        result['freq'] = np.atleast_1d(struct.freq).astype(np.float64)
+        result['fft_harmonics'] = np.asarray(struct.fft_harmonics).reshape(
+            int(excit_param['nharm']), len(result['name']), len(result['freq']))
+    return result
+
+
+def save_capture(name, result):
+    """
+    Saves a frequency response capture in a .npz file
+
+    :param name: Name of the file
+    :type name: str
+    :param result: Capture, with the fields of the MATLAB result struct
+    :type result: dict
+    """
+    fields = {key: value for key, value in result.items() if key not in ('excit_param', 'name', 'fname')}
+    np.savez(name, name=np.array(result['name'], dtype=str),
+             excit_param=json.dumps(result['excit_param'], default=lambda value: np.asarray(value).tolist()),
+             **fields)
+
+
+def analyze_file(name, mode='sin', tfdef=((0, 1),)):
+    """
+    Loads and analyses a capture file
+
+    :return: The analysis of the capture, with its file name in 'fname'
+    :rtype: dict
+    """
+    response = analyze(load_capture(name), mode, tfdef)
+    response['fname'] = os.path.splitext(os.path.basename(os.path.normpath(name)))[0]
+    return response
+
+
+def analyze_files(names, mode='sin', tfdef=((0, 1),), workers=None):
+    """
+    Analyses the capture files of a campaign in a pool of processes
+
+    :param names: Names of the capture files
+    :type names: list
+    :param mode: Excitation type, 'PRBS', 'sin' or 'multisine'
+    :type mode: str
+    :param tfdef: Input and output channels of every transfer function, 0-based
+    :type tfdef: tuple
+    :param workers: Number of processes. Default gives None, which uses one per CPU
+    :type workers: int
+
+    :return: The analyses, in the order of the files
+    :rtype: list
+    """
+    if len(names) == 1:
+        return [analyze_file(names[0], mode, tfdef)]
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        return list(pool.map(analyze_file, names, [mode] * len(names), [tfdef] * len(names)))
+
+
+def measure_multisine(generator, scope, channels, excit_param, groups=1, points=None, settling=0.5, store_path=None):
+    """
+    Measures a frequency response with a multisine excitation, all test frequencies of a group being measured in a
+    single capture of one period, instead of one capture per frequency as freqresp_keysight.m does
+
+    :param generator: SCPI arbitrary waveform generator
+    :type generator: SCPI
+    :param scope: SCPI oscilloscope
+    :type scope: SCPI
+    :param channels: Scope channels, as dicts with their 'name_instr', 'name' and 'derivative'
+    :type channels: list
+    :param excit_param: Excitation parameters of freqresp_keysight.m: 'npts', 'df', 'sin_freq', 'Voffset',
+        'Vpeak2peak' and 'navg'
+    :type excit_param: dict
+    :param groups: Number of captures sharing the test frequencies
+    :type groups: int
+    :param points: Number of points of the generator waveform. Default gives None, which uses the smallest power of 2
+        holding 8 points per period of the highest frequency
+    :type points: int
+    :param settling: Time given to the device under test to reach its steady state, in seconds
+    :type settling: float
+    :param store_path: Folder of a capture store streaming the waveforms to disk. Default gives None, which keeps
+        them in memory only
+    :type store_path: str
+
+    :return: The capture, with the tones stored as the harmonics of a sine sweep
+    :rtype: dict
+    """
+    df = excit_param['df']
+    bins = multisine_bins(excit_param['sin_freq'], df, groups)
+    if points is None:
+        points = 1 << int(np.ceil(np.log2(8 * max(group[-1] for group in bins))))
+    scope.write(':ACQuire:POINts %d' % excit_param['npts'])
+    scope.write(':ACQuire:SRATe %G' % (excit_param['npts'] * df))
+    scope.write(':TIMebase:REFerence %s' % 'LEFT')
+    if excit_param.get('navg', 1) > 1:
+        scope.write(':ACQuire:AVERage:COUNt %d' % excit_param['navg'])
+        scope.write(':ACQuire:AVERage %s' % 'ON')
+    else:
+        scope.write(':ACQuire:AVERage %s' % 'OFF')
+    npts = int(scope.query_setting(':WAVeform:POINts?')[0])
+    fs = float(scope.query_setting(':ACQuire:SRATe?')[0])
+    # The capture may hold several periods of the excitation if the scope rounded its settings
+    periods = int(round(npts * df / fs))
+    excit_param = dict(excit_param, type='multisine', nharm=1, groups=groups, points=points)
+    store = None
+    if store_path is not None:
+        from Capture_Store import CaptureStore, open_store
+        store = CaptureStore(store_path, channels, fs, excit_param)
+    harmonics = []
+    for number, group in enumerate(bins):
+        print("-- Multisine {0}/{1}: {2} tones from {3:G} to {4:G} Hz ---".format(
+            number + 1, groups, len(group), group[0] * df, group[-1] * df))
+        generator.load_arbitrary_waveform('MULTISINE', multisine(group, points), points * df)
+        generator.write(':SOURce1:VOLTage:UNIT %s' % 'VPP')
+        generator.write(':SOURce1:VOLTage %G' % excit_param['Vpeak2peak'])
+        generator.write(':SOURce1:VOLTage:OFFSet %G' % excit_param['Voffset'])
+        generator.write(':OUTPut1 %s' % 'ON')
+        generator.flush()
+        time.sleep(settling)
+        scope.write(':DIGitize', cache=False)
+        scope.flush(sync=True)
+        if store is None:
+            data = np.column_stack([scope.fetch_waveform(channel['name_instr']) for channel in channels])
+        else:
+            capture = store.add_capture(scope, frequencies=group * df)
+            data = open_store(store.path)['captures'][capture].T
+        harmonics.append(multisine_harmonics(data, group * periods))
+    if store is not None:
+        store.close()
+    order = np.argsort(np.concatenate(bins))
+    return {
+        'name': [channel['name'] for channel in channels],
+        'derivative': np.array([channel['derivative'] for channel in channels]),
+        'excit_param': excit_param,
+        'fft_harmonics': np.concatenate(harmonics, axis=2)[:, :, order],
+        'freq': np.concatenate(bins)[order] * df
+    }
+
+
+def plot_freqresp(responses, legends=None, title='LDC frequency response test', graph_name=None):
+    """
+    Plots the magnitude and the phase of frequency responses, as plot_freqresp.m does
+
+    :param responses: Analyses of the captures
+    :type responses: list
+    :param legends: Legend of every response. Default gives None, which uses the transfer function names
+    :type legends: list
+    :param title: Title of the plot
+    :type title: str
+    :param graph_name: Name of the saved image. Default gives None, which shows the plot instead
+    :type graph_name: str
+    """
+    import matplotlib.pyplot as plt
+
+    fig, (ax, ax1) = plt.subplots(2, 1, figsize=(10, 8), sharex=True)
+    f = responses[0]['f']
+    ax.semilogx([f[0], f[-1]], [-3, -3], 'k--', linewidth=2, label='-3 dB')
+    for number, response in enumerate(responses):
+        labels = response['legend'] if legends is None else [legends[number]] + [None] * len(response['legend'])
+        for fresp, label in zip(response['fresp'].T, labels):
+            ax.semilogx(response['f'], 20*np.log10(np.abs(fresp)), linewidth=2, label=label)
+            ax1.semilogx(response['f'], 180/np.pi*np.unwrap(np.angle(fresp)), linewidth=2)
+    ax.set_title(title)
+    ax.set_xlim(f[0], f[-1])
+    ax.set_ylim(-120, 20)
+    ax.set_ylabel('Magnitude [dB]')
+    ax.legend(fontsize=8, loc='lower left')
+    ax.grid(True)
+    ax1.set_ylabel('Phase [°]')
+    ax1.set_xlabel('Frequency [Hz]')
+    ax1.grid(True)
+    if graph_name is None:
+        plt.show()
+    else:
+        fig.savefig(graph_name)
+        plt.close(fig)
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Analysis of the LDC frequency response captures")
+    parser.add_argument('files', nargs='+', help="Capture files, .npz or .mat")
+    parser.add_argument('--mode', default='sin', choices=('sin', 'PRBS', 'multisine'), help="Excitation type")
+    parser.add_argument('--tf', type=int, nargs=2, action='append', metavar=('INPUT', 'OUTPUT'),
+                        help="Input and output channels of a transfer function, 0-based, can be repeated")
+    parser.add_argument('--legend', nargs='+', help="Legend of every file")
+    parser.add_argument('--workers', type=int, help="Number of processes")
+    parser.add_argument('--save', help="Name of the saved image")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    arguments = parse_arguments(argv)
+    tfdef = arguments.tf or ((0, 1),)
+    responses = analyze_files(arguments.files, arguments.mode, tfdef, arguments.workers)
+    plot_freqresp(responses, arguments.legend, graph_name=arguments.save)
+
+
+if __name__ == '__main__':
+    main()
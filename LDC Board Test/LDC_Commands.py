@@ -2,12 +2,16 @@
 # LDC_Commands.py
 
 import os
-import matplotlib.pyplot as plt
 import numpy as np
 import time
-from tkinter import Tk
-from tkinter.filedialog import askdirectory
 from datetime import datetime
+from Sample_Scheduler import SampleScheduler
+from Acquisition_Engine import AcquisitionEngine
+from Sample_Buffer import SampleBuffer
+from Running_Statistics import RunningStatistics
+from Noise_Spectrum import WelchEstimator
+from Plot_Decimation import decimate, pixel_width
+from Settling_Detector import wait_for_settling
 
 
 class LDC:
@@ -15,22 +19,32 @@ class LDC:
     Sets up the commands to control the Leakage Detection Circuit board alongside an instrument with SCPI communication
     """
 
-    def __init__(self):
+    def __init__(self, drs=None, scpi=None):
         """
         Instantiates the class, all necessary variables and modules
-        """
-        import pydrs
-        from SCPI_Commands import SCPI
 
-        self.drs = pydrs.SerialDRS()
-        port_num = int(input("Insert the number of the COM port: "))
-        com_port = 'COM' + str(port_num)
-        comunic_instrumentip = input("Insert instrument ip: ")
-        self.drs.connect(com_port)  # PyDRS Communication with IIB
-        instrument = 'TCPIP::' + str(comunic_instrumentip) + '::inst0::INSTR'
-        self.scpi = SCPI(instrument)
+        :param drs: Connected PyDRS backend, e.g. a simulated one. Default gives None, which asks for the COM port
+        :type drs: pydrs.SerialDRS
+        :param scpi: SCPI instrument backend. Default gives None, which asks for the instrument IP
+        :type scpi: SCPI
+        """
+        if drs is None:
+            import pydrs
+            drs = pydrs.SerialDRS()
+            port_num = int(input("Insert the number of the COM port: "))
+            com_port = 'COM' + str(port_num)
+            drs.connect(com_port)  # PyDRS Communication with IIB
+        if scpi is None:
+            from SCPI_Commands import SCPI
+            comunic_instrumentip = input("Insert instrument ip: ")
+            instrument = 'TCPIP::' + str(comunic_instrumentip) + '::inst0::INSTR'
+            scpi = SCPI(instrument)
+        self.drs = drs
+        self.scpi = scpi
+        self.engine = AcquisitionEngine(self.scpi, self.drs)
         self.frequency = 10
         self.period = 1 / self.frequency
+        self.scheduler = SampleScheduler(self.frequency)
         self.mean = 0
         self.maximum = 0
         self.minimum = 0
@@ -38,40 +52,117 @@ class LDC:
         self.mean_error = 0
         self.std_dev = 0
         self.test_time = 0
-        self.samples = []
-        self.time_samples = []
-        self.error = []
+        self.settling_time = 0
+        self.settled = False
+        self.noise_density = 0
+        self.spurs = []
+        self.samples = SampleBuffer()
+        self.time_samples = SampleBuffer()
+        self.reference_samples = SampleBuffer()
+        self.reference_time_samples = SampleBuffer()
+        self.error = SampleBuffer()
+        self.statistics = RunningStatistics()
+        self.error_statistics = RunningStatistics()
+        self.spectrum = WelchEstimator(self.frequency)
         print("LDC functions enabled!")
 
-    def read_ground_leakage(self, duration):
+    def wait_settling(self, tolerance=0.05, dwell=0.2, timeout=5.0, readback=False):
+        """
+        Waits for the leakage current to settle after a change of the source current. The settling band is widened
+        by the noise measured in the last acquisition, so a noisy reading settles once its mean is steady
+
+        :param tolerance: Width of the band the readings must stay within, in mA
+        :type tolerance: float
+        :param dwell: Time the readings must stay within the band, in seconds
+        :type dwell: float
+        :param timeout: Maximum waiting time, in seconds
+        :type timeout: float
+        :param readback: Also waits for the current measured by the SCPI instrument to settle
+        :type readback: bool
+
+        :return: The settling time in seconds, NaN if the reading did not settle before the timeout
+        :rtype: float
+        """
+        noise = self.statistics.std_dev if self.statistics.count > 1 else 0.0
+        reference_noise = float(np.std(self.reference_samples.values)) if len(self.reference_samples) > 1 else 0.0
+        self.settling_time, self.settled = wait_for_settling(self.engine, tolerance, dwell, timeout, readback,
+                                                             noise=noise, reference_noise=reference_noise)
+        if self.settled:
+            print("Settled in {0:.0f} ms".format(self.settling_time*1000))
+        else:
+            print("Not settled after {0:.1f} s, starting the acquisition anyway".format(timeout))
+        return self.settling_time
+
+    def read_ground_leakage(self, duration, convergence=None, buffered=False, monitor=None):
         """
         Reads the ground leakage current detected with the LDC board
 
         :param duration: Duration of the measurement in seconds
         :type duration: int
+        :param convergence: Standard error of the mean leakage, in mA, that ends the measurement before its duration.
+            Default gives None, which always measures the whole duration
+        :type convergence: float
+        :param buffered: Lets the instrument measure the reference current on its own timer and fetches the whole
+            trace at the end, so only the BSMP readings are done in the sampling loop. The instrument buffer limits it
+            to 100000 samples
+        :type buffered: bool
+        :param monitor: Started live monitor receiving every sample
+        :type monitor: LiveMonitor
 
         :return: The measured values for the leakage current
         :rtype: str
         """
         self.samples.clear()
         self.time_samples.clear()
+        self.reference_samples.clear()
+        self.reference_time_samples.clear()
         self.error.clear()
+        self.statistics.clear()
+        self.error_statistics.clear()
+        self.spectrum.clear()
         print("Waiting for acquisition...\n")
-        for x in range(int(self.frequency * duration)):
-            current_value = self.scpi.instrument.query_ascii_values(':MEASure:CURRent:DC? (%s)' % '@1')
-            self.samples.append((self.drs.read_bsmp_variable(53, 'float'))*1000)
-            self.time_samples.append(round(x * self.period, 2))
-            self.error.append((current_value[0]*1000) - self.samples[x])
-            time.sleep(self.period)
-            np_samples = np.array(self.samples)
-            np_error = np.array(self.error)
+        self.scheduler = SampleScheduler(self.frequency)
+        for buffer in (self.samples, self.time_samples, self.reference_samples, self.reference_time_samples,
+                       self.error):
+            buffer.reserve(self.frequency * duration)
+        self.engine.max_skew = 0
+        if buffered:
+            self.scpi.arm_buffered_current(int(self.frequency * duration), self.period)
+        for _ in self.scheduler.ticks(duration):
+            if buffered:
+                bsmp, bsmp_time = self.engine.read_bsmp((53,))
+            else:
+                acquisition = self.engine.acquire(53)
+                bsmp, bsmp_time = acquisition.bsmp, acquisition.bsmp_time
+                self.reference_samples.append(acquisition.reference*1000)
+                self.reference_time_samples.append(round(acquisition.reference_time - self.scheduler.start_time, 3))
+                self.error.append(self.reference_samples[-1] - bsmp[0]*1000)
+                self.error_statistics.update(self.error[-1])
+            self.samples.append(bsmp[0]*1000)
+            self.time_samples.append(round(bsmp_time - self.scheduler.start_time, 3))
+            self.statistics.update(self.samples[-1])
+            self.spectrum.update(self.samples[-1])
+            if monitor is not None:
+                monitor.push(self.time_samples[-1], self.samples[-1], statistics=self.statistics)
+            if convergence is not None and self.statistics.converged(convergence):
+                print("Leakage mean converged after {0:.1f} s".format(self.time_samples[-1]))
+                break
+        if buffered:
+            self.fetch_buffered_reference()
         self.test_time = datetime.today()
-        self.mean = np_samples.mean()
-        self.maximum = np_samples.max()
-        self.minimum = np_samples.min()
-        self.ppc = (np_samples.max() - np_samples.min())
-        self.mean_error = abs(np_error.mean())
-        self.std_dev = np_samples.std()
+        self.mean = self.statistics.mean
+        self.maximum = self.statistics.maximum
+        self.minimum = self.statistics.minimum
+        self.ppc = self.statistics.ppc
+        self.mean_error = abs(self.error_statistics.mean)
+        self.std_dev = self.statistics.std_dev
+        self.noise_density = self.spectrum.noise_density()
+        self.spurs = self.spectrum.spurs()
+        print(self.scheduler.report())
+        print("Maximum reference/leakage skew: {0:.1f} ms\n".format(self.engine.max_skew * 1000))
+        print("Noise density: {0:.4f} mA/sqrt(Hz)".format(self.noise_density) +
+              "".join("\nSpur: {0:.3f} mA rms at {1:.3f} Hz".format(amplitude, frequency)
+                      for frequency, amplitude in self.spurs) + "\n")
         return print("Mean: {0:.3f} mA\n"
                      "Maximum: {1:.3f} mA\n"
                      "Minimum: {2:.3f} mA\n"
@@ -80,23 +171,32 @@ class LDC:
                      "Standard Deviation: {5:.3f} mA\n".format(self.mean, self.maximum, self.minimum,
                                                                self.ppc, self.mean_error, self.std_dev))
 
-    def save_csv_file(self, file_name='Leakage Current'):
+    def fetch_buffered_reference(self):
+        """
+        Fetches the reference trace of a buffered measurement and computes the error of each leakage sample against
+        the reference interpolated at the sample time
+        """
+        abort = len(self.samples) < self.scpi.buffered_points
+        # The instrument counts from its trigger, the leakage samples from the start of the scheduler
+        trigger_time = self.scpi.buffered_start - self.scheduler.start_time
+        current_values, time_values = self.scpi.fetch_buffered_current(abort=abort)
+        self.reference_samples.extend(np.asarray(current_values)*1000)
+        self.reference_time_samples.extend(np.round(np.asarray(time_values) + trigger_time, 3))
+        aligned_reference = np.interp(self.time_samples.values, self.reference_time_samples.values,
+                                      self.reference_samples.values)
+        self.error.extend(aligned_reference - self.samples.values)
+        self.error_statistics.extend(self.error.values)
+
+    def save_csv_file(self, file_name='Leakage Current', folder=''):
         """
         Saves the data of a ground leakage measure in a csv format file
         :argument file_name: Gives a custom name to the file. Default gives 'Leakage Current'
+        :argument folder: Folder of the file. Default gives the current directory
 
         :return: A string confirming the execution
         :rtype: str
         """
-        name = file_name+'.csv'
-        data = [['Leakage Current'], ['Time']]
-        column0 = data[0]
-        column1 = data[1]
-        for row in range(len(self.samples)):
-            column0.append(self.samples[row])
-            column1.append(self.time_samples[row])
-        np.savetxt(name, [p for p in zip(column0, column1)], delimiter=',', fmt='%s')
-        return "CSV file named '{}' saved successfully!".format(name)
+        return write_csv_file(os.path.join(folder, file_name+'.csv'), self.samples.values, self.time_samples.values)
 
     def plot_graph(self, graph_name='Leakage Current'):
         """
@@ -104,35 +204,28 @@ class LDC:
 
         :return: Return the matplotlib window with the measure plot
         """
+        import matplotlib.pyplot as plt
+
         fig, ax = plt.subplots(1, 1, figsize=(10, 5))
         ax.locator_params(axis='y', tight=True, nbins=15)
         ax.locator_params(axis='x', tight=True, nbins=30)
-        ax.plot(self.time_samples, self.samples)
+        ax.plot(*decimate(self.time_samples.values, self.samples.values, pixel_width(fig)))
         plt.xlabel('Time [s]')
         plt.ylabel('Leakage Current [mA]')
         plt.grid()
         plt.title(graph_name)
         return plt.show()
 
-    def save_graph(self, graph_name='Leakage Current'):
+    def save_graph(self, graph_name='Leakage Current', folder=''):
         """
         Saves a jpg file of the ground leakage graphic
+        :argument folder: Folder of the file. Default gives the current directory
 
         :return: Returns a string confirming the jpg file saving
         :rtype: str
         """
-        name = graph_name+'.jpg'
-        fig, ax = plt.subplots(1, 1, figsize=(10, 5))
-        ax.locator_params(axis='y', tight=True, nbins=15)
-        ax.locator_params(axis='x', tight=True, nbins=30)
-        ax.plot(self.time_samples, self.samples)
-        plt.xlabel('Time [s]')
-        plt.ylabel('Leakage Current [mA]')
-        plt.grid()
-        plt.title(graph_name)
-        plt.savefig(name)
-        plt.close()
-        return "Graph file named '{}' saved successfully!".format(name)
+        return write_graph_file(os.path.join(folder, graph_name+'.jpg'), graph_name, self.time_samples.values,
+                                self.samples.values)
 
     def degauss(self):
         self.scpi.disable_output()
@@ -142,8 +235,75 @@ class LDC:
         time.sleep(0.15)
         return "Applied degaussing process!"
 
+    def close(self):
+        """
+        Stops the worker thread of the acquisition engine
+        """
+        self.engine.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def write_csv_file(name, samples, time_samples):
+    """
+    Writes the samples of a ground leakage measure in a csv format file. Being a module function of plain arrays, it
+    can also run in a background process
+
+    :param name: Name of the csv file
+    :type name: str
+    :param samples: Leakage current samples, in mA
+    :type samples: numpy.ndarray
+    :param time_samples: Time of each sample, in seconds
+    :type time_samples: numpy.ndarray
+
+    :return: A string confirming the execution
+    :rtype: str
+    """
+    np.savetxt(name, np.column_stack((samples, time_samples)), delimiter=',', fmt='%s',
+               header='Leakage Current,Time', comments='')
+    return "CSV file named '{}' saved successfully!".format(os.path.basename(name))
+
+
+def write_graph_file(name, graph_name, time_samples, samples):
+    """
+    Renders the ground leakage graphic to a jpg file
+
+    :param name: Name of the jpg file
+    :type name: str
+    :param graph_name: Title of the graphic
+    :type graph_name: str
+    :param time_samples: Time of each sample, in seconds
+    :type time_samples: numpy.ndarray
+    :param samples: Leakage current samples, in mA
+    :type samples: numpy.ndarray
+
+    :return: Returns a string confirming the jpg file saving
+    :rtype: str
+    """
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(1, 1, figsize=(10, 5))
+    ax.locator_params(axis='y', tight=True, nbins=15)
+    ax.locator_params(axis='x', tight=True, nbins=30)
+    ax.plot(*decimate(time_samples, samples, pixel_width(fig)))
+    plt.xlabel('Time [s]')
+    plt.ylabel('Leakage Current [mA]')
+    plt.grid()
+    plt.title(graph_name)
+    plt.savefig(name)
+    plt.close()
+    return "Graph file named '{}' saved successfully!".format(os.path.basename(name))
+
 
 if __name__ == '__main__':
+    from Live_Monitor import LiveMonitor
+    from tkinter import Tk
+    from tkinter.filedialog import askdirectory
+
     cwd = os.getcwd()
     ldc = LDC()
     read_current = float(input("Insert the desired current, in Amperes: "))
@@ -155,9 +315,13 @@ if __name__ == '__main__':
         pass
     ldc.scpi.set_current(read_current)
     current = ldc.scpi.measure_current()
-    time.sleep(0.15)
-    ldc.read_ground_leakage(read_duration)
+    ldc.wait_settling()
+    monitor = LiveMonitor('Leakage Current, Iref = {0:.1f}mA'.format(current*1000))
+    monitor.start()
+    ldc.read_ground_leakage(read_duration, monitor=monitor)
+    monitor.close()
     ldc.scpi.disable_output()
+    ldc.close()
     ldc.plot_graph()
     answer = int(input("Save plot and csv file? 1(yes)/0(No): "))
     if answer == 1:
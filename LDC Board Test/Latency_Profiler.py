@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# Latency_Profiler.py
+
+import functools
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+import numpy as np
+from BSMP_Group import BSMPGroup
+
+# Histogram bins: 10 per decade from 1 us to 1000 s, plus one bin below and one above
+bins_per_decade = 10
+first_decade = -6
+last_decade = 3
+bin_count = (last_decade - first_decade) * bins_per_decade + 2
+# VISA status code of a timed out operation
+visa_timeout_code = -1073807339
+
+
+class OperationStatistics:
+    """
+    Latency histogram and counters of one operation. The calls are recorded from the sampling loop, the worker
+    threads of the acquisition engines and the board links, so the counters are updated under a lock
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.count = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.total = 0.0
+        self.minimum = math.inf
+        self.maximum = 0.0
+        self.histogram = np.zeros(bin_count, dtype=np.int64)
+
+    def record(self, duration, error=False, timed_out=False):
+        if duration > 0:
+            index = min(max(int((math.log10(duration) - first_decade) * bins_per_decade) + 1, 0), bin_count - 1)
+        else:
+            index = 0
+        with self.lock:
+            self.count += 1
+            self.errors += error
+            self.timeouts += timed_out
+            self.total += duration
+            self.minimum = min(self.minimum, duration)
+            self.maximum = max(self.maximum, duration)
+            self.histogram[index] += 1
+
+    def percentile(self, fraction):
+        """
+        Upper edge of the histogram bin holding the given fraction of the calls, bounded by the slowest call
+
+        :rtype: float
+        """
+        if self.count == 0:
+            return 0.0
+        index = int(np.searchsorted(np.cumsum(self.histogram), fraction * self.count))
+        return min(10 ** (first_decade + index / bins_per_decade), self.maximum)
+
+    def summary(self):
+        """
+        Gives the statistics of the operation, in seconds
+
+        :rtype: dict
+        """
+        with self.lock:
+            return {
+                "count": self.count,
+                "errors": self.errors,
+                "timeouts": self.timeouts,
+                "total": self.total,
+                "mean": self.total / self.count if self.count else 0.0,
+                "minimum": self.minimum if self.count else 0.0,
+                "maximum": self.maximum,
+                "p50": self.percentile(0.5),
+                "p90": self.percentile(0.9),
+                "p99": self.percentile(0.99),
+                "histogram": self.histogram.tolist()
+            }
+
+
+class LatencyProfiler:
+    """
+    Records the latency of named operations, e.g. the SCPI queries, the BSMP readings, the ticks of the sampling loop
+    and the saved files, in logarithmic histograms. Recording costs two clock readings and a few additions per call,
+    and nothing while the profiler is disabled
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.operations = {}
+
+    def clear(self):
+        """
+        Discards all recorded calls
+        """
+        self.operations = {}
+
+    def record(self, operation, duration, error=False, timed_out=False):
+        """
+        Adds a call to the statistics of an operation
+
+        :param operation: Name of the operation, e.g. 'scpi.query'
+        :type operation: str
+        :param duration: Duration of the call, in seconds
+        :type duration: float
+        :param error: The call raised an error
+        :type error: bool
+        :param timed_out: The call timed out
+        :type timed_out: bool
+        """
+        if not self.enabled:
+            return
+        statistics = self.operations.get(operation)
+        if statistics is None:
+            # Two threads may record the first call of an operation at the same time, only one statistics is kept
+            statistics = self.operations.setdefault(operation, OperationStatistics())
+        statistics.record(duration, error, timed_out)
+
+    @contextmanager
+    def measure(self, operation):
+        """
+        Records the duration of the code block run in the context
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as exception:
+            self.record(operation, time.perf_counter() - start, True, is_timeout(exception))
+            raise
+        self.record(operation, time.perf_counter() - start)
+
+    def wrap(self, function, operation, timed_out=None):
+        """
+        Gives a version of a function recording the duration of every call
+
+        :param function: The function
+        :type function: function
+        :param operation: Name of the operation
+        :type operation: str
+        :param timed_out: Tells from the result and the arguments of a call if it timed out, for the functions that
+            do not raise on a timeout, like the read of a serial port
+        :type timed_out: function
+
+        :return: The wrapped function
+        :rtype: function
+        """
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            if not self.enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                result = function(*args, **kwargs)
+            except Exception as exception:
+                self.record(operation, time.perf_counter() - start, True, is_timeout(exception))
+                raise
+            self.record(operation, time.perf_counter() - start, False,
+                        timed_out is not None and timed_out(result, *args))
+            return result
+        return timed
+
+    def instrument(self, target, methods, prefix):
+        """
+        Replaces methods of an object by versions recording their calls as '<prefix>.<method>'
+
+        :param target: The object, e.g. a VISA resource or a PyDRS connection
+        :param methods: Names of the methods
+        :type methods: tuple
+        :param prefix: Prefix of the operation names
+        :type prefix: str
+        """
+        for method in methods:
+            setattr(target, method, self.wrap(getattr(target, method), prefix + '.' + method))
+
+    def summary(self):
+        """
+        Formats the statistics of all operations as a table, in milliseconds
+
+        :rtype: str
+        """
+        lines = ["{0:<32}{1:>8}{2:>10}{3:>10}{4:>10}{5:>10}{6:>10}{7:>12}{8:>8}".format(
+            'Operation', 'Calls', 'Mean', 'p50', 'p90', 'p99', 'Max', 'Total [s]', 'Errors')]
+        for operation, statistics in sorted(self.operations.items()):
+            values = statistics.summary()
+            lines.append("{0:<32}{1:>8}{2:>10.2f}{3:>10.2f}{4:>10.2f}{5:>10.2f}{6:>10.2f}{7:>12.2f}{8:>8}".format(
+                operation, values['count'], values['mean']*1000, values['p50']*1000, values['p90']*1000,
+                values['p99']*1000, values['maximum']*1000, values['total'],
+                '{0}/{1}'.format(values['errors'], values['timeouts'])))
+        return '\n'.join(lines) + "\n(Latencies in ms, errors/timeouts)\n"
+
+    def save(self, name):
+        """
+        Saves the statistics of all operations in a JSON file, for trend tracking
+
+        :param name: Name of the JSON file
+        :type name: str
+        """
+        edges = [10 ** (first_decade + index / bins_per_decade) for index in range(bin_count - 1)]
+        with open(name, 'w') as json_file:
+            json.dump({
+                "created": datetime.today().isoformat(),
+                "bin_edges": edges,
+                "operations": {operation: statistics.summary()
+                               for operation, statistics in sorted(self.operations.items())}
+            }, json_file, indent=2)
+
+    def report(self, name=None):
+        """
+        Prints the summary of the last run, saves it when a file name is given and starts over
+
+        :param name: Name of the JSON file. Default gives None, which only prints the summary
+        :type name: str
+        """
+        if not self.enabled or not self.operations:
+            return
+        print(self.summary())
+        if name is not None:
+            self.save(name)
+            print("Latency file named '{}' saved successfully!".format(name))
+        self.clear()
+
+
+def is_timeout(exception):
+    return (isinstance(exception, TimeoutError) or 'timeout' in type(exception).__name__.lower()
+            or getattr(exception, 'error_code', None) == visa_timeout_code)
+
+
+def short_read(reply, size=1):
+    return len(reply) < size
+
+
+# Profiler shared by the acquisition modules, disabled until instrument_links is called
+profiler = LatencyProfiler()
+
+
+def instrument_links(scpi, drs):
+    """
+    Enables the shared profiler and instruments the I/O calls of the SCPI instrument and of the IIB connection
+
+    :param scpi: SCPI instrument
+    :type scpi: SCPI
+    :param drs: PyDRS connection with the IIB
+    :type drs: pydrs.SerialDRS
+    """
+    profiler.instrument(scpi.instrument, ('write', 'query', 'query_ascii_values', 'query_binary_values'), 'scpi')
+    profiler.instrument(drs, ('read_bsmp_variable',), 'bsmp')
+    # The groups are created by the tests, so their reads are instrumented once on the class
+    if not hasattr(BSMPGroup.read, '__wrapped__'):
+        BSMPGroup.read = profiler.wrap(BSMPGroup.read, 'bsmp.read_group')
+    # The serial port returns a short reply instead of raising when it times out
+    drs.ser.read = profiler.wrap(drs.ser.read, 'bsmp.serial_read', short_read)
+    profiler.enabled = True
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# Live_Monitor.py
+
+import multiprocessing
+import queue
+import time
+from collections import deque
+import numpy as np
+from Running_Statistics import RunningStatistics
+
+# Message telling the monitor process that the acquisition is over
+end_of_run = None
+
+
+class LiveMonitor:
+    """
+    Live plot of an acquisition, drawn by its own process so rendering never delays the sampling loop. The samples are
+    pushed through a queue in batches, once per redraw, and the monitor redraws only the traces and the statistics
+    with matplotlib blitting, over a scrolling window of the last samples
+    """
+
+    def __init__(self, title='Leakage Current', window=300, temperature=False, interval=0.2, capacity=1000):
+        """
+        Sets up the monitor, without opening it
+
+        :param title: Title of the plot
+        :type title: str
+        :param window: Time span shown, in seconds
+        :type window: float
+        :param temperature: Also plots a temperature trace on a second axis
+        :type temperature: bool
+        :param interval: Time between two redraws, in seconds
+        :type interval: float
+        :param capacity: Largest number of batches waiting in the queue, the newer ones being dropped when the monitor
+            falls behind
+        :type capacity: int
+        """
+        self.title = title
+        self.window = window
+        self.temperature = temperature
+        self.interval = interval
+        context = multiprocessing.get_context('spawn')
+        self.queue = context.Queue(capacity)
+        self.dropped = 0
+        self.batch = []
+        self.statistics = None
+        self.sent_time = 0
+        self.process = context.Process(target=run_monitor,
+                                       args=(self.queue, title, window, temperature, interval), daemon=True)
+
+    def start(self):
+        """
+        Opens the monitor window
+        """
+        self.process.start()
+
+    def push(self, time_sample, leakage, temperature=None, statistics=None):
+        """
+        Sends a sample to the monitor, never blocking the acquisition. The samples are sent once per redraw interval,
+        and a batch is dropped when the queue is full or the monitor window was closed
+
+        :param time_sample: Time of the sample, in seconds
+        :type time_sample: float
+        :param leakage: Leakage current, in mA
+        :type leakage: float
+        :param temperature: Temperature, in Celsius
+        :type temperature: float
+        :param statistics: Statistics of the leakage current kept by the acquisition, sent with every batch. They
+            cover all samples, dropped ones included. Default gives None, which shows the statistics of the samples
+            plotted by the monitor
+        :type statistics: RunningStatistics
+        """
+        if not self.process.is_alive():
+            return
+        self.batch.append((float(time_sample), float(leakage), temperature))
+        if statistics is not None:
+            self.statistics = statistics
+        if time.monotonic() - self.sent_time >= self.interval:
+            self.send()
+
+    def send(self):
+        """
+        Sends the pending samples to the monitor, with the statistics of the acquisition and the number of samples
+        dropped so far
+        """
+        batch, self.batch = self.batch, []
+        self.sent_time = time.monotonic()
+        if not batch:
+            return
+        summary = None if self.statistics is None else self.statistics.summary()
+        try:
+            self.queue.put_nowait((batch, summary, self.dropped))
+        except queue.Full:
+            self.dropped += len(batch)
+
+    def close(self):
+        """
+        Tells the monitor the acquisition is over and waits for its process to close the window
+        """
+        if self.process.is_alive():
+            self.send()
+            try:
+                self.queue.put(end_of_run, timeout=5.0)
+            except queue.Full:
+                # The monitor stopped reading its queue
+                self.process.terminate()
+            self.process.join()
+        # Samples left in the queue of a closed window have no reader, waiting to flush them would hang at exit
+        self.queue.cancel_join_thread()
+        self.queue.close()
+        if self.dropped:
+            print("Live monitor behind the acquisition, {} samples not plotted".format(self.dropped))
+
+
+def run_monitor(samples, title, window, temperature, interval):
+    """
+    Body of the monitor process
+
+    :param samples: Queue of the samples pushed by the acquisition
+    :type samples: multiprocessing.Queue
+    """
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(1, 1, figsize=(10, 5))
+    ax.set_xlabel('Time [s]')
+    ax.set_ylabel('Leakage Current [mA]', color='tab:blue')
+    ax.set_title(title)
+    ax.grid(True)
+    leakage_line, = ax.plot([], [], color='tab:blue', animated=True)
+    artists = [leakage_line]
+    if temperature:
+        ax1 = ax.twinx()
+        ax1.set_ylabel('Temperature [°C]', color='tab:red')
+        temperature_line, = ax1.plot([], [], color='tab:red', animated=True)
+        artists.append(temperature_line)
+    text = ax.text(0.01, 0.98, '', transform=ax.transAxes, va='top', family='monospace', animated=True)
+    artists.append(text)
+    times = deque()
+    leakages = deque()
+    temperatures = deque()
+    statistics = RunningStatistics()
+    temperature_statistics = RunningStatistics()
+    # Statistics of the acquisition and number of dropped samples, sent with the batches
+    summary = None
+    dropped = 0
+    background = [None]
+
+    def on_draw(event):
+        # Full redraws, after a resize or a change of the limits, give a new background for the blitting
+        background[0] = fig.canvas.copy_from_bbox(fig.bbox)
+        for artist in artists:
+            fig.draw_artist(artist)
+
+    fig.canvas.mpl_connect('draw_event', on_draw)
+    plt.show(block=False)
+    fig.canvas.draw()
+    running = True
+    while running and plt.fignum_exists(fig.number):
+        while True:
+            try:
+                message = samples.get_nowait()
+            except queue.Empty:
+                break
+            if message is end_of_run:
+                running = False
+                break
+            batch, summary, dropped = message
+            for sample in batch:
+                times.append(sample[0])
+                leakages.append(sample[1])
+                statistics.update(sample[1])
+                if temperature:
+                    temperatures.append(sample[2])
+                    temperature_statistics.update(sample[2])
+        # Keeps only the samples of the scrolling window
+        while times and times[0] < times[-1] - window:
+            times.popleft()
+            leakages.popleft()
+            if temperature:
+                temperatures.popleft()
+        if times:
+            x = np.fromiter(times, dtype=np.float64, count=len(times))
+            y = np.fromiter(leakages, dtype=np.float64, count=len(leakages))
+            leakage_line.set_data(x, y)
+            redraw = fit_limits(ax, x, y, window)
+            if temperature:
+                temperature_values = np.fromiter(temperatures, dtype=np.float64, count=len(temperatures))
+                temperature_line.set_data(x, temperature_values)
+                redraw = fit_limits(ax1, x, temperature_values, window) or redraw
+            text.set_text(statistics_text(summary or statistics.summary(), dropped,
+                                          temperatures[-1] if temperature else None, temperature_statistics))
+            if redraw or background[0] is None:
+                fig.canvas.draw()
+            else:
+                fig.canvas.restore_region(background[0])
+                for artist in artists:
+                    fig.draw_artist(artist)
+                fig.canvas.blit(fig.bbox)
+        fig.canvas.flush_events()
+        fig.canvas.start_event_loop(interval)
+    plt.close(fig)
+
+
+def fit_limits(axis, x, y, window):
+    """
+    Moves the limits of an axis when the traces leave them. The time axis jumps a quarter of the window at a time and
+    the value axis is fitted with a margin when the trace leaves it or shrinks to a fraction of it, so the full
+    redraws stay rare
+
+    :return: True when the limits changed and the axis must be redrawn
+    :rtype: bool
+    """
+    redraw = False
+    left, right = axis.get_xlim()
+    if x[-1] > right or abs(right - left - window) > 1e-6 * window:
+        left = max(0.0, x[-1] - 0.75 * window)
+        axis.set_xlim(left, left + window)
+        redraw = True
+    bottom, top = axis.get_ylim()
+    low, high = float(np.nanmin(y)), float(np.nanmax(y))
+    if low < bottom or high > top or high - low < 0.25 * (top - bottom):
+        margin = max(0.1 * (high - low), 1e-3)
+        if (low - margin, high + margin) != (bottom, top):
+            axis.set_ylim(low - margin, high + margin)
+            redraw = True
+    return redraw
+
+
+def statistics_text(summary, dropped=0, temperature=None, temperature_statistics=None):
+    """
+    Formats the streaming statistics shown on the monitor
+
+    :param summary: Summary of the statistics of the leakage current since the start, see RunningStatistics.summary
+    :type summary: dict
+    :param dropped: Number of samples the monitor could not plot
+    :type dropped: int
+    :param temperature: Last temperature, or None when there is no temperature trace
+    :type temperature: float
+    :param temperature_statistics: Statistics of the temperature since the start
+    :type temperature_statistics: RunningStatistics
+
+    :rtype: str
+    """
+    text = ("Samples: {0} ({1} not plotted)\nMean: {2:.3f} mA (standard error {3:.4f} mA)\nStd Dev: {4:.3f} mA\n"
+            "Peak to peak: {5:.3f} mA".format(summary['count'], dropped, summary['mean'], summary['standard_error'],
+                                               summary['std_dev'], summary['ppc']))
+    if temperature is not None:
+        text += "\nTemperature: {0:.2f} °C ({1:.2f} to {2:.2f} °C)".format(
+            temperature, temperature_statistics.minimum, temperature_statistics.maximum)
+    return text
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# Multi_Board.py
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import numpy as np
+from Sample_Scheduler import SampleScheduler
+from Acquisition_Engine import AcquisitionEngine
+from Sample_Buffer import SampleBuffer
+from BSMP_Group import BSMPGroup
+from Sample_Recorder import SampleRecorder, export_csv, open_recording
+from Settling_Detector import wait_for_settling
+from Latency_Profiler import profiler
+
+
+class MultiBoardAcquisition:
+    """
+    Samples the leakage current and the temperature of several LDC boards, each one on its own IIB serial link,
+    together with a single SCPI reference. On every tick of a shared clock all links are read at the same time, one
+    thread per link, so testing N boards costs the time of one
+    """
+
+    def __init__(self, boards, scpi, frequency=10):
+        """
+        Sets up the links of the boards
+
+        :param boards: Connected PyDRS backend of every board, by serial number
+        :type boards: dict
+        :param scpi: SCPI instrument providing the reference current
+        :type scpi: SCPI
+        :param frequency: Sampling frequency, in Hz
+        :type frequency: float
+        """
+        self.serials = [str(serial) for serial in boards]
+        # The engines share the worker threads reading the links
+        self.executor = ThreadPoolExecutor(max_workers=len(boards) + 1)
+        self.engines = [AcquisitionEngine(scpi, drs, self.executor) for drs in boards.values()]
+        self.scpi = scpi
+        self.frequency = frequency
+        self.scheduler = SampleScheduler(frequency)
+        self.groups = [None] * len(self.engines)
+        self.columns = (['time'] + ['leakage_' + serial for serial in self.serials]
+                        + ['temperature_' + serial for serial in self.serials] + ['reference'])
+        self.data = {column: SampleBuffer() for column in self.columns}
+        self.max_skew = 0
+        self.test_time = 0
+        self.recording_path = None
+
+    def create_bsmp_groups(self):
+        """
+        Creates the temperature (52) and leakage current (53) group on every IIB. The boards that do not acknowledge
+        the group have their variables read one by one
+        """
+        for index, engine in enumerate(self.engines):
+            group = BSMPGroup(engine.drs, (52, 53))
+            if group.create():
+                self.groups[index] = group
+            else:
+                print("BSMP group not created on board #{}, reading the variables one by one".format(
+                    self.serials[index]))
+
+    def acquire(self):
+        """
+        Reads all boards and the reference current concurrently
+
+        :return: The reference reading and the readings of every board, each one with its timestamp
+        :rtype: tuple
+        """
+        reference = self.executor.submit(self.engines[0].read_reference)
+        readings = [self.executor.submit(engine.read_bsmp, (52, 53), group)
+                    for engine, group in zip(self.engines, self.groups)]
+        return reference.result(), [reading.result() for reading in readings]
+
+    def wait_settling(self, tolerance=0.05, dwell=0.2, timeout=5.0):
+        """
+        Waits for the leakage current of every board to settle after a change of the source current. Each board has
+        its own response, so all of them are watched concurrently, against a band widened by the noise of their last
+        10 seconds of acquisition
+
+        :param tolerance: Width of the band the readings must stay within, in mA
+        :type tolerance: float
+        :param dwell: Time the readings must stay within the band, in seconds
+        :type dwell: float
+        :param timeout: Maximum waiting time, in seconds
+        :type timeout: float
+
+        :return: The settling time of every board in seconds, NaN for the boards that did not settle before the timeout
+        :rtype: list
+        """
+        waits = []
+        dataset = self.dataset()
+        for engine, serial in zip(self.engines, self.serials):
+            samples = dataset['leakage_' + serial][-int(10 * self.frequency):]
+            noise = float(np.std(samples)) if len(samples) > 1 else 0.0
+            waits.append(self.executor.submit(wait_for_settling, engine, tolerance, dwell, timeout, noise=noise))
+        settling_times = []
+        for serial, wait in zip(self.serials, waits):
+            settling_time, settled = wait.result()
+            if settled:
+                print("Board #{0} settled in {1:.0f} ms".format(serial, settling_time*1000))
+            else:
+                print("Board #{0} not settled after {1:.1f} s, starting anyway".format(serial, timeout))
+            settling_times.append(settling_time)
+        return settling_times
+
+    def run(self, duration, record_path=None):
+        """
+        Samples all boards during the given time
+
+        :param duration: Duration of the measurement in seconds
+        :type duration: int
+        :param record_path: Folder where the samples are streamed to disk during the test, see SampleRecorder. The
+            rows are then not kept in memory, the dataset being read back from the recording. Default gives None,
+            which keeps the samples in memory only
+        :type record_path: str
+
+        :return: The dataset, with the array of every column by name
+        :rtype: dict
+        """
+        for buffer in self.data.values():
+            buffer.clear()
+        self.create_bsmp_groups()
+        self.recording_path = record_path
+        recorder = None
+        if record_path is not None:
+            recorder = SampleRecorder(record_path, self.columns, metadata={
+                "frequency": self.frequency, "duration": duration, "boards": self.serials})
+        else:
+            for buffer in self.data.values():
+                buffer.reserve(self.frequency * duration)
+        self.scheduler = SampleScheduler(self.frequency)
+        self.max_skew = 0
+        print("Acquisition of {} boards in progress...\n".format(len(self.serials)))
+        try:
+            for tick, _ in self.scheduler.ticks(duration):
+                (reference, reference_time), readings = self.acquire()
+                timestamps = [reference_time] + [reading_time for _, reading_time in readings]
+                self.max_skew = max(self.max_skew, max(timestamps) - min(timestamps))
+                # Every row is stamped with the mean time of its readings
+                row = ([round(sum(timestamps) / len(timestamps) - self.scheduler.start_time, 3)]
+                       + [values[1]*1000 for values, _ in readings]
+                       + [values[0] for values, _ in readings]
+                       + [reference*1000])
+                if recorder is not None:
+                    recorder.append(*row)
+                else:
+                    for column, value in zip(self.columns, row):
+                        self.data[column].append(value)
+                if tick % (10 * self.frequency) == 0:
+                    print("{0:.1f} s / ".format(row[0]) + " / ".join(
+                        "#{0}: {1:.3f} mA".format(serial, value) for serial, value in zip(self.serials, row[1:])))
+        finally:
+            if recorder is not None:
+                recorder.close()
+        self.test_time = datetime.today()
+        print(self.scheduler.report())
+        print("Maximum skew between the links: {0:.1f} ms\n".format(self.max_skew * 1000))
+        profiler.report(None if record_path is None else os.path.join(record_path, 'latency.json'))
+        return self.dataset()
+
+    def dataset(self):
+        """
+        Gives the acquired samples, memory-mapped from the recording when the run was recorded
+
+        :return: The array of every column by name
+        :rtype: dict
+        """
+        if self.recording_path is not None:
+            recording = open_recording(self.recording_path)
+            return {column: recording[column] for column in self.columns}
+        return {column: buffer.values for column, buffer in self.data.items()}
+
+    def save_csv_file(self, file_name='MULTI BOARD'):
+        """
+        Saves the time-aligned samples of all boards in a csv format file, with the time, the leakage current of each
+        board, the temperature of each board and the reference current as columns
+
+        :argument file_name: Gives a custom name to the file. Default gives 'MULTI BOARD'
+
+        :return: A string confirming the execution
+        :rtype: str
+        """
+        test_name = self.test_time.strftime('%d_%m_%Y-%H_%M_%S')
+        name = file_name+'-'+test_name+'.csv'
+        header = (['Time'] + ['Leakage Current #' + serial for serial in self.serials]
+                  + ['Temperature #' + serial for serial in self.serials] + ['Reference Current'])
+        if self.recording_path is not None:
+            export_csv(self.recording_path, name, header=header)
+        else:
+            np.savetxt(name, np.column_stack(list(self.dataset().values())), delimiter=',', fmt='%.9g',
+                       header=','.join(header), comments='')
+        return "CSV file named '{}' saved successfully!".format(name)
+
+    def close(self):
+        """
+        Stops the worker threads
+        """
+        self.executor.shutdown()
+        for engine in self.engines:
+            engine.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def connect_boards(ports):
+    """
+    Opens the serial link of every board
+
+    :param ports: COM port number or serial device of every board, by serial number
+    :type ports: dict
+
+    :return: The connected PyDRS backend of every board, by serial number
+    :rtype: dict
+    """
+    import pydrs
+
+    boards = {}
+    for serial, port in ports.items():
+        port = str(port)
+        drs = pydrs.SerialDRS()
+        drs.connect('COM' + port if port.isdigit() else port)
+        boards[serial] = drs
+    return boards
+
+
+if __name__ == '__main__':
+    from SCPI_Commands import SCPI
+
+    cwd = os.getcwd()
+    ports = {}
+    board_test = input('Serial number board in test:')
+    while board_test != '':
+        ports[board_test] = input("Insert the number of the COM port of board #{}: ".format(board_test))
+        board_test = input('Serial number board in test:')
+    comunic_instrumentip = input("Insert instrument ip: ")
+    scpi = SCPI('TCPIP::' + str(comunic_instrumentip) + '::inst0::INSTR')
+    multi = MultiBoardAcquisition(connect_boards(ports), scpi)
+    read_current = float(input("Insert the desired current, in Amperes: "))
+    read_duration = int(input("Insert the duration of the measurement, in seconds: "))
+    scpi.set_current(read_current)
+    multi.wait_settling()
+    record_path = os.path.join(cwd, 'MULTI BOARD-'+datetime.today().strftime('%d_%m_%Y-%H_%M_%S'))
+    print("Recording samples in {}".format(record_path))
+    multi.run(read_duration, record_path)
+    scpi.disable_output()
+    print(multi.save_csv_file())
+    multi.close()
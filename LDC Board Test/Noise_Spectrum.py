@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# Noise_Spectrum.py
+
+import math
+import numpy as np
+
+
+class WelchEstimator:
+    """
+    Estimates the power spectral density of a sample stream with Welch's method while the samples arrive. Every
+    segment of the stream, overlapping the previous one, is detrended, windowed and transformed as soon as it is
+    complete, and only its power spectrum is accumulated, so the memory stays bounded whatever the duration of the
+    acquisition. The density tells white noise from drift, and the spurs show e.g. the mains pickup
+    """
+
+    def __init__(self, sample_rate, segment=64, overlap=0.5):
+        """
+        Sets up the estimator
+
+        :param sample_rate: Sample rate of the stream, in Hz
+        :type sample_rate: float
+        :param segment: Number of samples of a segment, giving a frequency resolution of sample_rate/segment
+        :type segment: int
+        :param overlap: Fraction of a segment shared with the next one
+        :type overlap: float
+        """
+        self.sample_rate = sample_rate
+        self.segment = segment
+        self.step = max(int(round(segment * (1 - overlap))), 1)
+        self.window = np.hanning(segment + 2)[1:-1]
+        # One-sided density scaling, the DC and Nyquist bins holding no mirrored power
+        self.scale = np.full(segment // 2 + 1, 2.0 / (sample_rate * np.sum(self.window ** 2)))
+        self.scale[0] /= 2
+        if segment % 2 == 0:
+            self.scale[-1] /= 2
+        self.buffer = np.empty(segment, dtype=np.float64)
+        self.power = np.zeros(segment // 2 + 1, dtype=np.float64)
+        self.filled = 0
+        self.count = 0
+
+    def clear(self):
+        """
+        Discards all accumulated segments
+        """
+        self.power[:] = 0.0
+        self.filled = 0
+        self.count = 0
+
+    def update(self, value):
+        """
+        Adds a sample to the stream, transforming the segment it completes
+
+        :param value: The sample value
+        :type value: float
+        """
+        self.buffer[self.filled] = value
+        self.filled += 1
+        if self.filled == self.segment:
+            self.accumulate()
+
+    def extend(self, values):
+        """
+        Adds a batch of samples to the stream
+
+        :param values: The sample values
+        :type values: numpy.ndarray
+        """
+        values = np.asarray(values, dtype=np.float64)
+        while len(values):
+            taken = min(self.segment - self.filled, len(values))
+            self.buffer[self.filled:self.filled + taken] = values[:taken]
+            self.filled += taken
+            values = values[taken:]
+            if self.filled == self.segment:
+                self.accumulate()
+
+    def accumulate(self):
+        # Removes the linear trend of the segment, so a slow drift does not leak over the whole spectrum
+        x = np.arange(self.segment)
+        slope, intercept = np.polyfit(x, self.buffer, 1)
+        spectrum = np.fft.rfft((self.buffer - slope * x - intercept) * self.window)
+        self.power += spectrum.real ** 2 + spectrum.imag ** 2
+        self.count += 1
+        # Keeps the overlapping end of the segment as the start of the next one
+        self.buffer[:self.segment - self.step] = self.buffer[self.step:]
+        self.filled = self.segment - self.step
+
+    @property
+    def frequencies(self):
+        """
+        Frequencies of the density bins, in Hz
+
+        :rtype: numpy.ndarray
+        """
+        return np.fft.rfftfreq(self.segment, 1 / self.sample_rate)
+
+    @property
+    def psd(self):
+        """
+        Averaged power spectral density, in squared units of the samples per Hz, NaN before the first segment
+
+        :rtype: numpy.ndarray
+        """
+        if self.count == 0:
+            return np.full(len(self.power), np.nan)
+        return self.power * self.scale / self.count
+
+    def noise_density(self):
+        """
+        Gives the broadband noise density as the median of the amplitude density above DC, which the spurs do not
+        move
+
+        :return: The noise density, in units of the samples per square root of Hz
+        :rtype: float
+        """
+        return float(np.sqrt(np.median(self.psd[2:]))) if self.count else math.nan
+
+    def spurs(self, count=3, threshold=10.0):
+        """
+        Finds the dominant spurs of the spectrum, as the local maxima standing above the noise floor
+
+        :param count: Largest number of spurs
+        :type count: int
+        :param threshold: Ratio of the density of a spur to the median density, i.e. 10 dB by default
+        :type threshold: float
+
+        :return: The frequency in Hz and the RMS amplitude of every spur, in decreasing amplitude
+        :rtype: list
+        """
+        if self.count == 0:
+            return []
+        psd = self.psd
+        floor = np.median(psd[2:])
+        # Peaks above DC and the bin next to it, which hold the residual of the detrending
+        peaks = np.flatnonzero((psd[2:-1] > psd[1:-2]) & (psd[2:-1] >= psd[3:]) & (psd[2:-1] > threshold * floor)) + 2
+        # The Hann window spreads the power of a tone over three bins
+        amplitudes = np.sqrt((psd[peaks - 1] + psd[peaks] + psd[peaks + 1]) * self.sample_rate / self.segment)
+        order = np.argsort(amplitudes)[::-1][:count]
+        frequencies = self.frequencies
+        return [(float(frequencies[peaks[index]]), float(amplitudes[index])) for index in order]
+
+    def summary(self):
+        """
+        Gives the current noise figures
+
+        :return: A dictionary with the number of segments, the noise density and the dominant spurs
+        :rtype: dict
+        """
+        return {
+            "segments": self.count,
+            "noise_density": self.noise_density(),
+            "spurs": self.spurs()
+        }
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# Plot_Decimation.py
+
+import numpy as np
+
+
+def pixel_width(fig):
+    """
+    Gives the width of a figure in pixels, used as the number of buckets of its traces
+
+    :param fig: The matplotlib figure
+    :type fig: matplotlib.figure.Figure
+
+    :rtype: int
+    """
+    return int(fig.get_figwidth() * fig.dpi)
+
+
+def decimate(x, y, buckets=2000):
+    """
+    Reduces a trace to its min/max envelope. The samples are split into buckets of consecutive points and only the
+    minimum and the maximum of each bucket are kept, in their original order, so a single-sample spike still shows
+    on the plot while the number of drawn points never exceeds twice the number of buckets
+
+    :param x: Horizontal values of the trace, e.g. the time samples
+    :type x: numpy.ndarray
+    :param y: Vertical values of the trace
+    :type y: numpy.ndarray
+    :param buckets: Number of buckets, at least the pixel width of the plot for a lossless look
+    :type buckets: int
+
+    :return: The decimated horizontal and vertical values
+    :rtype: tuple
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    length = min(len(x), len(y))
+    if length <= 2 * buckets:
+        return x[:length], y[:length]
+    size = -(-length // buckets)
+    full = length // size
+    blocks = y[:full * size].reshape(full, size)
+    start = np.arange(full) * size
+    minimum = start + np.nanargmin(blocks, axis=1)
+    maximum = start + np.nanargmax(blocks, axis=1)
+    index = [[0], minimum, maximum, [length - 1]]
+    if full * size < length:
+        tail = y[full * size:length]
+        index.append(full * size + np.array([np.nanargmin(tail), np.nanargmax(tail)]))
+    # Sorted and without repeats, the first and the last samples keep the time span of the trace
+    index = np.unique(np.concatenate(index))
+    return x[index], y[index]
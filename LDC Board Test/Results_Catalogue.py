@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+# Results_Catalogue.py
+#
+# Indexes the result folders of the accuracy tests and answers queries from the cached catalogue:
+#   python Results_Catalogue.py Results --days 30 --field error
+#   python Results_Catalogue.py Results --board LDC01 --since 2022-03-01
+
+import argparse
+import os
+import re
+from datetime import datetime, timedelta
+import numpy as np
+from CSV_Loader import parse_csv
+
+# Name of the cache file in the indexed folder
+catalogue_name = '.catalogue.npz'
+# One row per measured step
+step_dtype = np.dtype([
+    ('board', 'i4'),
+    ('repetition', 'i4'),
+    ('date', 'datetime64[s]'),
+    ('setpoint', 'f8'),
+    ('mean', 'f8'),
+    ('error', 'f8'),
+    ('std_dev', 'f8'),
+    ('ppc', 'f8'),
+    ('settling', 'f8'),
+    ('noise', 'f8'),
+    ('rows', 'i8'),
+    ('file', 'i4'),
+    ('offset', 'i8'),
+    ('source', 'i4')
+])
+# Summary files of a repetition and the step field of their second column
+summary_files = {
+    'SourceCurrent_X_MeanLeakageCurrent.csv': 'mean',
+    'SourceCurrent_X_CurrentMeanError.csv': 'error',
+    'SourceCurrent_X_CurrentStandardDeviation.csv': 'std_dev',
+    'SourceCurrent_X_SettlingTime.csv': 'settling',
+    'SourceCurrent_X_NoiseDensity.csv': 'noise'
+}
+step_file = re.compile(r'^Leakage_Current_Measurement-Iref_(-?[\d.]+)mA\.csv$')
+# Repetition folders, '<n>' holding 'Samples' or '<n>\Samples' as created on other systems than Windows
+samples_folder = re.compile(r'^(\d+)(\\Samples)?$')
+
+
+class ResultsCatalogue:
+    """
+    Catalogue of the accuracy test results found under a folder, one row per measured step with its board, date,
+    repetition, setpoint, statistics and the position of its samples file. The catalogue is cached in the folder and
+    only the repetitions that are new or changed since the last update are parsed again, so the queries never read
+    the raw csv files
+    """
+
+    def __init__(self, root):
+        """
+        Loads the cached catalogue of a folder, if any
+
+        :param root: Folder holding the test folders
+        :type root: str
+        """
+        self.root = root
+        self.cache_name = os.path.join(root, catalogue_name)
+        self.steps = np.empty(0, dtype=step_dtype)
+        self.boards = []
+        self.files = []
+        self.sources = {}
+        if os.path.exists(self.cache_name):
+            with np.load(self.cache_name) as cache:
+                # A cache of an older layout is left out and everything is indexed again on the next update
+                if cache['steps'].dtype == step_dtype:
+                    self.steps = cache['steps']
+                    self.boards = cache['boards'].tolist()
+                    self.files = cache['files'].tolist()
+                    self.sources = dict(zip(cache['source_names'].tolist(),
+                                            map(tuple, cache['source_signatures'].tolist())))
+        self.file_numbers = {name: number for number, name in enumerate(self.files)}
+
+    def scan(self):
+        """
+        Finds the repetition folders under the root folder
+
+        :return: The samples folder of every repetition, with its test folder and number, by relative name
+        :rtype: dict
+        """
+        repetitions = {}
+        for test in os.scandir(self.root):
+            if not test.is_dir():
+                continue
+            for entry in os.scandir(test.path):
+                match = samples_folder.match(entry.name)
+                if not match or not entry.is_dir():
+                    continue
+                folder = entry.path if match.group(2) else os.path.join(entry.path, 'Samples')
+                if os.path.isdir(folder):
+                    repetitions[test.name + '/' + match.group(1)] = (folder, test.path, int(match.group(1)))
+        return repetitions
+
+    def update(self):
+        """
+        Indexes the new and changed repetitions, drops the removed ones and saves the cache. The samples files are
+        numbered again, only the files of the indexed repetitions being listed
+
+        :return: The number of repetitions parsed
+        :rtype: int
+        """
+        repetitions = self.scan()
+        signatures = {name: signature(folder) for name, (folder, _, _) in repetitions.items()}
+        changed = [name for name in sorted(repetitions) if self.sources.get(name) != signatures[name]]
+        names = sorted(signatures)
+        index = {name: number for number, name in enumerate(names)}
+        # Keeps the rows of the unchanged repetitions, with their source renumbered
+        old_names = list(self.sources)
+        keep = np.array([name in index and name not in changed for name in old_names] + [False], dtype=bool)
+        renumber = np.array([index.get(name, -1) for name in old_names] + [-1], dtype=np.int32)
+        steps = self.steps[keep[self.steps['source']]] if len(self.steps) else self.steps
+        steps['source'] = renumber[steps['source']]
+        # Rebuilds the file list from the kept rows, so the files of the changed and removed repetitions are dropped
+        old_files, self.files, self.file_numbers = self.files, [], {}
+        file_renumber = np.full(len(old_files) + 1, -1, dtype=np.int32)
+        for number in np.unique(steps['file'][steps['file'] >= 0]):
+            file_renumber[number] = len(self.files)
+            self.file_numbers[old_files[number]] = len(self.files)
+            self.files.append(old_files[number])
+        steps['file'] = file_renumber[steps['file']]
+        parts = [steps]
+        for name in changed:
+            folder, test_path, repetition = repetitions[name]
+            parts.append(self.index_repetition(folder, test_path, repetition, index[name]))
+        self.steps = np.concatenate(parts)
+        self.steps.sort(order=['board', 'repetition', 'setpoint'])
+        self.sources = {name: signatures[name] for name in names}
+        self.save()
+        return len(changed)
+
+    def index_repetition(self, folder, test_path, repetition, source):
+        """
+        Parses the summary and step files of a repetition
+
+        :return: The steps of the repetition
+        :rtype: numpy.ndarray
+        """
+        board, date = read_info(test_path)
+        if board not in self.boards:
+            self.boards.append(board)
+        board_number = self.boards.index(board)
+        step_files = {}
+        for entry in os.scandir(folder):
+            match = step_file.match(entry.name)
+            if match:
+                step_files['{0:.1f}'.format(float(match.group(1)))] = entry.path
+        # The summary files give the step list and the error, the step files the peak to peak and the file offsets
+        summary = {}
+        for name, field in summary_files.items():
+            path = os.path.join(folder, name)
+            if os.path.exists(path):
+                with open(path) as csv_file:
+                    # The settling time file also holds the settled flag, the value is the second column
+                    for setpoint, value in parse_csv(csv_file.read())[:, :2]:
+                        summary.setdefault('{0:.1f}'.format(setpoint), {'setpoint': setpoint})[field] = value
+        for key in step_files:
+            summary.setdefault(key, {'setpoint': float(key)})
+        steps = np.zeros(len(summary), dtype=step_dtype)
+        for row, (key, values) in zip(steps, sorted(summary.items(), key=lambda item: item[1]['setpoint'])):
+            row['board'] = board_number
+            row['repetition'] = repetition
+            row['date'] = date
+            row['source'] = source
+            for field in ('setpoint', 'mean', 'error', 'std_dev', 'settling', 'noise'):
+                row[field] = values.get(field, np.nan)
+            row['ppc'] = np.nan
+            row['file'] = -1
+            if key in step_files:
+                relative = os.path.relpath(step_files[key], self.root)
+                if relative not in self.file_numbers:
+                    self.file_numbers[relative] = len(self.files)
+                    self.files.append(relative)
+                row['file'] = self.file_numbers[relative]
+                offset, samples = read_samples(step_files[key])
+                row['offset'] = offset
+                row['rows'] = len(samples)
+                if len(samples):
+                    row['ppc'] = samples.max() - samples.min()
+                    if 'mean' not in values:
+                        row['mean'] = samples.mean()
+                        row['std_dev'] = samples.std()
+        return steps
+
+    def save(self):
+        """
+        Writes the catalogue cache
+        """
+        np.savez(self.cache_name, steps=self.steps, boards=np.array(self.boards, dtype=str),
+                 files=np.array(self.files, dtype=str), source_names=np.array(list(self.sources), dtype=str),
+                 source_signatures=np.array(list(self.sources.values()), dtype=np.int64).reshape(-1, 2))
+
+    def query(self, board=None, since=None, until=None, minimum=None, maximum=None, repetition=None):
+        """
+        Selects steps of the catalogue. Every condition left as None is not applied
+
+        :param board: Name of the board, or a list of names
+        :type board: str
+        :param since: First date of the tests
+        :type since: datetime
+        :param until: Last date of the tests
+        :type until: datetime
+        :param minimum: Minimum setpoint, in mA
+        :type minimum: float
+        :param maximum: Maximum setpoint, in mA
+        :type maximum: float
+        :param repetition: Number of the repetition
+        :type repetition: int
+
+        :return: The selected steps, whose board and file fields index the boards and files lists
+        :rtype: numpy.ndarray
+        """
+        selected = np.ones(len(self.steps), dtype=bool)
+        if board is not None:
+            names = [board] if isinstance(board, str) else board
+            numbers = [self.boards.index(name) for name in names if name in self.boards]
+            selected &= np.isin(self.steps['board'], numbers)
+        if since is not None:
+            selected &= self.steps['date'] >= np.datetime64(since, 's')
+        if until is not None:
+            selected &= self.steps['date'] <= np.datetime64(until, 's')
+        if minimum is not None:
+            selected &= self.steps['setpoint'] >= minimum
+        if maximum is not None:
+            selected &= self.steps['setpoint'] <= maximum
+        if repetition is not None:
+            selected &= self.steps['repetition'] == repetition
+        return self.steps[selected]
+
+    def samples_file(self, step):
+        """
+        Gives the full name of the samples file of a step
+
+        :rtype: str
+        """
+        return None if step['file'] < 0 else os.path.join(self.root, self.files[step['file']])
+
+
+def signature(folder):
+    """
+    Identifies the state of a repetition folder by its latest modification and its number of files
+
+    :rtype: tuple
+    """
+    entries = list(os.scandir(folder))
+    return max([entry.stat().st_mtime_ns for entry in entries] + [0]), len(entries)
+
+
+def read_info(test_path):
+    """
+    Reads the name and the date of a test from its INFO.txt file, falling back to the folder name and date
+
+    :return: The board name and the test date
+    :rtype: tuple
+    """
+    board = os.path.basename(os.path.normpath(test_path))
+    date = datetime.fromtimestamp(os.path.getmtime(test_path))
+    info_name = os.path.join(test_path, 'INFO.txt')
+    if os.path.exists(info_name):
+        with open(info_name) as info_file:
+            lines = info_file.read().split('\n')
+        if lines[0].strip():
+            board = lines[0].strip()
+        try:
+            date = datetime.strptime(lines[1].strip(), "%d/%m/%Y - %H:%M")
+        except (IndexError, ValueError):
+            pass
+    return board, np.datetime64(date, 's')
+
+
+def read_samples(name):
+    """
+    Reads the leakage current samples of a step file
+
+    :return: The byte offset of the first sample row and the leakage current samples
+    :rtype: tuple
+    """
+    with open(name, 'rb') as csv_file:
+        content = csv_file.read()
+    offset = 0
+    first_line = content.split(b'\n', 1)[0]
+    try:
+        float(first_line.split(b',')[0])
+    except ValueError:
+        offset = len(first_line) + 1
+    data = parse_csv(content[offset:].decode())
+    return offset, data[:, 0] if data.size else np.empty(0)
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Catalogue of the LDC accuracy test results")
+    parser.add_argument('root', help="Folder holding the test folders")
+    parser.add_argument('--board', action='append', help="Board name, can be repeated")
+    parser.add_argument('--since', help="First test date, as YYYY-MM-DD")
+    parser.add_argument('--days', type=int, help="Only the tests of the last days")
+    parser.add_argument('--field', default='error', choices=('mean', 'error', 'std_dev', 'ppc', 'settling', 'noise'),
+                        help="Value listed against the setpoint")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    arguments = parse_arguments(argv)
+    catalogue = ResultsCatalogue(arguments.root)
+    print("{} repetitions indexed".format(catalogue.update()))
+    since = None
+    if arguments.since:
+        since = datetime.strptime(arguments.since, '%Y-%m-%d')
+    if arguments.days:
+        since = datetime.today() - timedelta(days=arguments.days)
+    steps = catalogue.query(board=arguments.board, since=since)
+    print("{0:<24}{1:>12}{2:>22}{3:>16}".format('Board', 'Repetition', 'Date', 'Setpoint [mA]') +
+          "{0:>16}".format(arguments.field))
+    for step in steps:
+        print("{0:<24}{1:>12}{2:>22}{3:>16.3f}{4:>16.4f}".format(
+            catalogue.boards[step['board']], step['repetition'], str(step['date']).replace('T', ' '),
+            step['setpoint'], step[arguments.field]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# Run_Journal.py
+
+import json
+import os
+
+# Name of the journal file in the test folder
+journal_name = 'JOURNAL.jsonl'
+
+
+class RunJournal:
+    """
+    Persistent journal of an accuracy test campaign. Every measured step and every completed repetition is appended as
+    a JSON line and forced to disk, so an interrupted campaign can be resumed without measuring again what is done
+    """
+
+    def __init__(self, path):
+        """
+        Opens the journal of a test folder, loading the records of a previous run
+
+        :param path: Folder of the test
+        :type path: str
+        """
+        self.name = os.path.join(path, journal_name)
+        self.records = {}
+        self.repetitions = set()
+        if os.path.exists(self.name):
+            with open(self.name) as journal_file:
+                lines = journal_file.read().split('\n')
+            for line in lines:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Empty end or line cut by an interruption while it was written
+                    continue
+                if 'step' in record:
+                    self.records[(record['repetition'], record['step'])] = record
+                else:
+                    self.repetitions.add(record['repetition'])
+            if lines[-1]:
+                # Ends the cut line, so the next record starts on its own line
+                with open(self.name, 'a') as journal_file:
+                    journal_file.write('\n')
+
+    def append(self, record):
+        with open(self.name, 'a') as journal_file:
+            journal_file.write(json.dumps(record) + '\n')
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+
+    def record_step(self, repetition, step, current, mean, error, std_dev, ppc, settling, noise=None, spurs=None,
+                    settled=None):
+        """
+        Records a measured step
+
+        :param repetition: Number of the repetition
+        :type repetition: int
+        :param step: Index of the step in the sweep
+        :type step: int
+        :param current: Source current, in mA
+        :type current: float
+        :param mean: Mean leakage current, in mA
+        :type mean: float
+        :param error: Mean current error, in mA
+        :type error: float
+        :param std_dev: Standard deviation of the leakage current, in mA
+        :type std_dev: float
+        :param ppc: Peak to peak leakage current, in mA
+        :type ppc: float
+        :param settling: Settling time in ms, NaN if the reading did not settle or was not checked
+        :type settling: float
+        :param noise: Noise density of the leakage current, in mA/sqrt(Hz)
+        :type noise: float
+        :param spurs: Frequency in Hz and RMS amplitude in mA of the dominant spurs of the leakage current
+        :type spurs: list
+        :param settled: Whether the leakage current settled before the step was measured
+        :type settled: bool
+        """
+        record = {"repetition": repetition, "step": step, "current": current, "mean": mean, "error": error,
+                  "std_dev": std_dev, "ppc": ppc, "settling": settling, "noise": noise, "spurs": spurs or [],
+                  "settled": settled}
+        self.append(record)
+        self.records[(repetition, step)] = record
+
+    def record_repetition(self, repetition):
+        """
+        Records a completed repetition, with all its files saved
+
+        :param repetition: Number of the repetition
+        :type repetition: int
+        """
+        self.append({"repetition": repetition, "completed": True})
+        self.repetitions.add(repetition)
+
+    def step(self, repetition, step, current):
+        """
+        Gives the record of a measured step
+
+        :param repetition: Number of the repetition
+        :type repetition: int
+        :param step: Index of the step in the sweep
+        :type step: int
+        :param current: Source current of the step, in mA, which must match the recorded one
+        :type current: float
+
+        :return: The step record, or None if the step has not been measured
+        :rtype: dict
+        """
+        record = self.records.get((repetition, step))
+        if record is None or abs(record['current'] - current) > 1e-6:
+            return None
+        return record
+
+    def completed(self, repetition):
+        """
+        Tells if a repetition is done
+
+        :rtype: bool
+        """
+        return repetition in self.repetitions
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# Running_Statistics.py
+
+import math
+import numpy as np
+
+
+class RunningStatistics:
+    """
+    Accumulates the statistics of a sample stream in constant time per sample, using Welford's algorithm for a
+    numerically stable mean and variance. The values can be queried at any moment of an acquisition
+    """
+
+    def __init__(self):
+        """
+        Starts an empty accumulator
+        """
+        self.count = 0
+        self.mean = 0.0
+        self.minimum = 0.0
+        self.maximum = 0.0
+        self._m2 = 0.0
+
+    def clear(self):
+        """
+        Discards all accumulated samples
+        """
+        self.count = 0
+        self.mean = 0.0
+        self.minimum = 0.0
+        self.maximum = 0.0
+        self._m2 = 0.0
+
+    def update(self, value):
+        """
+        Adds a sample to the statistics
+
+        :param value: The sample value
+        :type value: float
+        """
+        value = float(value)
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        if self.count == 1:
+            self.minimum = value
+            self.maximum = value
+        elif value < self.minimum:
+            self.minimum = value
+        elif value > self.maximum:
+            self.maximum = value
+
+    def extend(self, values):
+        """
+        Adds a batch of samples to the statistics, merging their moments with the accumulated ones
+
+        :param values: The sample values
+        :type values: numpy.ndarray
+        """
+        values = np.asarray(values, dtype=np.float64)
+        count = len(values)
+        if count == 0:
+            return
+        mean = float(values.mean())
+        m2 = float(((values - mean) ** 2).sum())
+        total = self.count + count
+        delta = mean - self.mean
+        if self.count == 0:
+            self.minimum = float(values.min())
+            self.maximum = float(values.max())
+        else:
+            self.minimum = min(self.minimum, float(values.min()))
+            self.maximum = max(self.maximum, float(values.max()))
+        self._m2 += m2 + delta ** 2 * self.count * count / total
+        self.mean += delta * count / total
+        self.count = total
+
+    @property
+    def variance(self):
+        """
+        Population variance of the samples
+
+        :rtype: float
+        """
+        if self.count == 0:
+            return 0.0
+        return self._m2 / self.count
+
+    @property
+    def std_dev(self):
+        """
+        Population standard deviation of the samples
+
+        :rtype: float
+        """
+        return math.sqrt(self.variance)
+
+    @property
+    def ppc(self):
+        """
+        Peak to peak value of the samples
+
+        :rtype: float
+        """
+        return self.maximum - self.minimum
+
+    @property
+    def standard_error(self):
+        """
+        Standard error of the mean
+
+        :rtype: float
+        """
+        if self.count < 2:
+            return math.inf
+        return math.sqrt(self._m2 / (self.count - 1) / self.count)
+
+    def converged(self, tolerance, minimum_count=10):
+        """
+        Tells if the mean is known within the desired tolerance
+
+        :param tolerance: Maximum standard error of the mean, in the unit of the samples
+        :type tolerance: float
+        :param minimum_count: Number of samples required before the test can succeed
+        :type minimum_count: int
+
+        :return: True when the standard error of the mean is below the tolerance
+        :rtype: bool
+        """
+        return self.count >= minimum_count and self.standard_error <= tolerance
+
+    def summary(self):
+        """
+        Gives the current statistics
+
+        :return: A dictionary with the count, mean, maximum, minimum, peak to peak, standard deviation and standard
+            error of the mean
+        :rtype: dict
+        """
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "maximum": self.maximum,
+            "minimum": self.minimum,
+            "ppc": self.ppc,
+            "std_dev": self.std_dev,
+            "standard_error": self.standard_error
+        }
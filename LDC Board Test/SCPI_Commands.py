@@ -1,20 +1,209 @@
 #!/usr/bin/env python3
 # SCPI_Commands.py
 
+import re
+import time
+import numpy as np
+
+# Size of the reading buffer of the instrument
+max_buffered_points = 100000
+# Optional nodes of the SCPI headers, left out of the keys of the settings cache
+optional_root = 'SOUR'
+optional_nodes = ('STAT', 'IMM', 'AMPL')
+# Boolean arguments, cached as the numbers the instrument reads them as
+boolean_arguments = {'ON': '1', 'OFF': '0'}
+
+
+def setting_key(header):
+    """
+    Reduces a SCPI header to the key of its setting in the cache, so all the aliases the instrument accepts for a
+    setting share one entry: short form in uppercase, without the default suffix 1 and without the optional nodes,
+    e.g. ':SOURce1:CURRent:LEVel:IMMediate:AMPLitude' and ':CURR:LEV' both give 'CURR:LEV', while ':OUTPut2' stays
+    apart from ':OUTPut1:STATe', which gives 'OUTP'
+
+    :param header: The SCPI header, without the argument
+    :type header: str
+
+    :return: The key of the setting
+    :rtype: str
+    """
+    nodes = []
+    for node in header.strip().lstrip(':').split(':'):
+        name, suffix = re.match(r'(.*?)(\d*)$', node).groups()
+        if name != name.upper():
+            name = ''.join(char for char in name if not char.islower())
+        else:
+            # Long form in uppercase: the short form is its first four letters, or three before a vowel
+            name = name[:3] if len(name) > 4 and name[3] in 'AEIOU' else name[:4]
+        if (name in optional_nodes) if nodes else (name == optional_root):
+            continue
+        nodes.append(name + ('' if suffix == '1' else suffix))
+    return ':'.join(nodes)
+
+
 class SCPI:
     """
     Sets up a series of commands to use with an instrument compatible with SCPI communication
     """
-    def __init__(self, instrument_id):
+    def __init__(self, instrument_id, instrument=None, coalesce=False):
         """
         Connects to the desired instrument to start SCPI communication
 
         :param instrument_id: ID of the desired instrument
         :type instrument_id: string
+        :param instrument: Already opened instrument resource, e.g. a simulated one. Default gives None, which opens
+            the instrument ID with PyVISA
+        :type instrument: pyvisa.resources.MessageBasedResource
+        :param coalesce: Queues the written commands to send them with the next query in a single message
+        :type coalesce: bool
+        """
+        self.instrument_id = instrument_id
+        if instrument is None:
+            import pyvisa as visa
+            rm = visa.ResourceManager()
+            instrument = rm.open_resource(instrument_id)
+        self.instrument = instrument
+        self.buffered_points = 0
+        self.buffered_start = 0
+        self.binary = False
+        self.coalesce = coalesce
+        self.state = {}
+        self.pending = []
+        self.pending_state = {}
+
+    def write(self, command, cache=True):
+        """
+        Writes a command to the instrument. Settings already known to be held by the instrument are skipped, and in
+        coalescing mode the commands are queued to be sent with the next query or flush, in a single message. A queued
+        setting is only known to be held once its message is sent, and the whole cache is dropped when a write fails.
+        The settings are cached by their setting_key, and a command written without the cache makes the instrument
+        state of its setting unknown
+
+        :param command: The SCPI command, with its argument
+        :type command: str
+        :param cache: Skips the command when the instrument already holds the same argument. Must be False for
+            commands that trigger actions
+        :type cache: bool
+        """
+        header, _, argument = command.partition(' ')
+        key = setting_key(header)
+        argument = boolean_arguments.get(argument.strip().upper(), argument.strip())
+        if not cache:
+            self.state.pop(key, None)
+            self.pending_state.pop(key, None)
+        elif self.pending_state.get(key, self.state.get(key)) == argument:
+            return
+        if self.coalesce:
+            self.pending.append(command)
+            if cache:
+                self.pending_state[key] = argument
+            return
+        try:
+            self.instrument.write(command)
+        except BaseException:
+            self.state.clear()
+            raise
+        if cache:
+            self.state[key] = argument
+
+    def flush(self, sync=False):
+        """
+        Sends the queued commands in a single message
+
+        :param sync: Waits for the instrument to complete all operations, with *OPC?
+        :type sync: bool
+        """
+        if sync:
+            self.send(self.instrument.query, '*OPC?')
+        elif self.pending:
+            self.send(self.instrument.write)
+
+    def send(self, method, query=None, **kwargs):
+        """
+        Sends the queued commands and an optional query in a single message through a method of the instrument. The
+        queued settings are cached once the message is sent, and the whole cache is dropped if it fails, since the
+        instrument may have applied part of the message
+
+        :param method: Method of the instrument taking the message, e.g. write or query_ascii_values
+        :type method: function
+        :param query: The SCPI query ending the message
+        :type query: str
+
+        :return: The reply of the method
+        """
+        pending_state, self.pending_state = self.pending_state, {}
+        try:
+            reply = method(self.join_pending(query), **kwargs)
+        except BaseException:
+            self.state.clear()
+            raise
+        self.state.update(pending_state)
+        return reply
+
+    def join_pending(self, query=None):
+        """
+        Joins the queued commands and an optional query in a single message, emptying the queue
+
+        :return: The ';'-separated message
+        :rtype: str
+        """
+        commands = self.pending + ([query] if query else [])
+        self.pending = []
+        return ';'.join(commands)
+
+    def clear_state_cache(self):
+        """
+        Forgets the settings known to be held by the instrument, e.g. after a reset or a change on its front panel
+        """
+        self.state.clear()
+        self.pending_state.clear()
+
+    def set_binary_transport(self, enabled=True):
+        """
+        Selects the transport of the measurement data. Binary transport uses IEEE 488.2 definite-length blocks of
+        little-endian 64 bit floats, keeping the full resolution of the readings with less bytes to transfer and parse
+
+        :param enabled: True for binary blocks, False for ASCII values
+        :type enabled: bool
+
+        :return: A string confirming the operation
+        :rtype: str
+        """
+        if enabled:
+            self.write(':FORMat:DATA %s' % 'REAL,64')
+            self.write(':FORMat:BORDer %s' % 'SWAPped')
+        else:
+            self.write(':FORMat:DATA %s' % 'ASCii')
+        self.binary = enabled
+        return "Binary transport {}!".format("enabled" if enabled else "disabled")
+
+    def query_values(self, command):
+        """
+        Queries measurement or buffer values from the instrument with the selected transport. The data format only
+        applies to the measured data, settings are read with query_setting
+
+        :param command: The SCPI measurement or fetch query
+        :type command: str
+
+        :return: An array with the values
+        :rtype: numpy.ndarray
+        """
+        if self.binary:
+            return self.send(self.instrument.query_binary_values, command, datatype='d', is_big_endian=False,
+                             container=np.array)
+        return self.send(self.instrument.query_ascii_values, command, container=np.array)
+
+    def query_setting(self, command):
+        """
+        Queries a numeric setting of the instrument, always answered in ASCII whatever the data format
+
+        :param command: The SCPI query
+        :type command: str
+
+        :return: An array with the values
+        :rtype: numpy.ndarray
         """
-        import pyvisa as visa
-        rm = visa.ResourceManager()
-        self.instrument = rm.open_resource(instrument_id)
+        return self.send(self.instrument.query_ascii_values, command, container=np.array)
 
     def set_protection_voltage(self, protection_voltage):
         """
@@ -26,9 +215,9 @@ class SCPI:
         :return: A float with the actual protection voltage value
         :rtype: float
         """
-        self.instrument.write(':SOURce1:FUNCtion:MODE %s' % 'CURRent')
-        self.instrument.write(':SENSe1:VOLTage:DC:PROTection:LEVel %G' % protection_voltage)
-        protection_value = self.instrument.query_ascii_values(':SENSe:VOLTage:DC:PROTection:LEVel?')
+        self.write(':SOURce1:FUNCtion:MODE %s' % 'CURRent')
+        self.write(':SENSe1:VOLTage:DC:PROTection:LEVel %G' % protection_voltage)
+        protection_value = self.query_setting(':SENSe:VOLTage:DC:PROTection:LEVel?')
         pvoltage_result = float('{:.3f}'.format(protection_value[0]))
         return pvoltage_result
 
@@ -42,9 +231,9 @@ class SCPI:
         :return: A float with the actual protection current value
         :rtype: float
         """
-        self.instrument.write(':SOURce1:FUNCtion:MODE %s' % 'VOLTage')
-        self.instrument.write(':SENSe:CURRent:DC:PROTection:LEVel %G' % protection_current)
-        protection_value = self.instrument.query_ascii_values(':SENSe:CURRent:DC:PROTection:LEVel?')
+        self.write(':SOURce1:FUNCtion:MODE %s' % 'VOLTage')
+        self.write(':SENSe:CURRent:DC:PROTection:LEVel %G' % protection_current)
+        protection_value = self.query_setting(':SENSe:CURRent:DC:PROTection:LEVel?')
         pcurrent_result = float('{:.3f}'.format(protection_value[0]))
         return pcurrent_result
 
@@ -58,10 +247,10 @@ class SCPI:
         :return: A float with the actual output voltage value
         :rtype: float
         """
-        self.instrument.write(':SOURce1:FUNCtion:MODE %s' % 'VOLTage')
-        self.instrument.write(':SOURce1:CURRent:LEVel:IMMediate:AMPLitude %G' % voltage)
+        self.write(':SOURce1:FUNCtion:MODE %s' % 'VOLTage')
+        self.write(':SOURce1:CURRent:LEVel:IMMediate:AMPLitude %G' % voltage)
         print("The source voltage is set to %.3fV" % voltage)
-        voltage_value = self.instrument.query_ascii_values(':MEASure:VOLTage:DC? (%s)' % '@1')
+        voltage_value = self.query_values(':MEASure:VOLTage:DC? (%s)' % '@1')
         voltage_result = float('{:.3f}'.format(voltage_value[0]))
         return voltage_result
 
@@ -75,10 +264,10 @@ class SCPI:
         :return: A string with the actual output current value
         :rtype: float
         """
-        self.instrument.write(':SOURce1:FUNCtion:MODE %s' % 'CURRent')
-        self.instrument.write(':SOURce1:CURRent:LEVel:IMMediate:AMPLitude %G' % current)
+        self.write(':SOURce1:FUNCtion:MODE %s' % 'CURRent')
+        self.write(':SOURce1:CURRent:LEVel:IMMediate:AMPLitude %G' % current)
         print("The source current is set to %.3fA" % current)
-        current_value = self.instrument.query_ascii_values(':MEASure:CURRent:DC? (%s)' % '@1')
+        current_value = self.query_values(':MEASure:CURRent:DC? (%s)' % '@1')
         current_result = float('{:.3f}'.format(current_value[0]))
         return current_result
 
@@ -89,7 +278,8 @@ class SCPI:
         :return: A string confirming the operation
         :rtype: str
         """
-        self.instrument.write(':OUTPut1:STATe %d' % 1)
+        self.write(':OUTPut1:STATe %d' % 1, cache=False)
+        self.flush()
         return "Output enabled successfully!"
 
     def disable_output(self):
@@ -99,7 +289,8 @@ class SCPI:
         :return: A string confirming the operation
         :rtype: str
         """
-        self.instrument.write(':OUTPut1:STATe %d' % 0)
+        self.write(':OUTPut1:STATe %d' % 0, cache=False)
+        self.flush()
         return "Output disabled successfully!"
 
     def measure_all(self):
@@ -109,9 +300,9 @@ class SCPI:
         :return: A string with the actual values
         :rtype: dict
         """
-        voltage_value = self.instrument.query_ascii_values(':MEASure:VOLTage:DC? (%s)' % '@1')
+        voltage_value = self.query_values(':MEASure:VOLTage:DC? (%s)' % '@1')
         voltage_result = float('{:.3f}'.format(voltage_value[0]))
-        current_value = self.instrument.query_ascii_values(':MEASure:CURRent:DC? (%s)' % '@1')
+        current_value = self.query_values(':MEASure:CURRent:DC? (%s)' % '@1')
         current_result = float('{:.3f}'.format(current_value[0]))
         values_dict = {
             "voltage": voltage_result,
@@ -126,10 +317,28 @@ class SCPI:
         :return: A float with the actual current value in Amperes
         :rtype: float
         """
-        current_value = self.instrument.query_ascii_values(':MEASure:CURRent:DC? (%s)' % '@1')
+        current_value = self.query_values(':MEASure:CURRent:DC? (%s)' % '@1')
         current_result = float('{:.3f}'.format(current_value[0]))
         return current_result
 
+    def measure_current_precise(self):
+        """
+        Measures the output current without rounding
+
+        :return: A float with the actual current value in Amperes, at the full instrument resolution
+        :rtype: float
+        """
+        return float(self.query_values(':MEASure:CURRent:DC? (%s)' % '@1')[0])
+
+    def measure_voltage_precise(self):
+        """
+        Measures the output voltage without rounding
+
+        :return: A float with the actual voltage value in Volts, at the full instrument resolution
+        :rtype: float
+        """
+        return float(self.query_values(':MEASure:VOLTage:DC? (%s)' % '@1')[0])
+
     def measure_voltage(self):
         """
         Print the actual output voltage value
@@ -137,6 +346,138 @@ class SCPI:
         :return: A float with the actual voltage value in Volts
         :rtype: float
         """
-        voltage_value = self.instrument.query_ascii_values(':MEASure:VOLTage:DC? (%s)' % '@1')
+        voltage_value = self.query_values(':MEASure:VOLTage:DC? (%s)' % '@1')
         voltage_result = float('{:.3f}'.format(voltage_value[0]))
         return voltage_result
+
+    def arm_buffered_current(self, points, interval):
+        """
+        Arms the trigger system of the instrument to measure the output current on its own timer, storing the
+        readings in its buffer. The timestamps of the readings count from the trigger, whose monotonic time is kept
+        in buffered_start
+
+        :param points: Number of measurements, up to 100000
+        :type points: int
+        :param interval: Time between measurements, in seconds
+        :type interval: float
+
+        :return: A string confirming the operation
+        :rtype: str
+        """
+        if not 0 < points <= max_buffered_points:
+            raise ValueError("Buffered measurement of {0} points, the instrument buffer holds 1 to {1}".format(
+                points, max_buffered_points))
+        self.write(':SENSe1:FUNCtion "CURRent"')
+        self.write(':TRIGger1:ACQuire:SOURce %s' % 'TIMer')
+        self.write(':TRIGger1:ACQuire:TIMer %G' % interval)
+        self.write(':TRIGger1:ACQuire:COUNt %d' % points)
+        start = time.monotonic()
+        self.write(':INITiate:ACQuire (%s)' % '@1', cache=False)
+        self.flush()
+        self.buffered_start = (start + time.monotonic()) / 2
+        self.buffered_points = points
+        return "Buffered measurement of {} points armed!".format(points)
+
+    def fetch_waveform(self, source):
+        """
+        Fetches the waveform of an oscilloscope channel as single precision floats in one binary block
+
+        :param source: The oscilloscope source, e.g. 'CHANnel1'
+        :type source: str
+
+        :return: An array with the waveform samples
+        :rtype: numpy.ndarray
+        """
+        self.write(':WAVeform:FORMat %s' % 'FLOat')
+        self.write(':WAVeform:BYTeorder %s' % 'LSBFirst')
+        self.write(':WAVeform:SOURce %s' % source)
+        return self.send(self.instrument.query_binary_values, ':WAVeform:DATA?', datatype='f', is_big_endian=False,
+                         container=np.array)
+
+    def stream_waveform(self, source, output, chunk_size=1 << 20):
+        """
+        Streams the waveform of an oscilloscope channel to a file as little-endian single precision floats, copying
+        its binary block a chunk at a time instead of loading it whole
+
+        :param source: The oscilloscope source, e.g. 'CHANnel1'
+        :type source: str
+        :param output: File opened in binary mode
+        :type output: io.BufferedWriter
+        :param chunk_size: Number of bytes read at a time
+        :type chunk_size: int
+
+        :return: The number of waveform samples written
+        :rtype: int
+        """
+        self.write(':WAVeform:FORMat %s' % 'FLOat')
+        self.write(':WAVeform:BYTeorder %s' % 'LSBFirst')
+        self.write(':WAVeform:SOURce %s' % source)
+        self.send(self.instrument.write, ':WAVeform:DATA?')
+        # IEEE 488.2 definite-length block: '#', the number of length digits, the length and the data
+        header = self.instrument.read_bytes(2)
+        remaining = length = int(self.instrument.read_bytes(int(header[1:2])))
+        while remaining:
+            chunk = self.instrument.read_bytes(min(chunk_size, remaining))
+            output.write(chunk)
+            remaining -= len(chunk)
+        # Terminating new line
+        self.instrument.read_bytes(1)
+        return length // 4
+
+    def fetch_waveform_time(self):
+        """
+        Builds the time axis of the last fetched oscilloscope waveform
+
+        :return: An array with the sample times in seconds
+        :rtype: numpy.ndarray
+        """
+        x_increment = self.send(self.instrument.query_ascii_values, ':WAVeform:XINCrement?')[0]
+        x_origin = self.instrument.query_ascii_values(':WAVeform:XORigin?')[0]
+        x_reference = self.instrument.query_ascii_values(':WAVeform:XREFerence?')[0]
+        points = int(self.instrument.query_ascii_values(':ACQuire:POINts?')[0])
+        return x_increment * (np.arange(points) - x_reference) + x_origin
+
+    def load_arbitrary_waveform(self, name, waveform, sample_rate):
+        """
+        Loads a waveform in the volatile memory of an arbitrary waveform generator, as single precision floats in one
+        binary block, and selects it on the first channel
+
+        :param name: Name of the waveform in the generator
+        :type name: str
+        :param waveform: The waveform samples, between -1 and 1
+        :type waveform: numpy.ndarray
+        :param sample_rate: Sample rate of the waveform, in samples per second
+        :type sample_rate: float
+
+        :return: A string confirming the operation
+        :rtype: str
+        """
+        self.write(':DATA:VOLatile:CLEar', cache=False)
+        self.write(':FORMat:BORDer %s' % 'SWAPped')
+        self.flush()
+        self.instrument.write_binary_values(':DATA:ARBitrary %s,' % name, np.asarray(waveform, dtype=np.float32),
+                                            datatype='f', is_big_endian=False)
+        self.write(':SOURce1:FUNCtion:ARBitrary %s' % name, cache=False)
+        self.write(':SOURce1:FUNCtion %s' % 'ARB')
+        self.write(':SOURce1:FUNCtion:ARBitrary:SRATe %G' % sample_rate)
+        self.flush()
+        return "Arbitrary waveform {} of {} points loaded!".format(name, len(waveform))
+
+    def fetch_buffered_current(self, abort=False):
+        """
+        Waits for the end of a buffered measurement and fetches all its readings in one transfer
+
+        :param abort: Stops the measurement before all points are taken, fetching the readings done so far
+        :type abort: bool
+
+        :return: Arrays with the current values in Amperes and their timestamps in seconds, counted from the trigger
+        :rtype: tuple
+        """
+        if abort:
+            self.write(':ABORt:ACQuire (%s)' % '@1', cache=False)
+        else:
+            self.flush(sync=True)
+        current_values = self.query_values(':FETCh:ARRay:CURRent? (%s)' % '@1')
+        time_values = self.query_values(':FETCh:ARRay:TIME? (%s)' % '@1')
+        self.buffered_points = 0
+        return current_values, time_values
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# Sample_Buffer.py
+
+import numpy as np
+
+
+class SampleBuffer:
+    """
+    Growable typed NumPy array used to store the samples of an acquisition with a constant cost per appended value
+    """
+
+    def __init__(self, capacity=1024, dtype=np.float64):
+        """
+        Allocates the buffer
+
+        :param capacity: Number of samples preallocated
+        :type capacity: int
+        :param dtype: NumPy type of the samples
+        :type dtype: type
+        """
+        self._data = np.empty(max(int(capacity), 1), dtype=dtype)
+        self._size = 0
+
+    @property
+    def values(self):
+        """
+        View of the stored samples, without copying
+
+        :rtype: numpy.ndarray
+        """
+        return self._data[:self._size]
+
+    def reserve(self, capacity):
+        """
+        Makes sure the buffer holds at least the given number of samples without reallocating
+
+        :param capacity: Number of samples expected
+        :type capacity: int
+        """
+        capacity = int(capacity)
+        if capacity > len(self._data):
+            data = np.empty(capacity, dtype=self._data.dtype)
+            data[:self._size] = self._data[:self._size]
+            self._data = data
+
+    def append(self, value):
+        """
+        Stores a new sample, doubling the allocation when the buffer is full
+
+        :param value: The sample value
+        :type value: float
+        """
+        if self._size == len(self._data):
+            self.reserve(2 * len(self._data))
+        self._data[self._size] = value
+        self._size += 1
+
+    def extend(self, values):
+        """
+        Stores a sequence of samples at once
+
+        :param values: The sample values
+        :type values: numpy.ndarray
+        """
+        values = np.asarray(values, dtype=self._data.dtype)
+        size = self._size + len(values)
+        if size > len(self._data):
+            self.reserve(max(size, 2 * len(self._data)))
+        self._data[self._size:size] = values
+        self._size = size
+
+    def clear(self):
+        """
+        Discards all samples, keeping the allocated memory
+        """
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, index):
+        return self.values[index]
+
+    def __iter__(self):
+        return iter(self.values)
+
+    def __array__(self, dtype=None, copy=None):
+        # numpy.array asks for a copy, which must not share the memory still being appended to
+        if copy:
+            return np.array(self.values, dtype=dtype)
+        if dtype is None:
+            return self.values
+        return self.values.astype(dtype)
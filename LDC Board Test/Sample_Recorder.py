@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# Sample_Recorder.py
+
+import json
+import os
+from datetime import datetime
+import numpy as np
+
+# Columns recorded during a thermal drift test
+drift_columns = ('time', 'leakage', 'temperature', 'reference')
+
+
+class SampleRecorder:
+    """
+    Append-only recorder streaming the samples of an acquisition to disk in fixed-size chunks. A recording is a folder
+    with one raw little-endian float64 file per column and a JSON file with its metadata, so every column can be
+    memory-mapped and a crash loses at most the chunk not yet flushed
+    """
+
+    def __init__(self, path, columns=drift_columns, chunk_size=600, metadata=None):
+        """
+        Creates the recording folder
+
+        :param path: Folder of the recording, which must not exist
+        :type path: str
+        :param columns: Names of the recorded columns
+        :type columns: tuple
+        :param chunk_size: Number of rows kept in memory before they are written to disk
+        :type chunk_size: int
+        :param metadata: Extra information saved with the recording, e.g. the test settings
+        :type metadata: dict
+        """
+        self.path = path
+        self.columns = tuple(columns)
+        self.chunk_size = chunk_size
+        self.chunk = np.empty((len(self.columns), chunk_size), dtype='<f8')
+        self.rows = 0
+        self.chunk_rows = 0
+        os.makedirs(path)
+        info = {
+            "columns": self.columns,
+            "dtype": '<f8',
+            "created": datetime.today().isoformat(),
+            "metadata": metadata or {}
+        }
+        with open(os.path.join(path, 'meta.json'), 'w') as meta_file:
+            json.dump(info, meta_file, indent=2)
+        self.files = [open(column_file(path, column), 'ab') for column in self.columns]
+
+    def append(self, *values):
+        """
+        Records a row, writing the chunk to disk when it is full
+
+        :param values: The value of every column, in order
+        :type values: float
+        """
+        self.chunk[:, self.chunk_rows] = values
+        self.chunk_rows += 1
+        self.rows += 1
+        if self.chunk_rows == self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the rows kept in memory to the column files and forces them to disk
+        """
+        if self.chunk_rows == 0:
+            return
+        for data, column in zip(self.chunk, self.files):
+            column.write(data[:self.chunk_rows].tobytes())
+            column.flush()
+            os.fsync(column.fileno())
+        self.chunk_rows = 0
+
+    def close(self):
+        """
+        Flushes the remaining rows and closes the column files
+        """
+        self.flush()
+        for column in self.files:
+            column.close()
+        self.files = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def column_file(path, column):
+    return os.path.join(path, column + '.f64')
+
+
+def open_recording(path):
+    """
+    Memory-maps the columns of a recording. Columns of different lengths, left by a crash while a chunk was being
+    written, are cut to the rows complete in all of them
+
+    :param path: Folder of the recording
+    :type path: str
+
+    :return: A dictionary with the read-only array of every column and the metadata under the 'meta' key
+    :rtype: dict
+    """
+    with open(os.path.join(path, 'meta.json')) as meta_file:
+        info = json.load(meta_file)
+    item_size = np.dtype(info['dtype']).itemsize
+    rows = min(os.path.getsize(column_file(path, column)) // item_size for column in info['columns'])
+    recording = {'meta': info}
+    for column in info['columns']:
+        if rows == 0:
+            recording[column] = np.empty(0, dtype=info['dtype'])
+        else:
+            recording[column] = np.memmap(column_file(path, column), dtype=info['dtype'], mode='r', shape=(rows,))
+    return recording
+
+
+def export_csv(path, csv_name, header=None, chunk_size=100000):
+    """
+    Converts a recording to a csv file, one chunk of rows at a time
+
+    :param path: Folder of the recording
+    :type path: str
+    :param csv_name: Name of the csv file
+    :type csv_name: str
+    :param header: Titles of the columns. Default gives the column names of the recording
+    :type header: list
+
+    :return: The number of exported rows
+    :rtype: int
+    """
+    recording = open_recording(path)
+    columns = recording['meta']['columns']
+    rows = len(recording[columns[0]])
+    with open(csv_name, 'w') as csv_file:
+        csv_file.write(','.join(header or columns) + '\n')
+        for start in range(0, rows, chunk_size):
+            chunk = np.column_stack([recording[column][start:start + chunk_size] for column in columns])
+            np.savetxt(csv_file, chunk, delimiter=',', fmt='%.9g')
+    return rows
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# Sample_Scheduler.py
+
+import time
+from Latency_Profiler import profiler
+
+
+class SampleScheduler:
+    """
+    Paces an acquisition loop on absolute monotonic deadlines, so the time spent reading the instruments does not
+    stretch the sampling period
+    """
+
+    def __init__(self, frequency, late_tolerance=None, name='acquisition'):
+        """
+        Sets up the scheduler for the desired sample rate
+
+        :param frequency: Nominal sample rate, in Hertz
+        :type frequency: float
+        :param late_tolerance: Delay after a deadline, in seconds, from which a tick is counted as late. Default gives
+            half of the sampling period
+        :type late_tolerance: float
+        :param name: Name of the loop, under which the duration of its ticks is profiled as 'loop.<name>'
+        :type name: str
+        """
+        self.frequency = frequency
+        self.period = 1 / frequency
+        if late_tolerance is None:
+            late_tolerance = self.period / 2
+        self.late_tolerance = late_tolerance
+        self.operation = 'loop.' + name
+        self.start_time = 0
+        self.elapsed = 0
+        self.ticks_done = 0
+        self.late_ticks = 0
+        self.missed_ticks = 0
+        self.max_lateness = 0
+
+    def ticks(self, duration):
+        """
+        Yields once per sampling deadline until the duration is over. Deadlines that could not be served because the
+        previous tick overran a whole period are skipped and counted as missed, so the run never lasts longer than
+        requested
+
+        :param duration: Duration of the acquisition, in seconds
+        :type duration: float
+
+        :return: The index of the deadline in the nominal grid and the elapsed time since the start, in seconds
+        :rtype: tuple
+        """
+        total_ticks = int(self.frequency * duration)
+        self.ticks_done = 0
+        self.late_ticks = 0
+        self.missed_ticks = 0
+        self.max_lateness = 0
+        self.elapsed = 0
+        self.start_time = time.monotonic()
+        tick = 0
+        while tick < total_ticks:
+            deadline = self.start_time + tick * self.period
+            now = time.monotonic()
+            if now < deadline:
+                time.sleep(deadline - now)
+                now = time.monotonic()
+            lateness = now - deadline
+            if lateness >= self.period:
+                skipped = int(lateness // self.period)
+                self.missed_ticks += min(skipped, total_ticks - tick)
+                tick += skipped
+                if tick >= total_ticks:
+                    break
+                lateness -= skipped * self.period
+            if lateness > self.late_tolerance:
+                self.late_ticks += 1
+            self.max_lateness = max(self.max_lateness, lateness)
+            self.ticks_done += 1
+            self.elapsed = now - self.start_time
+            body_start = time.perf_counter()
+            yield tick, self.elapsed
+            profiler.record(self.operation, time.perf_counter() - body_start)
+            tick += 1
+
+    def report(self):
+        """
+        Summarizes the timing of the last acquisition
+
+        :return: A string with the achieved sample rate and the late and missed ticks
+        :rtype: str
+        """
+        if self.ticks_done > 1 and self.elapsed > 0:
+            achieved_rate = (self.ticks_done - 1) / self.elapsed
+        else:
+            achieved_rate = 0
+        return ("Achieved sample rate: {0:.2f} Hz (nominal {1:.2f} Hz)\n"
+                "Late ticks: {2}\n"
+                "Missed ticks: {3}\n"
+                "Maximum lateness: {4:.1f} ms\n".format(achieved_rate, self.frequency, self.late_ticks,
+                                                        self.missed_ticks, self.max_lateness * 1000))
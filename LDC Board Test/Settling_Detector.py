@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# Settling_Detector.py
+
+import math
+import time
+from collections import deque
+from Sample_Scheduler import SampleScheduler
+
+
+class SettlingDetector:
+    """
+    Watches a streaming reading after a setpoint change and tells when it has settled, that is when every reading of
+    the last dwell time lies within a band of the given width. The band is widened by the noise of the reading, so a
+    noisy reading settles once its mean does instead of waiting for a peak to peak quieter than the noise
+    """
+
+    def __init__(self, tolerance, dwell, noise=0.0, deviations=3.0):
+        """
+        Sets up the settling criterion
+
+        :param tolerance: Width of the band, in the unit of the readings
+        :type tolerance: float
+        :param dwell: Time the readings must stay within the band, in seconds
+        :type dwell: float
+        :param noise: Standard deviation of the reading noise, e.g. measured in the last acquisition
+        :type noise: float
+        :param deviations: Number of noise standard deviations added to the band on each side
+        :type deviations: float
+        """
+        self.tolerance = tolerance
+        self.dwell = dwell
+        self.band = tolerance + 2 * deviations * noise
+        self.window = deque()
+
+    def reset(self):
+        """
+        Discards the readings, e.g. after a new setpoint
+        """
+        self.window.clear()
+
+    def update(self, value, timestamp):
+        """
+        Adds a reading and checks the settling criterion
+
+        :param value: The reading
+        :type value: float
+        :param timestamp: Time of the reading, in seconds
+        :type timestamp: float
+
+        :return: True when the readings stayed within the band for the dwell time
+        :rtype: bool
+        """
+        self.window.append((timestamp, value))
+        # Drops the oldest readings until the remaining ones fit in the band
+        while len(self.window) > 1:
+            values = [reading for _, reading in self.window]
+            if max(values) - min(values) <= self.band:
+                break
+            self.window.popleft()
+        return timestamp - self.window[0][0] >= self.dwell
+
+
+def wait_for_settling(engine, tolerance, dwell, timeout, readback=False, frequency=50, noise=0.0, reference_noise=0.0):
+    """
+    Polls the leakage current of the LDC board, and optionally the SCPI readback, until it settles
+
+    :param engine: Acquisition engine of the LDC board
+    :type engine: AcquisitionEngine
+    :param tolerance: Width of the settling band, in mA
+    :type tolerance: float
+    :param dwell: Time the readings must stay within the band, in seconds
+    :type dwell: float
+    :param timeout: Maximum waiting time, in seconds
+    :type timeout: float
+    :param readback: Also waits for the current measured by the SCPI instrument to settle
+    :type readback: bool
+    :param frequency: Polling frequency, in Hz
+    :type frequency: float
+    :param noise: Standard deviation of the leakage current noise, in mA, widening the settling band
+    :type noise: float
+    :param reference_noise: Standard deviation of the SCPI readback noise, in mA
+    :type reference_noise: float
+
+    :return: The settling time in seconds, or NaN if the timeout was reached first, and whether the reading settled
+    :rtype: tuple
+    """
+    leakage = SettlingDetector(tolerance, dwell, noise)
+    reference = SettlingDetector(tolerance, dwell, reference_noise)
+    scheduler = SampleScheduler(frequency, name='settling')
+    start = time.monotonic()
+    for _ in scheduler.ticks(timeout):
+        if readback:
+            acquisition = engine.acquire(53)
+            settled = reference.update(acquisition.reference*1000, acquisition.reference_time)
+            bsmp, bsmp_time = acquisition.bsmp, acquisition.bsmp_time
+        else:
+            settled = True
+            bsmp, bsmp_time = engine.read_bsmp((53,))
+        settled = leakage.update(bsmp[0]*1000, bsmp_time) and settled
+        if settled:
+            # The readings have been stable since the start of their dwell windows
+            settled_time = leakage.window[0][0]
+            if readback:
+                settled_time = max(settled_time, reference.window[0][0])
+            return max(settled_time - start, 0.0), True
+    return math.nan, False
@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+# Simulated_Bench.py
+
+import math
+import random
+import re
+import struct
+import threading
+import time
+
+# Reply sizes and formats of the BSMP variables, as used by pydrs
+type_size = {"uint8_t": 6, "uint16_t": 7, "uint32_t": 9, "float": 9}
+type_format = {"uint8_t": "BBHBB", "uint16_t": "BBHHB", "uint32_t": "BBHIB", "float": "BBHfB"}
+
+
+class SimulatedBench:
+    """
+    Physical model of the test bench: a Keysight source feeding a known current through the LDC board sensor.
+    It is shared by the simulated instruments, so the leakage read through BSMP follows the source set through SCPI
+    """
+
+    def __init__(self, serial_latency=0.0, network_latency=0.0, jitter=0.0, noise=0.0, reference_noise=0.0,
+                 drift=0.0, gain=1.0, offset=0.0, temperature=25.0, temperature_drift=0.0, settling_time=0.0,
+                 seed=None):
+        """
+        Sets up the bench model
+
+        :param serial_latency: Duration of a BSMP transaction, in seconds
+        :type serial_latency: float
+        :param network_latency: Duration of a SCPI transaction, in seconds
+        :type network_latency: float
+        :param jitter: Maximum random extra duration added to every transaction, in seconds
+        :type jitter: float
+        :param noise: Standard deviation of the leakage reading noise, in Amperes
+        :type noise: float
+        :param reference_noise: Standard deviation of the SCPI current measurement noise, in Amperes
+        :type reference_noise: float
+        :param drift: Drift of the leakage reading, in Amperes per second
+        :type drift: float
+        :param gain: Gain of the LDC board sensor
+        :type gain: float
+        :param offset: Offset of the LDC board sensor, in Amperes
+        :type offset: float
+        :param temperature: Temperature of the IIB at the start, in Celsius
+        :type temperature: float
+        :param temperature_drift: Drift of the IIB temperature, in Celsius per second
+        :type temperature_drift: float
+        :param settling_time: Time constant of the first order step response of the LDC board sensor, in seconds
+        :type settling_time: float
+        :param seed: Seed of the random generator, for repeatable runs
+        :type seed: int
+        """
+        self.serial_latency = serial_latency
+        self.network_latency = network_latency
+        self.jitter = jitter
+        self.noise = noise
+        self.reference_noise = reference_noise
+        self.drift = drift
+        self.gain = gain
+        self.offset = offset
+        self.temperature = temperature
+        self.temperature_drift = temperature_drift
+        self.settling_time = settling_time
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.start_time = time.monotonic()
+        self.mode = 'CURR'
+        self.current_level = 0.0
+        self.voltage_level = 0.0
+        self.output = False
+        self.settings = {}
+        self.trigger_start = None
+        self.trigger_points = 0
+        self.sensed_start = 0.0
+        self.change_time = self.start_time
+
+    def wait(self, latency):
+        """
+        Blocks for the duration of a transaction
+
+        :param latency: Nominal duration, in seconds
+        :type latency: float
+        """
+        with self.lock:
+            delay = latency + self.random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def elapsed(self):
+        return time.monotonic() - self.start_time
+
+    def gauss(self, sigma):
+        if sigma == 0:
+            return 0.0
+        with self.lock:
+            return self.random.gauss(0, sigma)
+
+    def source_current(self):
+        """
+        Current flowing through the sensor
+
+        :return: The current, in Amperes
+        :rtype: float
+        """
+        if not self.output or self.mode != 'CURR':
+            return 0.0
+        return self.current_level
+
+    def set_source(self, **state):
+        """
+        Changes the source state, starting the step response of the sensor from its current reading
+
+        :param state: New values of mode, current_level, voltage_level or output
+        """
+        sensed = self.sensed_current()
+        for name, value in state.items():
+            setattr(self, name, value)
+        self.sensed_start = sensed
+        self.change_time = time.monotonic()
+
+    def sensed_current(self):
+        """
+        Current seen by the LDC board sensor, which follows the source current with a first order response
+
+        :return: The current, in Amperes
+        :rtype: float
+        """
+        target = self.source_current()
+        if self.settling_time <= 0:
+            return target
+        decay = math.exp(-(time.monotonic() - self.change_time) / self.settling_time)
+        return target + (self.sensed_start - target) * decay
+
+    def reference_current(self):
+        return self.source_current() + self.gauss(self.reference_noise)
+
+    def leakage_current(self):
+        return (self.gain * self.sensed_current() + self.offset + self.drift * self.elapsed()
+                + self.gauss(self.noise))
+
+    def iib_temperature(self):
+        return self.temperature + self.temperature_drift * self.elapsed()
+
+    def read_variable(self, variable):
+        """
+        Value of a BSMP variable of the IIB
+
+        :param variable: ID of the BSMP variable
+        :type variable: int
+
+        :return: The variable value
+        :rtype: float
+        """
+        if variable == 52:
+            return self.iib_temperature()
+        if variable == 53:
+            return self.leakage_current()
+        return 0.0
+
+
+class SimulatedSerialPort:
+    """
+    Serial port answering BSMP frames from the bench model, in place of the pyserial port of pydrs
+    """
+
+    def __init__(self, bench, address=1):
+        self.bench = bench
+        self.address = address
+        self.reply = b''
+        self.is_open = True
+        self.groups = []
+
+    def isOpen(self):
+        return self.is_open
+
+    def reset_input_buffer(self):
+        self.reply = b''
+
+    def write(self, message):
+        """
+        Handles a BSMP request frame, taking the configured latency of the serial link
+
+        :param message: The complete frame, with address and checksum
+        :type message: bytes
+        """
+        self.bench.wait(self.bench.serial_latency)
+        command = message[1]
+        payload = message[4:-1]
+        if command == 0x10:
+            value = self.bench.read_variable(payload[0])
+            self.reply = self.frame(0x11, struct.pack('f', value))
+        elif command == 0x12:
+            group = self.groups[payload[0] - 3]
+            values = [self.bench.read_variable(variable) for variable in group]
+            self.reply = self.frame(0x13, struct.pack('<%df' % len(values), *values))
+        elif command == 0x30:
+            self.groups.append(list(payload))
+            self.reply = self.frame(0xE0, b'')
+        elif command == 0x32:
+            self.groups.clear()
+            self.reply = self.frame(0xE0, b'')
+        elif command == 0x50:
+            self.reply = self.frame(0x51, b'\x00')
+        else:
+            self.reply = self.frame(0xE2, b'')
+
+    def read(self, size):
+        reply = self.reply[:size]
+        self.reply = self.reply[size:]
+        return reply
+
+    def frame(self, command, payload):
+        packet = bytes([self.address, command]) + struct.pack('>H', len(payload)) + payload
+        return packet + bytes([(256 - sum(packet)) % 256])
+
+
+class SimulatedSerialDRS:
+    """
+    Drop-in replacement for pydrs.SerialDRS talking to the bench model. The frames follow the same BSMP encoding as
+    pydrs, so the whole request/reply path is exercised
+    """
+
+    def __init__(self, bench):
+        self.bench = bench
+        self.slave_add = '\x01'
+        self.com_read_var = '\x10\x00\x01'
+        self.com_function = '\x50'
+        self.ser = None
+
+    def connect(self, port='COM2', baud=115200):
+        self.ser = SimulatedSerialPort(self.bench)
+
+    def disconnect(self):
+        self.ser = None
+
+    def index_to_hex(self, value):
+        return struct.pack('B', value).decode('ISO-8859-1')
+
+    def size_to_hex(self, value):
+        return struct.pack('>H', value).decode('ISO-8859-1')
+
+    def checksum(self, packet):
+        csum = (256 - sum(bytearray(packet.encode('ISO-8859-1')))) % 256
+        return packet + struct.pack('B', csum).decode('ISO-8859-1')
+
+    def read_var(self, var_id):
+        send_msg = self.checksum(self.slave_add + self.com_read_var + var_id)
+        self.ser.reset_input_buffer()
+        self.ser.write(send_msg.encode('ISO-8859-1'))
+
+    def read_bsmp_variable(self, id_var, type_var, print_msg=0):
+        self.read_var(self.index_to_hex(id_var))
+        reply_msg = self.ser.read(type_size[type_var])
+        if print_msg:
+            print(reply_msg)
+        val = struct.unpack(type_format[type_var], reply_msg)
+        return val[3]
+
+    def reset_interlocks(self):
+        send_packet = self.com_function + self.size_to_hex(1) + self.index_to_hex(6)
+        self.ser.write(self.checksum(self.slave_add + send_packet).encode('ISO-8859-1'))
+        return self.ser.read(6)
+
+
+class SimulatedInstrument:
+    """
+    Drop-in replacement for the PyVISA resource of a Keysight source-measure unit, answering SCPI from the bench model.
+    As on the instrument, the measured data is sent in the format selected with :FORMat:DATA and :FORMat:BORDer, ASCII
+    or IEEE 488.2 binary blocks, while the settings are always read back in ASCII
+    """
+
+    def __init__(self, bench):
+        self.bench = bench
+
+    def trigger_interval(self):
+        return float(self.bench.settings.get('TRIG:ACQ:TIM', '0') or 0)
+
+    def trigger_done(self):
+        """
+        Number of points taken so far by the armed trigger system
+        """
+        bench = self.bench
+        if bench.trigger_start is None:
+            return 0
+        interval = self.trigger_interval()
+        if interval <= 0:
+            return bench.trigger_points
+        return min(bench.trigger_points, int((time.monotonic() - bench.trigger_start) / interval) + 1)
+
+    @staticmethod
+    def header(command):
+        """
+        Reduces a SCPI header to its short uppercase form, without numeric suffixes, e.g.
+        ':SOURce1:CURRent:LEVel:IMMediate:AMPLitude' gives 'SOUR:CURR:LEV:IMM:AMPL'
+        """
+        nodes = []
+        for node in command.strip().lstrip(':').split(':'):
+            node = re.sub(r'\d+$', '', node)
+            short = ''.join(char for char in node if char.isupper() or char == '?')
+            nodes.append(short if short.rstrip('?') else node.upper())
+        return ':'.join(nodes)
+
+    def execute(self, command):
+        """
+        Executes a single SCPI command
+
+        :param command: The command, with its arguments
+        :type command: str
+
+        :return: The reply for queries, None otherwise
+        :rtype: str
+        """
+        command = command.strip()
+        bench = self.bench
+        if command.startswith('*'):
+            if command.upper() != '*OPC?':
+                return None
+            if bench.trigger_start is not None:
+                end = bench.trigger_start + (bench.trigger_points - 1) * self.trigger_interval()
+                remaining = end - time.monotonic()
+                if remaining > 0:
+                    time.sleep(remaining)
+            return '1'
+        parts = command.split(None, 1)
+        header = self.header(parts[0])
+        argument = parts[1] if len(parts) > 1 else ''
+        if header == 'INIT:ACQ':
+            bench.trigger_points = int(float(bench.settings.get('TRIG:ACQ:COUN', '1')))
+            bench.trigger_start = time.monotonic()
+            return None
+        if header == 'ABOR:ACQ':
+            bench.trigger_points = self.trigger_done()
+            return None
+        if header in ('FETC:ARR:CURR?', 'FETC:ARR:TIME?'):
+            points = self.trigger_done()
+            if header == 'FETC:ARR:TIME?':
+                values = [point * self.trigger_interval() for point in range(points)]
+            else:
+                values = [bench.reference_current() for _ in range(points)]
+            return ','.join('%+.9E' % value for value in values)
+        if header.startswith('MEAS:CURR'):
+            return '%+.9E' % bench.reference_current()
+        if header.startswith('MEAS:VOLT'):
+            return '%+.9E' % (bench.voltage_level if bench.output else 0.0)
+        if header.endswith('?'):
+            return str(bench.settings.get(header.rstrip('?'), '0'))
+        if header == 'SOUR:FUNC:MODE':
+            bench.set_source(mode=argument.strip().upper()[:4])
+        elif header in ('SOUR:CURR:LEV:IMM:AMPL', 'SOUR:CURR:LEV', 'SOUR:CURR'):
+            bench.set_source(current_level=float(argument))
+        elif header in ('SOUR:VOLT:LEV:IMM:AMPL', 'SOUR:VOLT:LEV', 'SOUR:VOLT'):
+            bench.set_source(voltage_level=float(argument))
+        elif header == 'OUTP:STAT' or header == 'OUTP':
+            bench.set_source(output=argument.strip().upper() in ('1', 'ON'))
+        bench.settings[header] = argument.strip()
+        return None
+
+    def write(self, message):
+        self.bench.wait(self.bench.network_latency)
+        for command in message.split(';'):
+            self.execute(command)
+
+    def query(self, message):
+        self.bench.wait(self.bench.network_latency)
+        replies = [self.execute(command) for command in message.split(';')]
+        return ';'.join(reply for reply in replies if reply is not None)
+
+    def binary_reply(self, message):
+        """
+        Tells whether the reply of the last query of a message is a binary block: only measured data is, and only when
+        a REAL data format is selected
+        """
+        header = self.header(message.split(';')[-1].split(None, 1)[0])
+        measured = header.startswith(('MEAS', 'FETC', 'READ', 'TRAC'))
+        return measured and self.bench.settings.get('FORM:DATA', 'ASC').upper().startswith('REAL')
+
+    def query_ascii_values(self, message, converter='f', separator=',', container=list):
+        reply = self.query(message)
+        if self.binary_reply(message):
+            raise ValueError("Binary block received for '{}', expected ASCII values".format(message))
+        return container([float(value) for value in reply.replace(';', separator).split(separator) if value])
+
+    def query_binary_values(self, message, datatype='f', is_big_endian=False, container=list):
+        """
+        Answers a binary block query, encoding the values as the instrument would and decoding them as PyVISA does
+        """
+        reply = self.query(message)
+        if not self.binary_reply(message):
+            raise ValueError("ASCII reply received for '{}', expected a binary block".format(message))
+        values = [float(value) for value in reply.split(',') if value]
+        settings = self.bench.settings
+        order = '<' if settings.get('FORM:BORD', 'NORM').upper().startswith('SWAP') else '>'
+        data = struct.pack(order + ('f' if settings['FORM:DATA'].endswith('32') else 'd') * len(values), *values)
+        block = '#{0}{1}'.format(len(str(len(data))), len(data)).encode() + data + b'\n'
+        digits = int(block[1:2])
+        length = int(block[2:2 + digits])
+        payload = block[2 + digits:2 + digits + length]
+        count = length // struct.calcsize(datatype)
+        return container(struct.unpack(('>' if is_big_endian else '<') + datatype * count, payload))
+
+    def close(self):
+        pass
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# Sweep_Planner.py
+
+import numpy as np
+from Frequency_Response import analyze, measure_multisine
+
+
+class SweepPlanner:
+    """
+    Plans the test frequencies of a frequency response sweep. The sweep starts from a coarse logarithmic grid and only
+    the intervals where the magnitude or the phase changes quickly, like the bandwidth corner or a resonance, are
+    refined, until the -3 dB corner is bracketed to the requested tolerance
+    """
+
+    def __init__(self, minimum, maximum, df, points=9, tolerance=0.02, level=-3.0, magnitude_step=3.0,
+                 phase_step=20.0, max_points=60):
+        """
+        Sets up the sweep
+
+        :param minimum: Lowest test frequency, in Hz
+        :type minimum: float
+        :param maximum: Highest test frequency, in Hz
+        :type maximum: float
+        :param df: Frequency resolution of the captures, every test frequency being a multiple of it, in Hz
+        :type df: float
+        :param points: Number of frequencies of the coarse grid
+        :type points: int
+        :param tolerance: Relative width of the interval bracketing the corner frequency
+        :type tolerance: float
+        :param level: Magnitude of the corner, relative to the magnitude at the lowest frequency, in dB
+        :type level: float
+        :param magnitude_step: Largest magnitude change between two neighbouring frequencies, in dB
+        :type magnitude_step: float
+        :param phase_step: Largest phase change between two neighbouring frequencies, in degrees
+        :type phase_step: float
+        :param max_points: Largest number of test frequencies
+        :type max_points: int
+        """
+        self.df = df
+        self.tolerance = tolerance
+        self.level = level
+        self.magnitude_step = magnitude_step
+        self.phase_step = phase_step
+        self.max_points = max_points
+        self.frequencies = np.empty(0)
+        self.responses = np.empty(0, dtype=np.complex128)
+        self.planned = self.snap(np.geomspace(minimum, maximum, points))
+
+    def snap(self, frequencies):
+        """
+        Rounds frequencies to the resolution of the captures, dropping the ones already measured
+
+        :rtype: numpy.ndarray
+        """
+        frequencies = np.unique(np.maximum(np.round(np.asarray(frequencies) / self.df), 1) * self.df)
+        return frequencies[~np.isin(frequencies, self.frequencies)]
+
+    def add(self, frequencies, responses):
+        """
+        Adds measured points of the transfer function
+
+        :param frequencies: Measured frequencies, in Hz
+        :type frequencies: numpy.ndarray
+        :param responses: Complex transfer function at the frequencies
+        :type responses: numpy.ndarray
+        """
+        frequencies = np.concatenate((self.frequencies, np.asarray(frequencies, dtype=np.float64)))
+        responses = np.concatenate((self.responses, np.asarray(responses, dtype=np.complex128)))
+        order = np.argsort(frequencies)
+        self.frequencies = frequencies[order]
+        self.responses = responses[order]
+
+    def magnitude(self):
+        """
+        Gives the measured magnitude relative to the magnitude at the lowest frequency
+
+        :return: The magnitude, in dB
+        :rtype: numpy.ndarray
+        """
+        magnitude = 20*np.log10(np.abs(self.responses))
+        return magnitude - magnitude[0]
+
+    def bracket(self):
+        """
+        Finds the first interval where the magnitude falls below the corner level
+
+        :return: The index of the last frequency above the corner level, or None if the level is never crossed
+        :rtype: int
+        """
+        below = np.flatnonzero(self.magnitude() < self.level)
+        if len(below) == 0 or below[0] == 0:
+            return None
+        return int(below[0]) - 1
+
+    def corner(self):
+        """
+        Estimates the corner frequency by interpolating the magnitude over the logarithm of the frequency
+
+        :return: The corner frequency in Hz, and the interval bracketing it, or None values if it is not bracketed
+        :rtype: tuple
+        """
+        index = self.bracket()
+        if index is None:
+            return None, (None, None)
+        low, high = self.frequencies[index:index + 2]
+        magnitude = self.magnitude()[index:index + 2]
+        fraction = (self.level - magnitude[0]) / (magnitude[1] - magnitude[0])
+        return float(low * (high / low) ** fraction), (float(low), float(high))
+
+    def next_frequencies(self):
+        """
+        Gives the frequencies to measure next: the coarse grid first, then the geometric middles of the corner
+        interval until it is narrow enough and of the intervals where the response changes too quickly
+
+        :return: The frequencies, in Hz, an empty array when the sweep is done
+        :rtype: numpy.ndarray
+        """
+        if len(self.planned):
+            planned, self.planned = self.planned, np.empty(0)
+            return planned
+        budget = self.max_points - len(self.frequencies)
+        if len(self.frequencies) < 2 or budget <= 0:
+            return np.empty(0)
+        low, high = self.frequencies[:-1], self.frequencies[1:]
+        phase = 180/np.pi*np.unwrap(np.angle(self.responses))
+        split = ((np.abs(np.diff(self.magnitude())) > self.magnitude_step) |
+                 (np.abs(np.diff(phase)) > self.phase_step))
+        index = self.bracket()
+        if index is not None and high[index] / low[index] - 1 > self.tolerance:
+            split[index] = True
+        intervals = np.flatnonzero(split)
+        if index is not None and split[index]:
+            # The corner interval goes first when the budget runs short
+            intervals = np.concatenate(([index], intervals[intervals != index]))
+        middles = np.maximum(np.round(np.sqrt(low[intervals] * high[intervals]) / self.df), 1) * self.df
+        # The middle of an interval narrower than the resolution falls on a measured frequency
+        middles = middles[~np.isin(middles, self.frequencies)]
+        return np.sort(middles[:budget])
+
+    def run(self, measure):
+        """
+        Runs the sweep
+
+        :param measure: Measures the transfer function at a list of frequencies, returning the measured frequencies
+            and the complex responses
+        :type measure: function
+
+        :return: The corner frequency in Hz, and the interval bracketing it
+        :rtype: tuple
+        """
+        while True:
+            frequencies = self.next_frequencies()
+            if len(frequencies) == 0:
+                return self.corner()
+            self.add(*measure(frequencies))
+
+
+def measure_adaptive(generator, scope, channels, excit_param, planner, tfdef=(0, 1)):
+    """
+    Measures a frequency response with an adaptive sweep, the frequencies of every round of the planner being
+    measured together in a multisine capture
+
+    :param generator: SCPI arbitrary waveform generator
+    :type generator: SCPI
+    :param scope: SCPI oscilloscope
+    :type scope: SCPI
+    :param channels: Scope channels, as dicts with their 'name_instr', 'name' and 'derivative'
+    :type channels: list
+    :param excit_param: Excitation parameters of measure_multisine, without the test frequencies
+    :type excit_param: dict
+    :param planner: Planner of the sweep
+    :type planner: SweepPlanner
+    :param tfdef: Input and output channels of the transfer function followed by the planner, 0-based
+    :type tfdef: tuple
+
+    :return: The capture of all rounds, with the tones stored as the harmonics of a sine sweep
+    :rtype: dict
+    """
+    rounds = []
+
+    def measure(frequencies):
+        rounds.append(measure_multisine(generator, scope, channels, dict(excit_param, sin_freq=frequencies)))
+        response = analyze(rounds[-1], 'sin', (tfdef,))
+        return response['f'], response['fresp'][:, 0]
+
+    corner, (low, high) = planner.run(measure)
+    if corner is None:
+        print("The magnitude does not cross {0:G} dB over the sweep!".format(planner.level))
+    else:
+        print("Corner frequency: {0:.0f} Hz, between {1:G} and {2:G} Hz, from {3} frequencies in {4} captures".format(
+            corner, low, high, len(planner.frequencies), len(rounds)))
+    freq = np.concatenate([capture['freq'] for capture in rounds])
+    order = np.argsort(freq)
+    return dict(rounds[0], excit_param=dict(rounds[0]['excit_param'], sin_freq=freq[order], corner=corner),
+                fft_harmonics=np.concatenate([capture['fft_harmonics'] for capture in rounds], axis=2)[:, :, order],
+                freq=freq[order])
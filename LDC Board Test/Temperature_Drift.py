@@ -2,12 +2,18 @@
 # LDC_Commands.py
 
 import os
-import matplotlib.pyplot as plt
 import numpy as np
 import time
-from tkinter import Tk
-from tkinter.filedialog import askdirectory
 from datetime import datetime
+from Sample_Scheduler import SampleScheduler
+from Acquisition_Engine import AcquisitionEngine
+from Sample_Buffer import SampleBuffer
+from Running_Statistics import RunningStatistics
+from BSMP_Group import BSMPGroup
+from Sample_Recorder import SampleRecorder, drift_columns, export_csv, open_recording
+from Plot_Decimation import decimate, pixel_width
+from Settling_Detector import wait_for_settling
+from Latency_Profiler import profiler
 
 
 class LDC:
@@ -15,22 +21,32 @@ class LDC:
     Sets up the commands to control the Leakage Detection Circuit board alongside an instrument with SCPI communication
     """
 
-    def __init__(self):
+    def __init__(self, drs=None, scpi=None):
         """
         Instantiates the class, all necessary variables and modules
-        """
-        import pydrs
-        from SCPI_Commands import SCPI
 
-        self.drs = pydrs.SerialDRS()
-        port_num = int(input("Insert the number of the COM port: "))
-        com_port = 'COM' + str(port_num)
-        comunic_instrumentip = input("Insert instrument ip: ")
-        self.drs.connect(com_port)  # PyDRS Communication with IIB
-        instrument = 'TCPIP::' + str(comunic_instrumentip) + '::inst0::INSTR'
-        self.scpi = SCPI(instrument)
+        :param drs: Connected PyDRS backend, e.g. a simulated one. Default gives None, which asks for the COM port
+        :type drs: pydrs.SerialDRS
+        :param scpi: SCPI instrument backend. Default gives None, which asks for the instrument IP
+        :type scpi: SCPI
+        """
+        if drs is None:
+            import pydrs
+            drs = pydrs.SerialDRS()
+            port_num = int(input("Insert the number of the COM port: "))
+            com_port = 'COM' + str(port_num)
+            drs.connect(com_port)  # PyDRS Communication with IIB
+        if scpi is None:
+            from SCPI_Commands import SCPI
+            comunic_instrumentip = input("Insert instrument ip: ")
+            instrument = 'TCPIP::' + str(comunic_instrumentip) + '::inst0::INSTR'
+            scpi = SCPI(instrument)
+        self.drs = drs
+        self.scpi = scpi
+        self.engine = AcquisitionEngine(self.scpi, self.drs)
         self.frequency = 10
         self.period = 1 / self.frequency
+        self.scheduler = SampleScheduler(self.frequency)
         self.mean = 0
         self.maximum = 0
         self.minimum = 0
@@ -38,48 +54,140 @@ class LDC:
         self.mean_error = 0
         self.std_dev = 0
         self.test_time = 0
-        self.samples = []
-        self.temperature_samples = []
-        self.time_samples = []
-        self.error = []
+        self.settling_time = 0
+        self.settled = False
+        self.samples = SampleBuffer()
+        self.temperature_samples = SampleBuffer()
+        self.time_samples = SampleBuffer()
+        self.reference_samples = SampleBuffer()
+        self.reference_time_samples = SampleBuffer()
+        self.error = SampleBuffer()
+        self.statistics = RunningStatistics()
+        self.error_statistics = RunningStatistics()
+        self.recording_path = None
         print("LDC functions enabled!")
 
-    def thermal_drift_test(self, duration):
+    def wait_settling(self, tolerance=0.05, dwell=0.2, timeout=5.0, readback=False):
+        """
+        Waits for the leakage current to settle after a change of the source current. The settling band is widened
+        by the noise measured in the last acquisition, so a noisy reading settles once its mean is steady
+
+        :param tolerance: Width of the band the readings must stay within, in mA
+        :type tolerance: float
+        :param dwell: Time the readings must stay within the band, in seconds
+        :type dwell: float
+        :param timeout: Maximum waiting time, in seconds
+        :type timeout: float
+        :param readback: Also waits for the current measured by the SCPI instrument to settle
+        :type readback: bool
+
+        :return: The settling time in seconds, NaN if the reading did not settle before the timeout
+        :rtype: float
+        """
+        noise = self.statistics.std_dev if self.statistics.count > 1 else 0.0
+        reference_noise = float(np.std(self.reference_samples.values)) if len(self.reference_samples) > 1 else 0.0
+        self.settling_time, self.settled = wait_for_settling(self.engine, tolerance, dwell, timeout, readback,
+                                                             noise=noise, reference_noise=reference_noise)
+        if self.settled:
+            print("Settled in {0:.0f} ms".format(self.settling_time*1000))
+        else:
+            print("Not settled after {0:.1f} s, starting the acquisition anyway".format(timeout))
+        return self.settling_time
+
+    def create_bsmp_group(self, variables):
+        """
+        Creates a BSMP group on the IIB, so its float variables are fetched in a single serial transaction
+
+        :param variables: IDs of the float BSMP variables, e.g. temperature (52) and leakage current (53)
+        :type variables: tuple
+
+        :return: The created group, or None if the IIB did not acknowledge it
+        :rtype: BSMPGroup
+        """
+        group = BSMPGroup(self.drs, variables)
+        if group.create():
+            return group
+        print("BSMP group not created, reading the variables one by one")
+        return None
+
+    def thermal_drift_test(self, duration, record_path=None, monitor=None):
         """
         Reads the ground leakage current detected with the LDC board
         Reader thermal drift test
 
         :param duration: Duration of the measurement in seconds
         :type duration: int
+        :param record_path: Folder where the samples are streamed to disk during the test, see SampleRecorder. The
+            samples are then only kept on disk, so the memory does not grow with the duration of the test. Default
+            gives None, which keeps the samples in memory only
+        :type record_path: str
+        :param monitor: Started live monitor receiving every sample, with its temperature
+        :type monitor: LiveMonitor
 
         :return: The measured values for leakage current and thermal drift test
         :rtype: str
         """
         self.samples.clear()
+        self.temperature_samples.clear()
         self.time_samples.clear()
+        self.reference_samples.clear()
+        self.reference_time_samples.clear()
         self.error.clear()
+        self.statistics.clear()
+        self.error_statistics.clear()
         print("Acquisition in progress...\n")
         z = 0
-        for x in range(int(self.frequency * duration)):
-            current_value = self.scpi.instrument.query_ascii_values(':MEASure:CURRent:DC? (%s)' % '@1')
-            self.temperature_samples.append((self.drs.read_bsmp_variable(52, 'float')))
-            self.samples.append((self.drs.read_bsmp_variable(53, 'float'))*1000)
-            self.time_samples.append(round(x * self.period, 2))
-            self.error.append((current_value[0]*1000) - self.samples[x])
-            time.sleep(self.period)
-            np_samples = np.array(self.samples)
-            np_error = np.array(self.error)
-            z = z + 1
-            if z == 10:
-                print('\n''\n', (float(self.time_samples[-1])+0.1), "s", '\n', (float(self.drs.read_bsmp_variable(52, 'float'))), "°C")
-                z = 0
+        self.scheduler = SampleScheduler(self.frequency)
+        group = self.create_bsmp_group((52, 53))
+        self.recording_path = record_path
+        recorder = None
+        if record_path is not None:
+            recorder = SampleRecorder(record_path, metadata={"frequency": self.frequency, "duration": duration})
+        else:
+            for buffer in (self.samples, self.temperature_samples, self.time_samples, self.reference_samples,
+                           self.reference_time_samples, self.error):
+                buffer.reserve(self.frequency * duration)
+        self.engine.max_skew = 0
+        try:
+            for _ in self.scheduler.ticks(duration):
+                acquisition = self.engine.acquire(52, 53, group=group)
+                temperature = acquisition.bsmp[0]
+                leakage = acquisition.bsmp[1]*1000
+                time_sample = round(acquisition.bsmp_time - self.scheduler.start_time, 3)
+                reference = acquisition.reference*1000
+                self.statistics.update(leakage)
+                self.error_statistics.update(reference - leakage)
+                if recorder is not None:
+                    recorder.append(time_sample, leakage, temperature, reference)
+                else:
+                    self.temperature_samples.append(temperature)
+                    self.samples.append(leakage)
+                    self.time_samples.append(time_sample)
+                    self.reference_samples.append(reference)
+                    self.reference_time_samples.append(round(acquisition.reference_time - self.scheduler.start_time,
+                                                             3))
+                    self.error.append(reference - leakage)
+                if monitor is not None:
+                    monitor.push(time_sample, leakage, temperature, self.statistics)
+                z = z + 1
+                if z == 10:
+                    print('\n''\n', (float(time_sample)+0.1), "s", '\n', (float(temperature)), "°C")
+                    print(" Mean: {0:.3f} mA / Standard Deviation: {1:.3f} mA".format(self.statistics.mean,
+                                                                                     self.statistics.std_dev))
+                    z = 0
+        finally:
+            if recorder is not None:
+                recorder.close()
         self.test_time = datetime.today()
-        self.mean = np_samples.mean()
-        self.maximum = np_samples.max()
-        self.minimum = np_samples.min()
-        self.ppc = (np_samples.max() - np_samples.min())
-        self.mean_error = abs(np_error.mean())
-        self.std_dev = np_samples.std()
+        self.mean = self.statistics.mean
+        self.maximum = self.statistics.maximum
+        self.minimum = self.statistics.minimum
+        self.ppc = self.statistics.ppc
+        self.mean_error = abs(self.error_statistics.mean)
+        self.std_dev = self.statistics.std_dev
+        print(self.scheduler.report())
+        print("Maximum reference/leakage skew: {0:.1f} ms\n".format(self.engine.max_skew * 1000))
+        profiler.report(None if record_path is None else os.path.join(record_path, 'latency.json'))
         return print("Mean: {0:.3f} mA\n"
                      "Maximum: {1:.3f} mA\n"
                      "Minimum: {2:.3f} mA\n"
@@ -88,25 +196,38 @@ class LDC:
                      "Standard Deviation: {5:.3f} mA\n".format(self.mean, self.maximum, self.minimum,
                                                                self.ppc, self.mean_error, self.std_dev))
 
+    def test_data(self):
+        """
+        Gives the samples of the last test, memory-mapped from the recording when the test was recorded
+
+        :return: The time, leakage current, temperature and reference current arrays
+        :rtype: tuple
+        """
+        if self.recording_path is not None:
+            recording = open_recording(self.recording_path)
+            return tuple(recording[column] for column in drift_columns)
+        return (self.time_samples.values, self.samples.values, self.temperature_samples.values,
+                self.reference_samples.values)
+
     def save_csv_file(self, file_name='THERMAL DRIFT'):
         """
-        Saves the data of a ground leakage measurement in a csv format file
+        Saves the data of a ground leakage measurement in a csv format file, with the time, the leakage current, the
+        temperature and the reference current as columns
         :argument file_name: Gives a custom name to the file. Default gives 'Leakage Current'
 
+        When the test was recorded, the csv file is converted from the recording one chunk at a time
+
         :return: A string confirming the execution
         :rtype: str
         """
         test_name = self.test_time.strftime('%d_%m_%Y-%H_%M_%S')
         name = file_name+'-'+test_name+'.csv'
-        data = [['Time'], ['Leakage Current'] , ['Temperature']]
-        column0 = data[0]
-        column1 = data[1]
-        column2 = data[2]
-        for row in range(len(self.samples)):
-            column0.append(self.time_samples[row])
-            column1.append(self.samples[row])
-            column2.append(self.temperature_samples[row])
-        np.savetxt(name, [p for p in zip(column0, column1, column2)], delimiter=',', fmt='%s')
+        header = ['Time', 'Leakage Current', 'Temperature', 'Reference Current']
+        if self.recording_path is not None:
+            export_csv(self.recording_path, name, header=header)
+        else:
+            np.savetxt(name, np.column_stack(self.test_data()), delimiter=',', fmt='%.9g', header=','.join(header),
+                       comments='')
         return "CSV current file named '{}' saved successfully!".format(name)
 
     def plot_graphic(self, graph_name='THERMAL DRIFT'):
@@ -115,18 +236,21 @@ class LDC:
 
         :return: Return the matplotlib window with the measurement plot
         """
+        import matplotlib.pyplot as plt
+
         fig, ax = plt.subplots(1, 1, figsize=(15, 5))
         color='tab:blue'
         ax.locator_params(axis='y', tight=True, nbins=10)
         ax.locator_params(axis='x', tight=True, nbins=25)
-        ax.plot(self.time_samples, self.samples)
+        time_samples, samples, temperature_samples, _ = self.test_data()
+        ax.plot(*decimate(time_samples, samples, pixel_width(fig)))
         plt.xlabel('Time [s]')
         plt.ylabel('Leakage Current [mA]', color=color)
         plt.grid(True)
         ax1 = ax.twinx()
         color = 'tab:red'
         ax1.set_ylabel('Temperature [°C]', color=color)
-        ax1.plot(self.time_samples, self.temperature_samples, color=color)
+        ax1.plot(*decimate(time_samples, temperature_samples, pixel_width(fig)), color=color)
         ax1.locator_params(axis='y', tight=True, nbins=10)
         plt.title(graph_name)
         return plt.show()
@@ -138,20 +262,23 @@ class LDC:
         :return: Returns a string confirming the jpg file saving
         :rtype: str
         """
+        import matplotlib.pyplot as plt
+
         test_name = self.test_time.strftime('%d_%m_%Y-%H_%M_%S')
         name = graph_name+'-'+test_name+'.jpg'
         color = 'tab:blue'
         fig, ax = plt.subplots(1, 1, figsize=(10, 5))
         ax.locator_params(axis='y', tight=True, nbins=10)
         ax.locator_params(axis='x', tight=True, nbins=25)
-        ax.plot(self.time_samples, self.samples)
+        time_samples, samples, temperature_samples, _ = self.test_data()
+        ax.plot(*decimate(time_samples, samples, pixel_width(fig)))
         plt.xlabel('Time [s]')
         plt.ylabel('Leakage Current [mA]', color=color)
         plt.grid(True)
         ax1 = ax.twinx()
         color = 'tab:red'
         ax1.set_ylabel('Temperature [°C]', color=color)
-        ax1.plot(self.time_samples, self.temperature_samples, color=color)
+        ax1.plot(*decimate(time_samples, temperature_samples, pixel_width(fig)), color=color)
         ax1.locator_params(axis='y', tight=True, nbins=10)
         plt.title(graph_name)
         plt.savefig(name)
@@ -166,8 +293,24 @@ class LDC:
         time.sleep(0.15)
         return "Degaussing process applied!"
 
+    def close(self):
+        """
+        Stops the worker thread of the acquisition engine
+        """
+        self.engine.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
 
 if __name__ == '__main__':
+    from Live_Monitor import LiveMonitor
+    from tkinter import Tk
+    from tkinter.filedialog import askdirectory
+
     cwd = os.getcwd()
     ldc = LDC()
     read_current = float(input("Insert the desired current, in Amperes: "))
@@ -178,9 +321,15 @@ if __name__ == '__main__':
     elif apply_degauss == 0:
         pass
     ldc.scpi.set_current(read_current)
-    time.sleep(0.15)
-    ldc.thermal_drift_test(read_duration)
+    ldc.wait_settling()
+    record_path = os.path.join(cwd, 'THERMAL DRIFT-'+datetime.today().strftime('%d_%m_%Y-%H_%M_%S'))
+    print("Recording samples in {}".format(record_path))
+    monitor = LiveMonitor('THERMAL DRIFT', window=600, temperature=True)
+    monitor.start()
+    ldc.thermal_drift_test(read_duration, record_path, monitor)
+    monitor.close()
     ldc.scpi.disable_output()
+    ldc.close()
     ldc.plot_graphic()
     answer = int(input("Save plot and csv file? 1(yes)/0(No): "))
     if answer == 1:
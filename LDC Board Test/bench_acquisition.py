@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# bench_acquisition.py
+#
+# Acquisition throughput benchmarks over the simulated bench, run with pytest-benchmark:
+#   python -m pytest bench_acquisition.py
+
+import itertools
+import matplotlib
+matplotlib.use('Agg')
+import pytest
+import LDC_Commands
+import Temperature_Drift
+from Accuracy_Test import AccuracyTest
+from SCPI_Commands import SCPI
+from Simulated_Bench import SimulatedBench, SimulatedInstrument, SimulatedSerialDRS
+
+# Typical round-trips measured on the bench, in seconds
+SERIAL_LATENCY = 0.004
+NETWORK_LATENCY = 0.008
+JITTER = 0.001
+
+
+@pytest.fixture
+def bench():
+    return SimulatedBench(serial_latency=SERIAL_LATENCY, network_latency=NETWORK_LATENCY, jitter=JITTER,
+                          noise=1e-5, reference_noise=1e-6, drift=1e-7, temperature_drift=1e-3, seed=0)
+
+
+def connect(ldc_class, bench):
+    drs = SimulatedSerialDRS(bench)
+    drs.connect()
+    scpi = SCPI('SIM::INSTR', instrument=SimulatedInstrument(bench))
+    ldc = ldc_class(drs=drs, scpi=scpi)
+    ldc.scpi.enable_output()
+    ldc.scpi.set_current(0.01)
+    return ldc
+
+
+def record_rate(benchmark, ldc):
+    scheduler = ldc.scheduler
+    benchmark.extra_info['nominal_rate'] = scheduler.frequency
+    benchmark.extra_info['achieved_rate'] = (scheduler.ticks_done - 1) / scheduler.elapsed
+    benchmark.extra_info['late_ticks'] = scheduler.late_ticks
+    benchmark.extra_info['missed_ticks'] = scheduler.missed_ticks
+
+
+def test_read_ground_leakage_rate(benchmark, bench):
+    with connect(LDC_Commands.LDC, bench) as ldc:
+        benchmark.pedantic(ldc.read_ground_leakage, args=(2,), rounds=3, iterations=1)
+    record_rate(benchmark, ldc)
+    assert ldc.scheduler.missed_ticks == 0
+
+
+def test_thermal_drift_test_rate(benchmark, bench):
+    with connect(Temperature_Drift.LDC, bench) as ldc:
+        benchmark.pedantic(ldc.thermal_drift_test, args=(2,), rounds=3, iterations=1)
+    record_rate(benchmark, ldc)
+    assert ldc.scheduler.missed_ticks == 0
+
+
+def test_tick_overhead(benchmark, bench):
+    with connect(LDC_Commands.LDC, bench) as ldc:
+        benchmark(ldc.engine.acquire, 53)
+    benchmark.extra_info['serial_latency'] = SERIAL_LATENCY
+    benchmark.extra_info['network_latency'] = NETWORK_LATENCY
+
+
+def test_accuracy_sweep_wall_time(benchmark, bench, tmp_path):
+    acc = AccuracyTest(connect(LDC_Commands.LDC, bench))
+    acc.path = str(tmp_path)
+    test_numbers = itertools.count(1)
+
+    def setup():
+        for totals in (acc.total_mean, acc.total_error, acc.total_std, acc.total_current, acc.total_ppc,
+                       acc.total_settling, acc.total_settled, acc.total_noise, acc.total_spurs):
+            totals.clear()
+        return (0.01, 0.0, 0.02, 1, next(test_numbers)), {}
+
+    try:
+        benchmark.pedantic(acc.start, setup=setup, rounds=2, iterations=1)
+    finally:
+        acc.close()
+        acc.ldc.close()
+    benchmark.extra_info['steps'] = acc.total_steps
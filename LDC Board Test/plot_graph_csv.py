@@ -5,26 +5,14 @@ from tkinter.filedialog import askdirectory
 from tkinter import filedialog as fd
 import time
 import matplotlib.pyplot as plt
+from CSV_Loader import load_csv
+from Plot_Decimation import decimate, pixel_width
 
 
 def get_data_from_csv(filename):
-    current = []
-    temp = []
-    csv_value=[]
-    value = []
-    with open(filename) as f:
-        for csv_value in f:
-            if csv_value.endswith('\n'):
-                csv_value = csv_value[:-1]
-                row = csv_value.split(';')
-                if row:
-                    value  = csv_value.split(',')
-                try:
-                    current.append(float(value[0]))
-                    temp.append(float(value[1]))
-                except ValueError:
-                    continue
-    return [current, temp]
+    data = load_csv(filename)
+    return [data[:, 0], data[:, 1]]
+
 
 def plot_graph(x,y, graph_name):
     path = askdirectory(title='Select Folder')
@@ -32,7 +20,7 @@ def plot_graph(x,y, graph_name):
     fig, ax = plt.subplots(1, 1, figsize=(10, 5))
     ax.locator_params(axis='y', tight=True, nbins=15)
     ax.locator_params(axis='x', tight=True, nbins=30)
-    ax.plot(x, y)
+    ax.plot(*decimate(x, y, pixel_width(fig)))
     plt.xlabel('Time [s]')
     plt.ylabel('Leakage Current [mA]')
     plt.grid()
@@ -41,7 +29,6 @@ def plot_graph(x,y, graph_name):
     plt.close()
     return "Graph file named '{}' saved successfully!".format(graph_name+'.jpg')
 
-        
 
 if __name__ == "__main__":
     print('🅂🄴🄸 - 🄶🅁🄾🅄🄿')
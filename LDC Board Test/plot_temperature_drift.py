@@ -5,42 +5,62 @@ from tkinter.filedialog import askdirectory
 from tkinter import filedialog as fd
 import time
 import matplotlib.pyplot as plt
+from CSV_Loader import load_csv, parse_row
+from Plot_Decimation import decimate, pixel_width
+
+
+def get_data_from_csv(filename, boards=3, temperature_column=None):
+    """
+    Loads a temperature drift log, parsed once for all the boards in test. The columns are found from the header
+    row, as saved by MultiBoardAcquisition ('Time', 'Leakage Current #<serial>'..., 'Temperature #<serial>'...,
+    'Reference Current') or by the thermal drift test ('Time', 'Leakage Current', 'Temperature', 'Reference Current').
+    A log with a single temperature column gives it to every board
+
+    :param filename: Name of the csv file, with the time in the first column and the leakage current of each board
+        in the following ones
+    :type filename: str
+    :param boards: Number of boards in test
+    :type boards: int
+    :param temperature_column: Index of the first temperature column. Default gives None, which takes the
+        temperature columns of the header, or the single column after the boards for the logs without header
+    :type temperature_column: int
+
+    :return: The leakage current and the temperature of every board (one column per board) and the elapsed time
+    :rtype: list
+    """
+    with open(filename) as csv_file:
+        first_line = csv_file.readline()
+    titles = [title.strip() for title in first_line.split(',')]
+    data = load_csv(filename)
+    leakage_columns = list(range(1, boards+1))
+    if temperature_column is not None:
+        temperature_columns = list(range(data.shape[1]))[temperature_column:temperature_column+boards]
+    elif parse_row(first_line) is None:
+        leakage_columns = [column for column, title in enumerate(titles) if title.startswith('Leakage Current')]
+        temperature_columns = [column for column, title in enumerate(titles) if title.startswith('Temperature')]
+        if not leakage_columns or not temperature_columns:
+            raise ValueError("No leakage current or temperature column in the header of '{}'".format(filename))
+        leakage_columns = leakage_columns[:boards]
+        temperature_columns = temperature_columns[:boards]
+    else:
+        temperature_columns = [boards+1]
+    if len(temperature_columns) < boards:
+        temperature_columns = temperature_columns[:1] * boards
+    return [data[:, leakage_columns], data[:, temperature_columns], data[:, 0]]
 
-def get_data_from_csv(filename):
-    csv_value=[]
-    value = []
-    
-    current_samples = []
-    temperature_samples = []
-    elapsed_time = []
-    
-    with open(filename) as f:
-        for csv_value in f:
-            if csv_value.endswith('\n'):
-                csv_value = csv_value[:-1]
-                row = csv_value.split(';')
-                if row:
-                    value  = csv_value.split(',')
-                try:
-                    current_samples.append(float(value[n]))
-                    elapsed_time.append(float(value[0]))
-                    temperature_samples.append(float(value[4]))
-                except ValueError:
-                    continue
-    return [current_samples, temperature_samples, elapsed_time]
 
 def plot_graph (current_samples, temperature_samples, elapsed_time, graph_name):
     path = askdirectory(title='Select Folder')
     fig, ax = plt.subplots(1, 1, figsize=(25, 10))
     ax.locator_params(axis='y', tight=True, nbins=10)
     ax.locator_params(axis='x', tight=True, nbins=25)
-    ax.plot(elapsed_time, current_samples)
+    ax.plot(*decimate(elapsed_time, current_samples, pixel_width(fig)))
     plt.xlabel('Time [s]')
     plt.ylabel('Leakage Current [mA]', color='tab:blue')
     plt.grid()
     ax1 = ax.twinx()
     ax1.set_ylabel('Temperature [°C]', color='tab:red')
-    ax1.plot(elapsed_time, temperature_samples, color='tab:red')
+    ax1.plot(*decimate(elapsed_time, temperature_samples, pixel_width(fig)), color='tab:red')
     ax1.locator_params(axis='y', tight=True, nbins=10)
     plt.title(graph_name)
     plt.savefig(graph_name)
@@ -52,7 +72,6 @@ if __name__ == "__main__":
     print('WARNING:This program only performs temperature drift graph.')
     
     filename = fd.askopenfilename(title='Select File')
-    position = range (1,4)
     all_board = []
     
     board_test = (input('Serial number board in test:'))
@@ -60,12 +79,9 @@ if __name__ == "__main__":
         all_board.append(str(board_test))
         board_test = input('Serial number board in test:')
     
-    for n in position:
-        m = n-1
-        print('plotting in progress #'+all_board[m])  
-        [current_samples, temperature_samples, elapsed_time] = get_data_from_csv(filename)
-        plot_graph(current_samples, temperature_samples, elapsed_time, (str('LDC temperature drift serial#'+all_board[m])))
-        current_samples.clear()
-        temperature_samples.clear()
-        elapsed_time.clear()
+    [current_samples, temperature_samples, elapsed_time] = get_data_from_csv(filename, len(all_board))
+    for m, board in enumerate(all_board):
+        print('plotting in progress #'+board)
+        plot_graph(current_samples[:, m], temperature_samples[:, m], elapsed_time,
+                   (str('LDC temperature drift serial#'+board)))
     print('Plotting successful! =)')
\ No newline at end of file
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+# test_background_writer.py
+#
+# Checks of the error handling of the background writer, whose jobs run in spawned worker processes:
+#   python -m pytest test_background_writer.py
+
+import os
+import time
+import pytest
+from Background_Writer import BackgroundWriter
+
+
+def failing_job(name):
+    raise OSError("Cannot write '{}'".format(name))
+
+
+def slow_job(name, delay):
+    time.sleep(delay)
+    with open(name, 'w') as output:
+        output.write('done')
+    return "File '{}' written".format(os.path.basename(name))
+
+
+def test_drain_waits_for_every_job_before_raising(tmp_path, capsys):
+    writer = BackgroundWriter(workers=2)
+    try:
+        writer.submit(failing_job, 'first.csv')
+        writer.submit(slow_job, str(tmp_path / 'slow.csv'), 1.0)
+        writer.submit(failing_job, 'second.csv')
+        with pytest.raises(OSError, match='first.csv'):
+            writer.drain()
+        # The error of the first job is only raised once the later jobs are done
+        assert (tmp_path / 'slow.csv').read_text() == 'done'
+        assert "File 'slow.csv' written" in capsys.readouterr().out
+        assert writer.pending == []
+        writer.submit(slow_job, str(tmp_path / 'next.csv'), 0.0)
+    finally:
+        writer.close()
+    assert (tmp_path / 'next.csv').exists()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# test_bsmp_group.py
+#
+# Checks of the BSMP variable group frames over the simulated IIB:
+#   python -m pytest test_bsmp_group.py
+
+import pytest
+from BSMP_Group import BSMPGroup
+from Latency_Profiler import instrument_links, profiler
+from SCPI_Commands import SCPI
+from Simulated_Bench import SimulatedBench, SimulatedInstrument, SimulatedSerialDRS
+
+
+@pytest.fixture
+def drs():
+    drs = SimulatedSerialDRS(SimulatedBench(temperature=30.0, temperature_drift=0.0, offset=0.25))
+    drs.connect()
+    return drs
+
+
+def corrupt_replies(drs, corrupt):
+    read = drs.ser.read
+    drs.ser.read = lambda size: corrupt(read(size))
+
+
+def frame(command, payload):
+    packet = bytes([1, command, 0, len(payload)]) + payload
+    return packet + bytes([(256 - sum(packet)) % 256])
+
+
+def test_group_read(drs):
+    group = BSMPGroup(drs, (52, 53))
+    assert group.create()
+    assert group.read() == [30.0, 0.25]
+    group = BSMPGroup(drs, (53,))
+    assert group.create()
+    assert group.read() == [0.25]
+
+
+@pytest.mark.parametrize('corrupt, message', [
+    (lambda reply: reply[:-3], 'Reply of 10 bytes'),
+    (lambda reply: frame(0xE3, b''), 'Reply of 5 bytes'),
+    (lambda reply: frame(0xE3, reply[4:-1]), 'command 0xE3'),
+    (lambda reply: reply[:5] + bytes([reply[5] ^ 0x01]) + reply[6:], 'Checksum error'),
+])
+def test_invalid_group_replies(drs, corrupt, message):
+    group = BSMPGroup(drs, (52, 53))
+    assert group.create()
+    corrupt_replies(drs, corrupt)
+    with pytest.raises(ValueError, match=message):
+        group.read()
+
+
+def test_group_reads_are_profiled(drs, monkeypatch):
+    monkeypatch.setattr(BSMPGroup, 'read', BSMPGroup.read)
+    monkeypatch.setattr(profiler, 'enabled', False)
+    monkeypatch.setattr(profiler, 'operations', {})
+    instrument_links(SCPI('SIM::INSTR', instrument=SimulatedInstrument(SimulatedBench())), drs)
+    group = BSMPGroup(drs, (52, 53))
+    group.create()
+    group.read()
+    corrupt_replies(drs, lambda reply: reply[:-1])
+    with pytest.raises(ValueError):
+        group.read()
+    summary = profiler.operations['bsmp.read_group'].summary()
+    assert (summary['count'], summary['errors']) == (2, 1)
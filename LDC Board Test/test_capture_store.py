@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# test_capture_store.py
+#
+# Checks of the capture store, of the rollback of the failed and rejected captures in particular:
+#   python -m pytest test_capture_store.py
+
+import os
+import numpy as np
+import pytest
+from Capture_Store import CaptureStore, capture_file, open_store
+
+channels = [{'name_instr': 'CHAN1', 'name': 'Iref', 'derivative': 0},
+            {'name_instr': 'CHAN2', 'name': 'Ildc', 'derivative': 0}]
+
+
+class StreamingScope:
+    """
+    Oscilloscope streaming a constant waveform per channel, optionally failing in the middle of a channel
+    """
+
+    def __init__(self, points, value, fail_channel=None):
+        self.points = points
+        self.value = value
+        self.fail_channel = fail_channel
+        self.channels = 0
+
+    def stream_waveform(self, source, destination):
+        self.channels += 1
+        if self.channels == self.fail_channel:
+            destination.write(np.ones(3, dtype='<f4').tobytes())
+            raise TimeoutError("Simulated timeout on {}".format(source))
+        destination.write(np.full(self.points, self.value + self.channels, dtype='<f4').tobytes())
+        return self.points
+
+
+def test_captures_round_trip(tmp_path):
+    path = str(tmp_path / 'store')
+    data = np.arange(16, dtype=np.float64).reshape(8, 2)
+    with CaptureStore(path, channels, 1000.0, excit_param={'type': 'sin'}) as store:
+        assert store.append(data, frequency=125.0) == 0
+        assert store.add_capture(StreamingScope(8, 10.0), frequency=250.0) == 1
+    store = open_store(path)
+    assert store['captures'].shape == (2, 2, 8)
+    np.testing.assert_array_equal(store['captures'][0], data.T)
+    np.testing.assert_array_equal(store['captures'][1], [[11.0] * 8, [12.0] * 8])
+    assert [capture['frequency'] for capture in store['meta']['captures']] == [125.0, 250.0]
+
+
+def test_failed_and_rejected_captures_are_rolled_back(tmp_path):
+    path = str(tmp_path / 'store')
+    with CaptureStore(path, channels, 1000.0) as store:
+        store.append(np.zeros((8, 2)))
+        # A timeout in the middle of the second channel leaves a partial capture behind
+        with pytest.raises(TimeoutError):
+            store.add_capture(StreamingScope(8, 10.0, fail_channel=2))
+        # Captures of another length are rejected once streamed
+        with pytest.raises(ValueError, match='store of 8 points'):
+            store.add_capture(StreamingScope(5, 20.0))
+        with pytest.raises(ValueError):
+            store.append(np.zeros((4, 2)))
+        assert store.add_capture(StreamingScope(8, 30.0)) == 1
+    # The samples of the dropped captures do not shift the capture added after them
+    assert os.path.getsize(os.path.join(path, capture_file)) == 2 * 2 * 8 * 4
+    store = open_store(path)
+    assert store['captures'].shape == (2, 2, 8)
+    np.testing.assert_array_equal(store['captures'][1], [[31.0] * 8, [32.0] * 8])
+
+
+def test_samples_after_the_last_capture_are_ignored(tmp_path):
+    path = str(tmp_path / 'store')
+    with CaptureStore(path, channels, 1000.0) as store:
+        store.append(np.ones((8, 2)))
+        # As left by a crash while a capture is streamed
+        store.file.write(np.zeros(5, dtype='<f4').tobytes())
+    store = open_store(path)
+    assert store['captures'].shape == (1, 2, 8)
+    np.testing.assert_array_equal(store['captures'][0], np.ones((2, 8)))
+
+
+def test_empty_store(tmp_path):
+    path = str(tmp_path / 'store')
+    CaptureStore(path, channels, 1000.0).close()
+    assert open_store(path)['captures'].shape == (0, 2, 0)
+    with pytest.raises(FileExistsError):
+        CaptureStore(path, channels, 1000.0)
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# test_csv_loader.py
+#
+# Checks of the csv parsing and of the invalidation of its binary cache:
+#   python -m pytest test_csv_loader.py
+
+import json
+import os
+import numpy as np
+import pytest
+from CSV_Loader import load_csv
+
+
+@pytest.fixture
+def log(tmp_path):
+    filename = str(tmp_path / 'drift.csv')
+    with open(filename, 'w') as csv_file:
+        csv_file.write('Time,Leakage Current,Temperature,Reference Current\n')
+        csv_file.write('0,0.5,25,10\n0.1,0.6,25.5,10\n')
+    return filename
+
+
+def write_row(filename, row, mode='a'):
+    with open(filename, mode) as csv_file:
+        csv_file.write(row)
+
+
+def test_cache_reused_while_unchanged(log):
+    data = load_csv(log)
+    np.testing.assert_array_equal(data, [[0, 0.5, 25, 10], [0.1, 0.6, 25.5, 10]])
+    assert not isinstance(data, np.memmap)
+    with open(log + '.npy.json') as signature_file:
+        assert json.load(signature_file) == [os.stat(log).st_mtime_ns, os.stat(log).st_size]
+    cached = load_csv(log)
+    assert isinstance(cached, np.memmap)
+    np.testing.assert_array_equal(cached, data)
+
+
+def test_cache_invalidated_by_a_new_size(log):
+    load_csv(log)
+    write_row(log, '0.2,0.7,26,10\n')
+    data = load_csv(log)
+    assert not isinstance(data, np.memmap)
+    assert data.shape == (3, 4)
+
+
+def test_cache_invalidated_by_a_new_modification_time(log):
+    load_csv(log)
+    stat = os.stat(log)
+    # Same size, different values: only the modification time tells the csv file changed
+    with open(log, 'r+') as csv_file:
+        text = csv_file.read().replace('0.6', '0.9')
+        csv_file.seek(0)
+        csv_file.write(text)
+    os.utime(log, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000))
+    assert os.stat(log).st_size == stat.st_size
+    assert load_csv(log)[1, 1] == 0.9
+
+
+def test_unreadable_signature(log):
+    load_csv(log)
+    write_row(log + '.npy.json', '[12', mode='w')
+    assert not isinstance(load_csv(log), np.memmap)
+    assert isinstance(load_csv(log), np.memmap)
+
+
+def test_without_cache(log):
+    load_csv(log, cache=False)
+    assert not os.path.exists(log + '.npy')
+
+
+def test_truncated_last_line(log):
+    write_row(log, '0.2,0.7')
+    with pytest.raises(ValueError, match='Malformed csv table of 4 columns'):
+        load_csv(log)
+    assert not os.path.exists(log + '.npy')
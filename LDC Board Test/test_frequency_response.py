@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# test_frequency_response.py
+#
+# Checks of the frequency response analysis and of the multisine excitation against the direct definitions of the
+# spectra:
+#   python -m pytest test_frequency_response.py
+
+import numpy as np
+import pytest
+from Frequency_Response import analyze, crest_factor, fft_harmonics, multisine, multisine_bins
+
+
+def sine_captures(bins, points, gains):
+    """
+    Captures of a sine sweep, the channels being the excitation through complex gains, plus a second harmonic
+    """
+    t = np.arange(points)
+    captures = np.empty((len(bins), points, len(gains)))
+    for index, tone in enumerate(bins):
+        for channel, gain in enumerate(gains):
+            captures[index, :, channel] = (abs(gain) * np.cos(2 * np.pi * tone * t / points + np.angle(gain))
+                                           + 0.1 * np.cos(4 * np.pi * tone * t / points))
+    return captures
+
+
+def test_fft_harmonics_match_the_dft():
+    points = 256
+    bins = np.array([3, 17, 50, 90, 127])
+    captures = sine_captures(bins, points, (1.0, 0.5j))
+    harmonics = fft_harmonics(captures, bins, 3, chunk=2)
+    assert harmonics.shape == (3, 2, len(bins))
+    t = np.arange(points)
+    for index, tone in enumerate(bins):
+        for harmonic in range(3):
+            if (harmonic + 1) * tone > points // 2:
+                # Above Nyquist
+                assert np.isnan(harmonics[harmonic, :, index]).all()
+                continue
+            kernel = np.exp(-2j * np.pi * (harmonic + 1) * tone * t / points)
+            np.testing.assert_allclose(harmonics[harmonic, :, index], kernel @ captures[index], atol=1e-9)
+    # The fundamental holds half the amplitude of the sine times the number of points
+    np.testing.assert_allclose(harmonics[0, 0, :4], points / 2)
+    np.testing.assert_allclose(harmonics[1, 1, :2], 0.1 * points / 2, atol=1e-9)
+
+
+def test_analyze_sine_sweep():
+    points = 512
+    bins = np.array([4, 20, 100])
+    gain = 0.8 * np.exp(-0.3j)
+    captures = sine_captures(bins, points, (1.0, gain, 2.0))
+    result = {'name': ['Iref', 'Ildc', 'Iout'], 'derivative': [0, 0, 0], 'excit_param': {},
+              'fft_harmonics': fft_harmonics(captures, bins, 2), 'freq': bins * 10.0}
+    response = analyze(result, 'sin', ((0, 1), (0, 2)))
+    np.testing.assert_allclose(response['f'], [40.0, 200.0, 1000.0])
+    np.testing.assert_allclose(response['fresp'][:, 0], gain)
+    np.testing.assert_allclose(response['fresp'][:, 1], 2.0)
+    assert response['legend'] == ['Ildc/Iref', 'Iout/Iref']
+    # A channel measured through a derivative is integrated
+    result['derivative'] = [0, 1, 0]
+    np.testing.assert_allclose(analyze(result, 'sin')['fresp'][:, 0], gain / (2j * np.pi * response['f']))
+
+
+def test_multisine_bins():
+    # 0.3 Hz rounds to DC and is dropped, 1.9 and 2.1 Hz share the bin 2
+    frequencies = [0.3, 1.9, 2.1, 5.0, 3.0, 10.0, 7.6]
+    assert [list(bins) for bins in multisine_bins(frequencies, 1.0)] == [[2, 3, 5, 8, 10]]
+    assert [list(bins) for bins in multisine_bins(frequencies, 1.0, groups=2)] == [[2, 5, 10], [3, 8]]
+    assert [list(bins) for bins in multisine_bins(frequencies, 0.5)] == [[1, 4, 6, 10, 15, 20]]
+
+
+def test_multisine_spectrum_and_crest_factor():
+    points = 1024
+    bins = np.unique(np.round(np.logspace(0, np.log10(400), 30)).astype(np.int64))
+    waveform = multisine(bins, points)
+    assert len(waveform) == points
+    assert np.abs(waveform).max() == pytest.approx(1.0)
+    # Equal amplitudes on the tones and nothing elsewhere
+    spectrum = np.abs(np.fft.rfft(waveform))
+    np.testing.assert_allclose(spectrum[bins], spectrum[bins[0]], rtol=1e-9)
+    assert np.delete(spectrum, bins).max() < 1e-9 * spectrum[bins[0]]
+    # The clipping iterations improve on the Schroeder phases, far from the tones in phase
+    schroeder = multisine(bins, points, iterations=0)
+    in_phase = np.fft.irfft(np.isin(np.arange(points // 2 + 1), bins).astype(np.float64), points)
+    assert crest_factor(waveform) < 0.8 * crest_factor(schroeder)
+    assert crest_factor(schroeder) < 0.5 * crest_factor(in_phase)
+    assert crest_factor(in_phase) == pytest.approx(np.sqrt(2 * len(bins)))
+
+
+def test_analyze_multisine():
+    sample_rate, df, periods = 1000.0, 2.0, 3
+    bins = multisine_bins([4.0, 10.0, 30.0, 100.0, 250.0], df)[0]
+    points = int(sample_rate / df)
+    excitation = np.tile(multisine(bins, points), periods)
+    # The response of a first order low pass at 50 Hz, computed on the tones of the periodic excitation
+    spectrum = np.fft.rfft(excitation)
+    f = np.fft.rfftfreq(len(excitation), 1 / sample_rate)
+    response = np.fft.irfft(spectrum / (1 + 1j * f / 50.0), len(excitation))
+    result = {'name': ['Iref', 'Ildc'], 'derivative': [0, 0], 'Fs': sample_rate,
+              'excit_param': {'df': df, 'sin_freq': bins * df}, 'data': np.column_stack((excitation, response))}
+    analysis = analyze(result, 'multisine')
+    np.testing.assert_allclose(analysis['f'], bins * df)
+    np.testing.assert_allclose(analysis['fresp'][:, 0], 1 / (1 + 1j * analysis['f'] / 50.0))
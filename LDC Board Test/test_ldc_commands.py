@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# test_ldc_commands.py
+#
+# Checks of the ground leakage measurement over the simulated bench:
+#   python -m pytest test_ldc_commands.py
+
+import numpy as np
+import pytest
+from LDC_Commands import LDC
+from SCPI_Commands import SCPI, max_buffered_points
+from Simulated_Bench import SimulatedBench, SimulatedInstrument, SimulatedSerialDRS
+
+
+@pytest.fixture
+def bench():
+    return SimulatedBench(serial_latency=0.002, network_latency=0.004, seed=0)
+
+
+@pytest.fixture
+def ldc(bench):
+    drs = SimulatedSerialDRS(bench)
+    drs.connect()
+    with LDC(drs=drs, scpi=SCPI('SIM::INSTR', instrument=SimulatedInstrument(bench))) as ldc:
+        ldc.scpi.enable_output()
+        ldc.scpi.set_current(0.01)
+        yield ldc
+
+
+def test_buffered_reference_on_the_scheduler_time(ldc, bench):
+    ldc.read_ground_leakage(1, buffered=True)
+    trigger_time = bench.trigger_start - ldc.scheduler.start_time
+    # The instrument is armed before the first tick, so its readings start before the leakage samples
+    assert ldc.reference_time_samples[0] <= 0
+    assert ldc.reference_time_samples[0] == pytest.approx(trigger_time, abs=bench.network_latency)
+    np.testing.assert_allclose(np.diff(ldc.reference_time_samples.values), ldc.period, atol=1e-3)
+    assert len(ldc.error) == len(ldc.samples) == 10
+    assert ldc.mean_error == pytest.approx(0.0, abs=1e-6)
+
+
+def test_buffered_measurement_longer_than_the_instrument_buffer(ldc):
+    with pytest.raises(ValueError, match='instrument buffer'):
+        ldc.read_ground_leakage(max_buffered_points // ldc.frequency + 1, buffered=True)
+    assert ldc.scpi.buffered_points == 0
+    assert len(ldc.samples) == 0
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# test_live_monitor.py
+#
+# Checks of the batches sent to the live monitor and of the statistics it shows:
+#   python -m pytest test_live_monitor.py
+
+import queue
+import pytest
+from Live_Monitor import LiveMonitor, statistics_text
+from Running_Statistics import RunningStatistics
+
+
+class AliveProcess:
+    """
+    Stands for a monitor process whose window is open, so the batches stay in the queue
+    """
+
+    def is_alive(self):
+        return True
+
+
+@pytest.fixture
+def monitor():
+    monitor = LiveMonitor(interval=3600, capacity=2)
+    monitor.process = AliveProcess()
+    yield monitor
+    monitor.queue.cancel_join_thread()
+    monitor.queue.close()
+
+
+def test_batches_carry_the_acquisition_statistics(monitor):
+    statistics = RunningStatistics()
+    for index in range(5):
+        statistics.update(index)
+        monitor.push(index / 10, index, statistics=statistics)
+    # The first sample is sent at once, with the statistics of that time, the next ones wait for the redraw interval
+    batch, summary, dropped = monitor.queue.get(timeout=5)
+    assert batch == [(0.0, 0.0, None)]
+    assert summary['count'] == 1 and dropped == 0
+    monitor.send()
+    batch, summary, dropped = monitor.queue.get(timeout=5)
+    assert [sample[1] for sample in batch] == [1.0, 2.0, 3.0, 4.0]
+    assert summary == statistics.summary()
+
+
+def test_dropped_batches_are_counted(monitor):
+    monitor.push(0, 1.0)
+    for index in range(1, 4):
+        monitor.push(index, 1.0)
+        monitor.push(index + 0.5, 1.0)
+        monitor.send()
+    # The queue holds two batches, the samples of the next ones are dropped
+    assert monitor.dropped == 4
+    monitor.queue.get(timeout=5)
+    monitor.push(4, 1.0)
+    monitor.send()
+    assert monitor.queue.get(timeout=5)[1:] == (None, 0)
+    assert monitor.queue.get(timeout=5) == ([(4.0, 1.0, None)], None, 4)
+    with pytest.raises(queue.Empty):
+        monitor.queue.get(timeout=0.1)
+
+
+def test_statistics_text():
+    statistics = RunningStatistics()
+    statistics.extend([1.0, 2.0, 3.0, 4.0])
+    text = statistics_text(statistics.summary(), 7)
+    assert text.startswith("Samples: 4 (7 not plotted)\nMean: 2.500 mA (standard error 0.6455 mA)\n")
+    assert "Std Dev: 1.118 mA" in text and "Temperature" not in text
+    temperature_statistics = RunningStatistics()
+    temperature_statistics.extend([25.0, 26.5])
+    assert statistics_text(statistics.summary(), 0, 26.5, temperature_statistics).endswith(
+        "Temperature: 26.50 °C (25.00 to 26.50 °C)")
+
+
+def test_monitor_process(monkeypatch):
+    # The spawned monitor renders without a window
+    monkeypatch.setenv('MPLBACKEND', 'Agg')
+    monitor = LiveMonitor(interval=0.05)
+    monitor.start()
+    statistics = RunningStatistics()
+    for index in range(100):
+        statistics.update(index % 7)
+        monitor.push(index / 10, index % 7, statistics=statistics)
+    monitor.close()
+    assert monitor.process.exitcode == 0
+    assert monitor.dropped == 0
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# test_multi_board.py
+#
+# Checks of the multi-board acquisition over the simulated bench, in memory and recorded:
+#   python -m pytest test_multi_board.py
+
+import numpy as np
+import pytest
+from Multi_Board import MultiBoardAcquisition
+from SCPI_Commands import SCPI
+from Simulated_Bench import SimulatedBench, SimulatedInstrument, SimulatedSerialDRS
+
+
+@pytest.fixture
+def multi():
+    bench = SimulatedBench(noise=1e-5, settling_time=0.05, seed=0)
+    boards = {}
+    for serial in ('101', '102'):
+        boards[serial] = SimulatedSerialDRS(bench)
+        boards[serial].connect()
+    scpi = SCPI('SIM::INSTR', instrument=SimulatedInstrument(bench))
+    scpi.write(':OUTPut1 ON')
+    scpi.write(':SOURce1:CURRent:LEVel:IMMediate:AMPLitude %G' % 0.01)
+    with MultiBoardAcquisition(boards, scpi) as multi:
+        multi.wait_settling()
+        yield multi
+
+
+def test_run_in_memory(multi):
+    dataset = multi.run(1)
+    assert list(dataset) == multi.columns
+    assert all(len(values) == 10 for values in dataset.values())
+    np.testing.assert_allclose(dataset['leakage_101'], 10.0, atol=0.1)
+    assert len(multi.data['leakage_102']) == 10
+
+
+def test_recorded_run_stays_on_disk(multi, tmp_path, monkeypatch):
+    multi.run(1)
+    dataset = multi.run(1, str(tmp_path / 'recording'))
+    # The buffers of the previous run are emptied and not filled again
+    assert all(len(buffer) == 0 for buffer in multi.data.values())
+    assert all(isinstance(values, np.memmap) and len(values) == 10 for values in dataset.values())
+    np.testing.assert_allclose(dataset['reference'], 10.0, atol=0.1)
+    assert all(settled < 5.0 for settled in multi.wait_settling(timeout=0.5))
+    monkeypatch.chdir(tmp_path)
+    name = multi.save_csv_file().split("'")[1]
+    table = np.loadtxt(name, delimiter=',', skiprows=1)
+    np.testing.assert_allclose(table[:, 1], dataset['leakage_101'], rtol=1e-8)
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# test_noise_spectrum.py
+#
+# Checks of the streaming Welch estimator of the noise spectrum against the whole record estimates:
+#   python -m pytest test_noise_spectrum.py
+
+import math
+import numpy as np
+import pytest
+from Noise_Spectrum import WelchEstimator
+
+
+def reference_welch(values, sample_rate, window, step):
+    """
+    Welch's method over the whole record at once, with the segments, the window and the linear detrending of the
+    streaming estimator
+    """
+    segment = len(window)
+    starts = np.arange(0, len(values) - segment + 1, step)
+    segments = np.array([values[start:start + segment] for start in starts])
+    x = np.arange(segment)
+    slope, intercept = np.polyfit(x, segments.T, 1)
+    spectra = np.fft.rfft((segments - np.outer(slope, x) - intercept[:, None]) * window, axis=1)
+    psd = np.mean(np.abs(spectra) ** 2, axis=0) / (sample_rate * np.sum(window ** 2))
+    psd[1:-1] *= 2
+    return psd
+
+
+@pytest.fixture
+def noise_record():
+    rng = np.random.default_rng(3)
+    sample_rate = 10.0
+    time_samples = np.arange(20000) / sample_rate
+    # White noise, a slow drift and a tone on the 12th bin of the 64 sample segments
+    values = (rng.normal(0.0, 0.01, len(time_samples)) + 1e-4 * time_samples
+              + 0.05 * math.sqrt(2) * np.sin(2 * np.pi * 12 * sample_rate / 64 * time_samples))
+    return sample_rate, values
+
+
+def test_welch_matches_numpy_reference(noise_record):
+    sample_rate, values = noise_record
+    estimator = WelchEstimator(sample_rate)
+    for batch in np.array_split(values, 13):
+        estimator.extend(batch)
+    psd = reference_welch(values, sample_rate, estimator.window, estimator.step)
+    assert estimator.count == (len(values) - estimator.segment) // estimator.step + 1
+    np.testing.assert_allclose(estimator.psd, psd, rtol=1e-9)
+    np.testing.assert_allclose(estimator.frequencies, np.fft.rfftfreq(estimator.segment, 1 / sample_rate))
+    assert estimator.noise_density() == pytest.approx(0.01 * math.sqrt(2 / sample_rate), rel=0.1)
+    frequency, amplitude = estimator.spurs()[0]
+    assert frequency == pytest.approx(12 * sample_rate / 64)
+    assert amplitude == pytest.approx(0.05, rel=0.05)
+
+
+def test_welch_matches_scipy(noise_record):
+    signal = pytest.importorskip('scipy.signal')
+    sample_rate, values = noise_record
+    estimator = WelchEstimator(sample_rate)
+    estimator.extend(values)
+    frequencies, psd = signal.welch(values, sample_rate, window=estimator.window, nperseg=estimator.segment,
+                                    noverlap=estimator.segment - estimator.step, detrend='linear')
+    np.testing.assert_allclose(estimator.frequencies, frequencies)
+    np.testing.assert_allclose(estimator.psd, psd, rtol=1e-9)
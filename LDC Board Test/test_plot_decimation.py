@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+# test_plot_decimation.py
+#
+# Checks of the min/max decimation of the plotted traces:
+#   python -m pytest test_plot_decimation.py
+
+import numpy as np
+from Plot_Decimation import decimate
+
+
+def test_decimate_keeps_extremes():
+    rng = np.random.default_rng(2)
+    y = rng.normal(0.0, 1.0, 100003)
+    y[12345] = 50.0
+    y[67890] = -50.0
+    x = np.arange(len(y)) * 0.1
+    buckets = 500
+    x_decimated, y_decimated = decimate(x, y, buckets)
+    assert len(y_decimated) <= 2 * buckets + 4
+    assert np.all(np.diff(x_decimated) > 0)
+    assert (x_decimated[0], x_decimated[-1]) == (x[0], x[-1])
+    # Every bucket keeps its minimum and its maximum
+    size = -(-len(y) // buckets)
+    for start in range(0, len(y), size):
+        block = y[start:start + size]
+        assert block.min() in y_decimated and block.max() in y_decimated
+
+
+def test_short_traces_are_kept():
+    x = np.arange(10.0)
+    y = np.arange(12.0) ** 2
+    # A trace still being acquired may have one more vertical value than horizontal ones
+    x_decimated, y_decimated = decimate(x, y, buckets=5)
+    np.testing.assert_array_equal(x_decimated, x)
+    np.testing.assert_array_equal(y_decimated, y[:10])
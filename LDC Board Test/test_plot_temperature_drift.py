@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# test_plot_temperature_drift.py
+#
+# Checks of the column layouts of the temperature drift logs:
+#   python -m pytest test_plot_temperature_drift.py
+
+import numpy as np
+import pytest
+
+pytest.importorskip('tkinter')
+from plot_temperature_drift import get_data_from_csv
+
+
+def write_log(path, header, rows):
+    filename = str(path / 'drift.csv')
+    with open(filename, 'w') as csv_file:
+        if header:
+            csv_file.write(','.join(header) + '\n')
+        np.savetxt(csv_file, rows, delimiter=',', fmt='%.9g')
+    return filename
+
+
+def test_multi_board_log(tmp_path):
+    header = ['Time', 'Leakage Current #1', 'Leakage Current #2', 'Temperature #1', 'Temperature #2',
+              'Reference Current']
+    filename = write_log(tmp_path, header, [[0, 0.1, 0.2, 30, 31, 10], [1, 0.3, 0.4, 32, 33, 10]])
+    current, temperature, time = get_data_from_csv(filename, 2)
+    np.testing.assert_array_equal(current, [[0.1, 0.2], [0.3, 0.4]])
+    np.testing.assert_array_equal(temperature, [[30, 31], [32, 33]])
+    np.testing.assert_array_equal(time, [0, 1])
+
+
+def test_thermal_drift_log(tmp_path):
+    header = ['Time', 'Leakage Current', 'Temperature', 'Reference Current']
+    filename = write_log(tmp_path, header, [[0, 0.1, 30, 10], [1, 0.3, 32, 10]])
+    current, temperature, time = get_data_from_csv(filename, 1)
+    np.testing.assert_array_equal(current, [[0.1], [0.3]])
+    # The reference current is not taken as a temperature
+    np.testing.assert_array_equal(temperature, [[30], [32]])
+
+
+def test_headerless_log_with_single_temperature(tmp_path):
+    filename = write_log(tmp_path, None, [[0, 0.1, 0.2, 30, 10], [1, 0.3, 0.4, 32, 10]])
+    current, temperature, time = get_data_from_csv(filename, 2)
+    np.testing.assert_array_equal(current, [[0.1, 0.2], [0.3, 0.4]])
+    np.testing.assert_array_equal(temperature, [[30, 30], [32, 32]])
+
+
+def test_explicit_temperature_column(tmp_path):
+    filename = write_log(tmp_path, None, [[0, 0.1, 0.2, 10, 30, 31], [1, 0.3, 0.4, 10, 32, 33]])
+    current, temperature, time = get_data_from_csv(filename, 2, temperature_column=4)
+    np.testing.assert_array_equal(temperature, [[30, 31], [32, 33]])
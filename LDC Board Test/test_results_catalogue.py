@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# test_results_catalogue.py
+#
+# Checks of the incremental update of the results catalogue:
+#   python -m pytest test_results_catalogue.py
+
+import os
+import shutil
+import numpy as np
+import pytest
+from Results_Catalogue import ResultsCatalogue
+
+
+def write_repetition(test_path, repetition, setpoints, board='LDC01'):
+    """
+    Writes the result files of a repetition as the accuracy test saves them
+    """
+    folder = os.path.join(test_path, str(repetition), 'Samples')
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(test_path, 'INFO.txt'), 'w') as info_file:
+        info_file.write(board + "\n01/03/2022 - 10:00\nSEI - Electronics Systems and Instrumentation")
+    rows = [(setpoint, setpoint + 0.01 * repetition) for setpoint in setpoints]
+    np.savetxt(os.path.join(folder, 'SourceCurrent_X_MeanLeakageCurrent.csv'), rows, delimiter=',', fmt='%s')
+    for setpoint in setpoints:
+        samples = setpoint + 0.01 * repetition + np.array([-0.02, 0.0, 0.02])
+        np.savetxt(os.path.join(folder, 'Leakage_Current_Measurement-Iref_{0:.1f}mA.csv'.format(setpoint)),
+                   np.column_stack([samples, np.arange(3) * 0.1]), delimiter=',', fmt='%.9g',
+                   header='Leakage Current,Time', comments='')
+    return folder
+
+
+def check_files(catalogue):
+    """
+    Every listed file is used by a step and every step file is the one of its setpoint
+    """
+    assert sorted(catalogue.file_numbers.values()) == list(range(len(catalogue.files)))
+    assert sorted(catalogue.steps['file'][catalogue.steps['file'] >= 0]) == list(range(len(catalogue.files)))
+    for step in catalogue.steps:
+        name = catalogue.samples_file(step)
+        assert os.path.exists(name)
+        assert '{0:.1f}mA'.format(step['setpoint']) in name
+        assert os.sep + str(step['repetition']) + os.sep in name
+
+
+@pytest.fixture
+def root(tmp_path):
+    test_path = str(tmp_path / 'LDC01')
+    write_repetition(test_path, 1, (10.0, 20.0))
+    write_repetition(test_path, 2, (10.0, 20.0))
+    return tmp_path
+
+
+def test_update_indexes_new_repetitions(root):
+    catalogue = ResultsCatalogue(str(root))
+    assert catalogue.update() == 2
+    assert len(catalogue.steps) == 4 and len(catalogue.files) == 4
+    check_files(catalogue)
+    np.testing.assert_allclose(catalogue.query(repetition=2)['mean'], [10.02, 20.02])
+    np.testing.assert_allclose(catalogue.steps['ppc'], 0.04)
+    assert ResultsCatalogue(str(root)).update() == 0
+
+
+def test_update_drops_the_files_of_changed_repetitions(root):
+    catalogue = ResultsCatalogue(str(root))
+    catalogue.update()
+    # The first repetition is measured again over other setpoints
+    folder = os.path.join(str(root), 'LDC01', '1', 'Samples')
+    shutil.rmtree(folder)
+    write_repetition(os.path.join(str(root), 'LDC01'), 1, (5.0, 15.0, 25.0))
+    catalogue = ResultsCatalogue(str(root))
+    assert catalogue.update() == 1
+    assert len(catalogue.steps) == 5 and len(catalogue.files) == 5
+    check_files(catalogue)
+    np.testing.assert_allclose(catalogue.query(repetition=1)['setpoint'], [5.0, 15.0, 25.0])
+    # The renumbered files are the ones saved in the cache
+    cached = ResultsCatalogue(str(root))
+    assert cached.files == catalogue.files
+    check_files(cached)
+
+
+def test_update_drops_the_files_of_removed_repetitions(root):
+    catalogue = ResultsCatalogue(str(root))
+    catalogue.update()
+    shutil.rmtree(os.path.join(str(root), 'LDC01', '1'))
+    assert catalogue.update() == 0
+    assert len(catalogue.steps) == 2 and len(catalogue.files) == 2
+    check_files(catalogue)
+    assert set(catalogue.steps['repetition']) == {2}
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# test_run_journal.py
+#
+# Checks of the resume of an interrupted accuracy test from its journal:
+#   python -m pytest test_run_journal.py
+
+import json
+import math
+from Run_Journal import RunJournal, journal_name
+
+
+def test_journal_resume_after_truncated_line(tmp_path):
+    journal = RunJournal(str(tmp_path))
+    journal.record_step(1, 0, 10.0, 10.01, 0.01, 0.002, 0.01, 250.0, settled=True)
+    journal.record_repetition(1)
+    journal.record_step(2, 0, 10.0, 10.02, 0.02, 0.002, 0.01, float('nan'), settled=False)
+    # An interruption while the next record was being written
+    with open(tmp_path / journal_name, 'a') as journal_file:
+        journal_file.write('{"repetition": 2, "step": 1, "cur')
+    resumed = RunJournal(str(tmp_path))
+    assert resumed.completed(1) and not resumed.completed(2)
+    assert resumed.step(1, 0, 10.0)['settling'] == 250.0
+    assert math.isnan(resumed.step(2, 0, 10.0)['settling'])
+    assert resumed.step(2, 1, 20.0) is None
+    # The cut line is ended, so the records appended after the resume are read back
+    resumed.record_step(2, 1, 20.0, 20.01, 0.01, 0.002, 0.01, 240.0, settled=True)
+    assert RunJournal(str(tmp_path)).step(2, 1, 20.0)['mean'] == 20.01
+    with open(tmp_path / journal_name) as journal_file:
+        assert json.loads(journal_file.read().split('\n')[-2])['step'] == 1
+
+
+def test_step_of_another_sweep_is_measured_again(tmp_path):
+    RunJournal(str(tmp_path)).record_step(1, 3, 30.0, 30.01, 0.01, 0.002, 0.01, 250.0,
+                                          spurs=[(1.25, 0.05)], settled=True)
+    resumed = RunJournal(str(tmp_path))
+    assert resumed.step(1, 3, 30.0)['spurs'] == [[1.25, 0.05]]
+    # The sweep settings changed since the interruption: the current of the step is not the recorded one
+    assert resumed.step(1, 3, 35.0) is None
+
+
+def test_new_journal(tmp_path):
+    journal = RunJournal(str(tmp_path))
+    assert journal.records == {} and not journal.completed(1)
+    assert not (tmp_path / journal_name).exists()
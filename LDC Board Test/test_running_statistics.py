@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+# test_running_statistics.py
+#
+# Checks of the streaming statistics against NumPy:
+#   python -m pytest test_running_statistics.py
+
+import numpy as np
+import pytest
+from Running_Statistics import RunningStatistics
+
+
+def test_running_statistics_match_numpy():
+    rng = np.random.default_rng(0)
+    # A large offset with a small spread is where a naive sum of squares loses its precision
+    values = 1e6 + rng.normal(0.0, 1e-3, 10000)
+    statistics = RunningStatistics()
+    for value in values[:5000]:
+        statistics.update(value)
+    for batch in np.array_split(values[5000:], 7):
+        statistics.extend(batch)
+    assert statistics.count == len(values)
+    assert statistics.mean == pytest.approx(np.mean(values), rel=1e-15)
+    assert statistics.std_dev == pytest.approx(np.std(values), rel=1e-6)
+    assert statistics.minimum == values.min()
+    assert statistics.maximum == values.max()
+
+
+def test_standard_error_and_convergence():
+    rng = np.random.default_rng(4)
+    values = rng.normal(5.0, 0.1, 400)
+    statistics = RunningStatistics()
+    assert not statistics.converged(1.0)
+    statistics.extend(values[:5])
+    # Too few samples, whatever the spread
+    assert not statistics.converged(1.0)
+    statistics.extend(values[5:])
+    standard_error = np.std(values, ddof=1) / np.sqrt(len(values))
+    assert statistics.standard_error == pytest.approx(standard_error, rel=1e-12)
+    assert statistics.converged(1.01 * standard_error)
+    assert not statistics.converged(0.99 * standard_error)
+    statistics.clear()
+    assert statistics.count == 0 and statistics.standard_error == float('inf')
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# test_sample_buffer.py
+#
+# Checks of the growth and of the array interface of the sample buffer:
+#   python -m pytest test_sample_buffer.py
+
+import numpy as np
+from Sample_Buffer import SampleBuffer
+
+
+def test_append_grows_past_capacity():
+    buffer = SampleBuffer(capacity=4)
+    for value in range(37):
+        buffer.append(value)
+    assert len(buffer) == 37
+    np.testing.assert_array_equal(buffer.values, np.arange(37))
+    assert list(buffer) == list(range(37))
+    assert buffer[-1] == 36
+
+
+def test_reserve_keeps_samples():
+    buffer = SampleBuffer(capacity=2)
+    buffer.extend([1.0, 2.0])
+    buffer.reserve(1000)
+    data = buffer.values.base
+    np.testing.assert_array_equal(buffer.values, [1.0, 2.0])
+    # Appending up to the reserved capacity does not reallocate
+    buffer.extend(np.arange(998))
+    assert len(buffer) == 1000
+    assert buffer.values.base is data
+    # Reserving less than the allocation does not shrink it
+    buffer.reserve(10)
+    assert buffer.values.base is data
+    np.testing.assert_array_equal(buffer.values[2:], np.arange(998))
+
+
+def test_extend_grows_past_double_capacity():
+    buffer = SampleBuffer(capacity=3)
+    buffer.append(-1.0)
+    buffer.extend(np.arange(50))
+    buffer.extend([])
+    buffer.extend(range(50, 53))
+    np.testing.assert_array_equal(buffer.values, np.concatenate(([-1.0], np.arange(53))))
+
+
+def test_clear_keeps_the_allocation():
+    buffer = SampleBuffer(capacity=8)
+    buffer.extend(np.arange(8))
+    data = buffer.values.base
+    buffer.clear()
+    assert len(buffer) == 0
+    buffer.extend([5.0])
+    assert buffer.values.base is data
+    np.testing.assert_array_equal(buffer.values, [5.0])
+
+
+def test_array_interface():
+    buffer = SampleBuffer(capacity=4, dtype=np.float32)
+    buffer.extend([1.5, 2.5, 3.5])
+    view = np.asarray(buffer)
+    assert view.dtype == np.float32
+    assert np.shares_memory(view, buffer.values)
+    np.testing.assert_array_equal(np.asarray(buffer, dtype=np.int64), [1, 2, 3])
+    # A copy does not follow the samples that are modified or appended afterwards
+    copy = np.array(buffer)
+    copy[0] = 0.0
+    buffer.append(4.5)
+    assert buffer[0] == 1.5
+    assert len(copy) == 3
+    assert np.mean(buffer) == np.float32(3.0)
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# test_sample_recorder.py
+#
+# Checks of the chunked sample recordings, and of their recovery after a crash:
+#   python -m pytest test_sample_recorder.py
+
+import os
+import numpy as np
+from Sample_Recorder import SampleRecorder, column_file, export_csv, open_recording
+
+
+def record(path, rows, chunk_size=600):
+    recorder = SampleRecorder(path, chunk_size=chunk_size, metadata={'frequency': 10})
+    for row in range(rows):
+        recorder.append(row / 10, 1e-3 * row, 25.0 + row, -row)
+    return recorder
+
+
+def test_recording_round_trip(tmp_path):
+    path = str(tmp_path / 'drift')
+    with record(path, 1500):
+        pass
+    recording = open_recording(path)
+    assert recording['meta']['metadata'] == {'frequency': 10}
+    np.testing.assert_array_equal(recording['time'], np.arange(1500) / 10)
+    np.testing.assert_array_equal(recording['reference'], -np.arange(1500))
+    csv_name = str(tmp_path / 'drift.csv')
+    assert export_csv(path, csv_name, chunk_size=400) == 1500
+    table = np.loadtxt(csv_name, delimiter=',', skiprows=1)
+    np.testing.assert_allclose(table[:, 2], 25.0 + np.arange(1500))
+
+
+def test_recovery_after_truncated_chunk(tmp_path):
+    path = str(tmp_path / 'drift')
+    recorder = record(path, 1500)
+    # A crash while the second chunk was being written: the rows kept in memory are lost, and one column holds only
+    # part of the chunk, cut in the middle of a value
+    for column in recorder.files:
+        column.close()
+    with open(column_file(path, 'leakage'), 'r+b') as leakage_file:
+        leakage_file.truncate(1000 * 8 + 3)
+    recording = open_recording(path)
+    for column in recording['meta']['columns']:
+        assert len(recording[column]) == 1000
+    np.testing.assert_array_equal(recording['leakage'], 1e-3 * np.arange(1000))
+    np.testing.assert_array_equal(recording['temperature'], 25.0 + np.arange(1000))
+    assert export_csv(path, str(tmp_path / 'drift.csv')) == 1000
+
+
+def test_recording_without_complete_rows(tmp_path):
+    path = str(tmp_path / 'drift')
+    # A crash before the first chunk was full
+    for column in record(path, 10).files:
+        column.close()
+    assert os.path.getsize(column_file(path, 'time')) == 0
+    recording = open_recording(path)
+    assert all(len(recording[column]) == 0 for column in recording['meta']['columns'])
+    assert export_csv(path, str(tmp_path / 'drift.csv')) == 0
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# test_sample_scheduler.py
+#
+# Checks of the late and missed ticks of the sample scheduler, on a simulated clock:
+#   python -m pytest test_sample_scheduler.py
+
+import pytest
+import Sample_Scheduler
+from Sample_Scheduler import SampleScheduler
+
+
+class SimulatedClock:
+    """
+    Monotonic clock that only moves when the scheduler sleeps or when a tick spends time reading the instruments
+    """
+
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    perf_counter = monotonic
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimulatedClock()
+    monkeypatch.setattr(Sample_Scheduler, 'time', clock)
+    return clock
+
+
+def run(scheduler, clock, duration, tick_durations):
+    ticks = []
+    for tick, elapsed in scheduler.ticks(duration):
+        assert elapsed == pytest.approx(clock.now)
+        ticks.append(tick)
+        clock.now += tick_durations.get(tick, 0.0)
+    return ticks
+
+
+def test_on_time_ticks(clock):
+    scheduler = SampleScheduler(10)
+    assert run(scheduler, clock, 1, {}) == list(range(10))
+    assert (scheduler.ticks_done, scheduler.late_ticks, scheduler.missed_ticks) == (10, 0, 0)
+    assert scheduler.elapsed == pytest.approx(0.9)
+
+
+def test_late_and_missed_ticks(clock):
+    scheduler = SampleScheduler(10)
+    # The third tick overruns into the next deadline, the fifth one over a whole period
+    ticks = run(scheduler, clock, 1, {1: 0.07, 2: 0.16, 4: 0.27})
+    assert ticks == [0, 1, 2, 3, 4, 6, 7, 8, 9]
+    assert scheduler.ticks_done == 9
+    assert scheduler.missed_ticks == 1
+    assert scheduler.late_ticks == 2
+    assert scheduler.max_lateness == pytest.approx(0.07)
+
+
+def test_missed_ticks_end_with_the_duration(clock):
+    scheduler = SampleScheduler(10)
+    ticks = run(scheduler, clock, 1, {7: 0.55})
+    # The run is not stretched: the deadlines after the end are neither served nor counted
+    assert ticks == list(range(8))
+    assert scheduler.missed_ticks == 2
+    assert clock.now == pytest.approx(1.25)
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# test_scpi_commands.py
+#
+# Checks of the settings cache and of the command coalescing of the SCPI class over the simulated instrument:
+#   python -m pytest test_scpi_commands.py
+
+import pytest
+from SCPI_Commands import SCPI, setting_key
+from Simulated_Bench import SimulatedBench, SimulatedInstrument
+
+
+class RecordingInstrument(SimulatedInstrument):
+    """
+    Simulated instrument keeping the messages it receives, optionally failing the next one
+    """
+
+    def __init__(self, bench):
+        super().__init__(bench)
+        self.messages = []
+        self.fail = False
+
+    def receive(self, message):
+        self.messages.append(message)
+        if self.fail:
+            self.fail = False
+            raise TimeoutError("Simulated timeout on '{}'".format(message))
+
+    def write(self, message):
+        self.receive(message)
+        super().write(message)
+
+    def query(self, message):
+        self.receive(message)
+        return super().query(message)
+
+
+@pytest.fixture
+def instrument():
+    return RecordingInstrument(SimulatedBench())
+
+
+@pytest.mark.parametrize('aliases', [
+    (':SOURce1:CURRent:LEVel:IMMediate:AMPLitude', ':CURRent:LEVel', 'SOUR:CURR:LEV:IMM', 'CURRENT:LEVEL:AMPLITUDE'),
+    (':OUTPut1:STATe', ':OUTPut1', 'OUTP', ':OUTPUT:STATE'),
+    (':SENSe1:FUNCtion', 'SENS:FUNC'),
+])
+def test_setting_key_aliases(aliases):
+    assert len({setting_key(header) for header in aliases}) == 1
+
+
+def test_setting_key_keeps_channels_and_roots_apart():
+    assert setting_key(':OUTPut2') != setting_key(':OUTPut1')
+    assert setting_key(':SENSe1:FUNCtion') != setting_key(':SOURce1:FUNCtion')
+    assert setting_key(':STATus:OPERation:ENABle') == 'STAT:OPER:ENAB'
+
+
+def set_current(scpi, current):
+    scpi.write(':SOURce1:FUNCtion:MODE %s' % 'CURRent')
+    scpi.write(':SOURce1:CURRent:LEVel:IMMediate:AMPLitude %G' % current)
+
+
+def test_cached_settings_are_skipped(instrument):
+    scpi = SCPI('SIM::INSTR', instrument=instrument)
+    set_current(scpi, 0.01)
+    set_current(scpi, 0.01)
+    scpi.write(':CURRent:LEVel 0.01')
+    assert instrument.messages == [':SOURce1:FUNCtion:MODE CURRent',
+                                   ':SOURce1:CURRent:LEVel:IMMediate:AMPLitude 0.01']
+    set_current(scpi, 0.02)
+    assert instrument.messages[-1] == ':SOURce1:CURRent:LEVel:IMMediate:AMPLitude 0.02'
+    scpi.clear_state_cache()
+    set_current(scpi, 0.02)
+    assert len(instrument.messages) == 5
+
+
+def test_output_aliases_stay_in_sync(instrument):
+    scpi = SCPI('SIM::INSTR', instrument=instrument)
+    scpi.write(':OUTPut1 ON')
+    scpi.disable_output()
+    assert not instrument.bench.output
+    # The output state written without the cache is unknown, so the cached alias is sent again
+    scpi.write(':OUTPut1 ON')
+    assert instrument.bench.output
+    assert instrument.messages == [':OUTPut1 ON', ':OUTPut1:STATe 0', ':OUTPut1 ON']
+    scpi.write(':OUTPut1:STATe 1')
+    scpi.write(':OUTPut2 ON')
+    assert instrument.messages[-1] == ':OUTPut2 ON'
+    assert len(instrument.messages) == 4
+
+
+def test_failed_write_invalidates_the_cache(instrument):
+    scpi = SCPI('SIM::INSTR', instrument=instrument)
+    scpi.write(':FORMat:DATA ASCii')
+    instrument.fail = True
+    with pytest.raises(TimeoutError):
+        scpi.write(':FORMat:BORDer SWAPped')
+    scpi.write(':FORMat:BORDer SWAPped')
+    scpi.write(':FORMat:DATA ASCii')
+    assert instrument.messages[-2:] == [':FORMat:BORDer SWAPped', ':FORMat:DATA ASCii']
+
+
+def test_coalesced_commands(instrument):
+    scpi = SCPI('SIM::INSTR', instrument=instrument, coalesce=True)
+    set_current(scpi, 0.01)
+    scpi.write(':CURRent:LEVel 0.01')
+    scpi.write(':OUTPut1 ON')
+    assert instrument.messages == []
+    assert scpi.query_setting(':SOURce1:CURRent:LEVel:IMMediate:AMPLitude?') == [0.01]
+    assert instrument.messages == [':SOURce1:FUNCtion:MODE CURRent;:SOURce1:CURRent:LEVel:IMMediate:AMPLitude 0.01;'
+                                   ':OUTPut1 ON;:SOURce1:CURRent:LEVel:IMMediate:AMPLitude?']
+    assert instrument.bench.output
+    # Once sent, the settings are known to be held
+    set_current(scpi, 0.01)
+    scpi.write(':OUTPut1:STATe 1')
+    scpi.flush()
+    assert len(instrument.messages) == 1
+
+
+def test_failed_coalesced_message_invalidates_the_cache(instrument):
+    scpi = SCPI('SIM::INSTR', instrument=instrument, coalesce=True)
+    set_current(scpi, 0.01)
+    scpi.flush()
+    scpi.write(':FORMat:DATA ASCii')
+    instrument.fail = True
+    with pytest.raises(TimeoutError):
+        scpi.flush()
+    # Part of the message may have been applied, nothing is known to be held any more
+    assert scpi.state == {} and scpi.pending == []
+    set_current(scpi, 0.01)
+    scpi.write(':FORMat:DATA ASCii')
+    scpi.flush()
+    assert instrument.messages[-1] == (':SOURce1:FUNCtion:MODE CURRent;:SOURce1:CURRent:LEVel:IMMediate:AMPLitude 0.01;'
+                                       ':FORMat:DATA ASCii')
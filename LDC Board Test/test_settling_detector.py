@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# test_settling_detector.py
+#
+# Checks of the settling criterion, on a simulated step and over the simulated bench:
+#   python -m pytest test_settling_detector.py
+
+import math
+import numpy as np
+import pytest
+from Acquisition_Engine import AcquisitionEngine
+from SCPI_Commands import SCPI
+from Settling_Detector import SettlingDetector, wait_for_settling
+from Simulated_Bench import SimulatedBench, SimulatedInstrument, SimulatedSerialDRS
+
+
+def test_settling_detector_noisy_step():
+    rng = np.random.default_rng(1)
+    frequency, tau, step, noise = 50, 0.1, 10.0, 0.03
+    tolerance, dwell = 0.05, 0.2
+    detector = SettlingDetector(tolerance, dwell, noise)
+    settled_time = None
+    for timestamp in np.arange(0, 5, 1 / frequency):
+        value = step * (1 - math.exp(-timestamp / tau)) + rng.normal(0.0, noise)
+        if detector.update(value, timestamp):
+            settled_time = detector.window[0][0]
+            break
+    # The noise is wider than the tolerance, the step still settles once its mean is within the band
+    assert settled_time is not None
+    assert step * math.exp(-settled_time / tau) <= detector.band
+    assert settled_time < tau * math.log(step / tolerance)
+
+
+@pytest.fixture
+def engine():
+    bench = SimulatedBench(noise=1e-5, settling_time=0.1, seed=0)
+    drs = SimulatedSerialDRS(bench)
+    drs.connect()
+    scpi = SCPI('SIM::INSTR', instrument=SimulatedInstrument(bench))
+    scpi.write(':OUTPut1 ON')
+    with AcquisitionEngine(scpi, drs) as engine:
+        yield engine
+
+
+def test_wait_for_settling_after_a_step(engine):
+    engine.scpi.write(':SOURce1:CURRent:LEVel:IMMediate:AMPLitude %G' % 0.01)
+    settling_time, settled = wait_for_settling(engine, 0.05, 0.1, 3.0, noise=0.01)
+    # 10 mA within 0.11 mA after about 4.5 time constants of the sensor
+    assert settled
+    assert 0.3 < settling_time < 0.7
+
+
+def test_wait_for_settling_timeout(engine):
+    engine.scpi.write(':SOURce1:CURRent:LEVel:IMMediate:AMPLitude %G' % 0.01)
+    # A band narrower than the noise, without widening it, is never held for the dwell time
+    settling_time, settled = wait_for_settling(engine, 1e-6, 0.1, 0.3, readback=True)
+    assert not settled
+    assert math.isnan(settling_time)
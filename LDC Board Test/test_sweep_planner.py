@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# test_sweep_planner.py
+#
+# Checks of the bracketing of the corner frequency by the adaptive sweep, on analytic transfer functions:
+#   python -m pytest test_sweep_planner.py
+
+import numpy as np
+import pytest
+from Sweep_Planner import SweepPlanner
+
+
+def low_pass(corner, damping=None):
+    """
+    First order low pass, or second order with the given damping
+    """
+    if damping is None:
+        return lambda f: 1 / (1 + 1j * f / corner)
+    return lambda f: 1 / (1 - (f / corner) ** 2 + 2j * damping * f / corner)
+
+
+def sweep(planner, response):
+    rounds = []
+
+    def measure(frequencies):
+        rounds.append(frequencies)
+        return frequencies, response(frequencies)
+
+    return planner.run(measure), rounds
+
+
+def test_first_order_corner_is_bracketed():
+    planner = SweepPlanner(10.0, 100000.0, 1.0)
+    (corner, (low, high)), rounds = sweep(planner, low_pass(1234.0))
+    assert low < 1234.0 < high
+    assert high / low - 1 <= planner.tolerance
+    assert corner == pytest.approx(1234.0, rel=0.005)
+    # Far fewer points than a uniform grid of the same resolution, none measured twice
+    assert len(planner.frequencies) < 30
+    assert len(np.unique(planner.frequencies)) == len(planner.frequencies)
+    assert len(rounds[0]) == 9
+
+
+def test_resonance_is_refined():
+    planner = SweepPlanner(10.0, 100000.0, 1.0)
+    response = low_pass(2000.0, damping=0.1)
+    (corner, (low, high)), _ = sweep(planner, response)
+    assert low < corner < high
+    assert 20 * np.log10(abs(response(low))) > -3.0 > 20 * np.log10(abs(response(high)))
+    # The peak and the phase turn of the resonance are sampled finely enough to follow the limits
+    magnitude = planner.magnitude()
+    phase = 180 / np.pi * np.unwrap(np.angle(planner.responses))
+    assert magnitude.max() > 12.0
+    assert np.all((np.abs(np.diff(magnitude)) <= planner.magnitude_step) &
+                  (np.abs(np.diff(phase)) <= planner.phase_step))
+    assert len(planner.frequencies) < planner.max_points
+
+
+def test_budget_and_resolution_limits():
+    planner = SweepPlanner(10.0, 100000.0, 50.0, tolerance=1e-4, max_points=20)
+    (corner, (low, high)), _ = sweep(planner, low_pass(1234.0))
+    assert len(planner.frequencies) <= 20
+    assert low < 1234.0 < high
+    assert np.all(planner.frequencies % 50.0 == 0)
+
+
+def test_corner_outside_the_sweep():
+    planner = SweepPlanner(10.0, 1000.0, 1.0)
+    (corner, (low, high)), _ = sweep(planner, low_pass(1e6))
+    assert (corner, low, high) == (None, None, None)
+    assert len(planner.frequencies) == 9